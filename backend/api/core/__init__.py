@@ -7,6 +7,11 @@ These are shared, essential modules used across all API routes and services.
 Modules:
 - config.py: Application-wide configuration settings (database, JWT, CORS)
 - middleware.py: Request/response processing middleware (error handling, logging)
+- cache.py: In-process TTL cache and ETag helpers for read-heavy routes
+- serialization.py: Row-to-JSON fast path for list endpoints
+- compression.py: gzip/brotli/zstd response compression middleware
+- metrics.py: Per-route latency/DB-time metrics, /metrics and Server-Timing
+- startup.py: Import and lifespan step timings reported at boot
 
 Purpose:
 The 'core' represents the technical foundation that enables the API to function,
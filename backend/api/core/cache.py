@@ -0,0 +1,241 @@
+"""
+API Core Cache Module
+
+Small in-process caching helpers shared by the read-heavy routes.
+Entries live in the worker's memory only, so every process keeps its own copy
+and a restart starts cold.
+
+Conditional GET support is built on per-table change-version counters:
+write routes call bump_version() after committing, and list routes derive
+their ETag from the versions of every table they read. Under the prefork
+server (api/serve.py) the counters live in shared memory so a write handled
+by one worker invalidates ETags and cached entries in all of them.
+
+Tables rewritten by CLI jobs (loyalty accrual, tier recompute, payment
+reconciliation) change outside every API process, so their routes also mix
+the jobs' JobWatermark rows into the ETag (job_versions()).
+"""
+
+import hashlib
+import os
+import threading
+import time
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Hashable, Iterable, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+
+
+class TTLCache:
+    """Thread-safe key/value cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, ttl: float, maxsize: int = 256):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: dict = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            if len(self._data) >= self.maxsize and key not in self._data:
+                # Drop the entry closest to expiry to make room
+                oldest = min(self._data, key=lambda k: self._data[k][0])
+                del self._data[oldest]
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the exact response bytes."""
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True when the request's If-None-Match header covers `etag`."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+# ── Table change versions ─────────────────────────────────────────────────────
+
+# Versions restart at zero with every process, so the boot id keeps ETags
+# from a previous run (or another worker) from ever matching.
+_BOOT_ID = f"{os.getpid():x}-{time.time_ns():x}"
+_BOOT_TIME = time.time()
+
+_versions: dict = {}
+_modified: dict = {}
+_versions_lock = threading.Lock()
+
+# Shared-memory counters (versions, modified) once share_versions() has run
+_shared = None
+SHARED_VERSION_SLOTS = 256
+
+
+def _slot(table: str) -> int:
+    # Tables hashing to the same slot only invalidate each other spuriously
+    return zlib.crc32(table.encode()) % SHARED_VERSION_SLOTS
+
+
+def share_versions() -> None:
+    """
+    Move the version counters into shared memory.
+
+    Call in the parent process before forking workers; the boot id is then
+    inherited too, so every worker issues the same ETag for the same state.
+    """
+    global _shared
+    if _shared is not None:
+        return
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("fork")
+    versions = ctx.Array("q", SHARED_VERSION_SLOTS)
+    modified = ctx.Array("d", SHARED_VERSION_SLOTS, lock=versions.get_lock())
+    with _versions_lock:
+        for table, version in _versions.items():
+            versions[_slot(table)] += version
+            modified[_slot(table)] = max(modified[_slot(table)], _modified[table])
+    _shared = (versions, modified)
+
+
+def bump_version(*tables: str) -> None:
+    """Record that a write to `tables` has been committed."""
+    now = time.time()
+    if _shared is not None:
+        versions, modified = _shared
+        with versions.get_lock():
+            for table in tables:
+                versions[_slot(table)] += 1
+                modified[_slot(table)] = now
+        return
+    with _versions_lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+            _modified[table] = now
+
+
+def table_versions(*tables: str) -> tuple:
+    """Current change versions of `tables`, usable as a cache key."""
+    if _shared is not None:
+        versions, _ = _shared
+        with versions.get_lock():
+            return tuple(versions[_slot(table)] for table in tables)
+    with _versions_lock:
+        return tuple(_versions.get(table, 0) for table in tables)
+
+
+def last_modified(tables: Iterable[str]) -> float:
+    """Timestamp of the most recent committed write to any of `tables`."""
+    if _shared is not None:
+        versions, modified = _shared
+        with versions.get_lock():
+            return max((modified[_slot(table)] or _BOOT_TIME for table in tables), default=_BOOT_TIME)
+    with _versions_lock:
+        return max((_modified.get(table, _BOOT_TIME) for table in tables), default=_BOOT_TIME)
+
+
+def job_versions(cursor, jobs: Sequence[str]) -> Tuple[str, float]:
+    """
+    Version string and latest run time of `jobs` from JobWatermark, for
+    responses over tables those jobs write from another process, where
+    bump_version() never sees the change. One primary-key read.
+    """
+    cursor.execute(
+        f"SELECT job, runs, last_run_at FROM JobWatermark WHERE job IN ({', '.join(['%s'] * len(jobs))})"
+        " ORDER BY job",
+        tuple(jobs),
+    )
+    rows = cursor.fetchall()
+    version = ",".join(f"{job}:{runs}:{last_run_at}" for job, runs, last_run_at in rows)
+    modified_at = max((last_run_at.timestamp() for _, _, last_run_at in rows if last_run_at), default=0.0)
+    return version, modified_at
+
+
+def table_etag(tables: Iterable[str], variant: str = "", ttl: Optional[int] = None) -> str:
+    """
+    Strong ETag for a response built from `tables`.
+
+    `variant` distinguishes responses over the same tables (e.g. the query
+    string). `ttl` expires the tag every `ttl` seconds for responses that also
+    depend on the clock, such as the overdue status computed from NOW().
+    """
+    tables = tuple(tables)
+    parts = [_BOOT_ID, variant]
+    parts.extend(f"{t}:{v}" for t, v in zip(tables, table_versions(*tables)))
+    if ttl:
+        parts.append(str(int(time.time() // ttl)))
+    return '"' + hashlib.sha1("|".join(parts).encode()).hexdigest() + '"'
+
+
+def _modified_since(request: Request, modified_at: float) -> bool:
+    header = request.headers.get("if-modified-since")
+    if not header:
+        return True
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return True
+    # HTTP dates have one-second resolution
+    return int(modified_at) > int(since)
+
+
+def check_not_modified(
+    request: Request,
+    response: Response,
+    tables: Iterable[str],
+    ttl: Optional[int] = None,
+    jobs: Optional[Tuple[str, float]] = None,
+) -> Optional[Response]:
+    """
+    Set ETag/Last-Modified on `response` and return a 304 response when the
+    client's copy is still current, so the caller can skip the database.
+    Returns None when the full response has to be built.
+
+    `jobs` is job_versions() for the background jobs that also write the
+    response's tables.
+    """
+    tables = tuple(tables)
+    variant = request.url.query
+    modified_at = last_modified(tables)
+    if jobs is not None:
+        variant += "|" + jobs[0]
+        modified_at = max(modified_at, jobs[1])
+    etag = table_etag(tables, variant=variant, ttl=ttl)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(modified_at, usegmt=True),
+        "Cache-Control": "private, no-cache",
+    }
+    response.headers.update(headers)
+
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+    if "if-none-match" in request.headers:
+        fresh = etag_matches(request, etag)
+    else:
+        fresh = ttl is None and "if-modified-since" in request.headers \
+            and not _modified_since(request, modified_at)
+    if fresh:
+        return Response(status_code=304, headers=headers)
+    return None
@@ -0,0 +1,271 @@
+"""
+API Core Compression Module
+
+Pure ASGI middleware that negotiates response compression from the
+Accept-Encoding header. gzip is always available; zstd and brotli are offered
+when the optional `zstandard` / `brotli` packages are installed.
+
+Bodies smaller than the minimum size go out untouched. Responses that declare
+a Content-Length are compressed in one shot and keep an exact length; streaming
+responses (no Content-Length) are compressed chunk by chunk with a sync flush
+after each chunk, so large exports reach the client incrementally instead of
+being buffered whole.
+"""
+
+import zlib
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional codec
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional codec
+    zstandard = None
+
+
+# Media types worth compressing; images, archives etc. are already compressed
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/x-ndjson",
+    "image/svg+xml",
+)
+
+
+class _GzipEncoder:
+    def __init__(self, level: int):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        out = self._obj.compress(data)
+        return out + self._obj.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+class _BrotliEncoder:
+    def __init__(self, level: int):
+        self._obj = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        out = self._obj.process(data)
+        return out + self._obj.flush() if flush else out
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+class _ZstdEncoder:
+    def __init__(self, level: int):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        out = self._obj.compress(data)
+        return out + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if flush else out
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+def available_encodings() -> Tuple[str, ...]:
+    """Encodings this process can produce, in server preference order."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return tuple(encodings)
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Map each coding in an Accept-Encoding header to its q-value."""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header: str, supported: Iterable[str]) -> Optional[str]:
+    """Pick the highest-q supported coding; ties go to server preference."""
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in supported:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compress HTTP responses according to the client's Accept-Encoding.
+
+    Args:
+        minimum_size: Bodies shorter than this many bytes are sent as-is.
+        gzip_level / brotli_level / zstd_level: Per-codec compression levels.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 500,
+        gzip_level: int = 6,
+        brotli_level: int = 4,
+        zstd_level: int = 3,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {"gzip": gzip_level, "br": brotli_level, "zstd": zstd_level}
+        self.encodings = available_encodings()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for key, value in scope["headers"]:
+            if key == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept, self.encodings) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressingResponder(send, encoding, self.levels[encoding], self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingResponder:
+    """Per-request `send` wrapper that decides whether and how to compress."""
+
+    def __init__(self, send, encoding: str, level: int, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.level = level
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.declared_length = None
+        self.buffer = []
+        self.buffered = 0
+        self.encoder = None
+        self.passthrough = False
+
+    async def send(self, message):
+        kind = message["type"]
+        if kind == "http.response.start":
+            self.start_message = message
+            self.passthrough = not self._eligible(message)
+            if self.passthrough:
+                await self._send(message)
+            return
+
+        if kind != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is not None:
+            # Streaming already started: compress this chunk and flush it out
+            if more_body:
+                chunk = self.encoder.compress(body, flush=True)
+            else:
+                chunk = self.encoder.compress(body, flush=False) + self.encoder.finish()
+            await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+            return
+
+        self.buffer.append(body)
+        self.buffered += len(body)
+        if more_body and (self.declared_length is not None or self.buffered < self.minimum_size):
+            # Sized bodies are collected whole (wrapping middleware may re-chunk
+            # them); true streams only until compression is known to pay off
+            return
+
+        data = b"".join(self.buffer)
+        self.buffer = []
+        if not more_body and len(data) < self.minimum_size:
+            await self._send_start(compressed=False)
+            await self._send({"type": "http.response.body", "body": data, "more_body": False})
+            return
+
+        self.encoder = self._make_encoder()
+        if more_body:
+            await self._send_start(compressed=True, streaming=True)
+            chunk = self.encoder.compress(data, flush=True)
+        else:
+            chunk = self.encoder.compress(data, flush=False) + self.encoder.finish()
+            await self._send_start(compressed=True, length=len(chunk))
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    def _eligible(self, message) -> bool:
+        if message["status"] < 200 or message["status"] in (204, 304):
+            return False
+        content_type = b""
+        for key, value in message.get("headers", []):
+            key = key.lower()
+            if key == b"content-encoding":
+                return False
+            if key == b"content-type":
+                content_type = value
+            elif key == b"content-length":
+                self.declared_length = int(value)
+                if self.declared_length < self.minimum_size:
+                    return False
+        media_type = content_type.decode("latin-1").split(";")[0].strip().lower()
+        return media_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _make_encoder(self):
+        if self.encoding == "zstd":
+            return _ZstdEncoder(self.level)
+        if self.encoding == "br":
+            return _BrotliEncoder(self.level)
+        return _GzipEncoder(self.level)
+
+    async def _send_start(self, compressed: bool, length: Optional[int] = None, streaming: bool = False):
+        headers = []
+        vary = []
+        for key, value in self.start_message.get("headers", []):
+            lower = key.lower()
+            if lower == b"vary":
+                vary.append(value)
+                continue
+            if compressed and lower == b"content-length":
+                continue
+            if compressed and lower == b"etag" and not value.startswith(b"W/"):
+                # The compressed bytes differ from the identity representation
+                value = b"W/" + value
+            headers.append((key, value))
+
+        vary_value = b", ".join(vary)
+        if b"accept-encoding" not in vary_value.lower():
+            vary_value = vary_value + b", Accept-Encoding" if vary_value else b"Accept-Encoding"
+        headers.append((b"vary", vary_value))
+
+        if compressed:
+            headers.append((b"content-encoding", self.encoding.encode()))
+            if not streaming and length is not None:
+                headers.append((b"content-length", str(length).encode()))
+        await self._send({**self.start_message, "headers": headers})
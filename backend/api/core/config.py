@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from typing import Dict, Optional
 
 
 class Settings(BaseSettings):
@@ -11,6 +11,16 @@ class Settings(BaseSettings):
     DB_NAME: str = "car_rental_db"
     DB_PORT: int = 3306
 
+    # Optional read replica (see database/replica.py). Only routes marked with
+    # reads_from_replica use it; user/password default to the primary's.
+    DB_REPLICA_HOST: Optional[str] = None
+    DB_REPLICA_PORT: int = 3306
+    DB_REPLICA_USER: Optional[str] = None
+    DB_REPLICA_PASSWORD: Optional[str] = None
+    DB_REPLICA_POOL_SIZE: int = 10
+    DB_REPLICA_MAX_LAG_SECONDS: float = 5.0
+    DB_REPLICA_LAG_CHECK_SECONDS: float = 5.0
+
     # JWT settings — SECRET_KEY MUST be set via environment variable
     SECRET_KEY: str = ""
     ALGORITHM: str = "HS256"
@@ -19,6 +29,60 @@ class Settings(BaseSettings):
     # CORS settings
     FRONTEND_URL: str = "http://localhost:3000"
 
+    # Serialize list endpoints straight from cursor rows (see core/serialization.py)
+    FAST_JSON_RESPONSES: bool = True
+
+    # Response compression (see core/compression.py)
+    COMPRESSION_MINIMUM_SIZE: int = 500
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_LEVEL: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
+
+    # Request metrics (see core/metrics.py)
+    METRICS_ENABLED: bool = True
+    SERVER_TIMING_HEADER: bool = True
+
+    # Loyalty accrual (see api/services/loyalty.py): points per currency unit of
+    # a completed rental's total_cost, and how far back each batch re-checks
+    # for returns recorded late (already-credited rentals are skipped)
+    LOYALTY_POINTS_PER_UNIT: float = 1.0
+    LOYALTY_ACCRUAL_LOOKBACK_DAYS: int = 7
+    # Minimum balance per tier, as JSON in the environment; after changing it,
+    # run `python -m cli.manage loyalty-tiers` to move existing members
+    LOYALTY_TIER_THRESHOLDS: Dict[str, int] = {"Silver": 1000, "Gold": 5000, "Platinum": 10000}
+
+    # Service forecast (GET /api/maintenance/forecast): rental-days between
+    # services for vehicles without enough history, the longest calendar gap
+    # allowed between services, and the window daily usage is measured over
+    MAINTENANCE_SERVICE_INTERVAL_DAYS: int = 60
+    MAINTENANCE_MAX_INTERVAL_DAYS: int = 180
+    MAINTENANCE_USAGE_WINDOW_DAYS: int = 90
+
+    # Longest the in-memory promo index (api/services/pricing.py) goes without
+    # reloading; writes through the API reload it straight away
+    PRICING_PROMO_REFRESH_SECONDS: int = 300
+
+    # Payment reconciliation (api/services/payments.py): how many days of
+    # pickups each run re-checks, and rentals per chunk/transaction
+    PAYMENT_RECONCILIATION_DAYS: int = 365
+    PAYMENT_RECONCILIATION_CHUNK_SIZE: int = 5000
+
+    # Largest NDJSON file POST /api/reviews/bulk accepts, in lines
+    REVIEW_IMPORT_MAX_LINES: int = 100000
+
+    # Run schema seeding, demo date refresh and auth warm-up in the background
+    # after the server starts accepting requests, instead of before
+    STARTUP_DEFER_TASKS: bool = False
+
+    # Production server (see api/serve.py); SERVER_WORKERS=0 means one per CPU
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0
+    SERVER_MAX_REQUESTS: int = 10000
+    SERVER_MAX_REQUESTS_JITTER: int = 1000
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    SERVER_BACKLOG: int = 2048
+
     model_config = SettingsConfigDict(
         env_file=".env",
         extra="ignore",
@@ -0,0 +1,357 @@
+"""
+API Core Metrics Module
+
+Per-route request instrumentation. MetricsMiddleware times every HTTP request
+and collects the database work recorded by database.instrumentation for it:
+query count, time spent in MySQL and time spent waiting for a pool connection.
+
+Results are aggregated in-process and exposed in Prometheus text format by
+render_metrics() (served at /metrics), and each response carries a
+Server-Timing header with the same breakdown for that request.
+
+Under the prefork server (api/serve.py) a scrape reaches one random worker,
+so workers also write snapshots of their counters to a directory shared with
+the parent (start_export()) and /metrics merges the snapshots of every worker
+the server has run: series stay monotonic as scrapes move between workers and
+as workers are recycled. Another worker's counts are at most
+EXPORT_INTERVAL_SECONDS old.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from database.instrumentation import begin_request
+from database.replica import replica
+from database import retry
+from database.retry import retry_stats
+from database.statements import cache_stats
+
+# Latency buckets in seconds (upper bounds, Prometheus style)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Requests that matched no route share one label to keep cardinality bounded
+UNMATCHED_ROUTE = "<unmatched>"
+
+# How often a prefork worker rewrites its snapshot file
+EXPORT_INTERVAL_SECONDS = 1.0
+# Snapshot of the workers that have exited, kept by the parent
+RETIRED_FILE = "retired.json"
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, List] = {}
+
+    def observe(self, labels: Tuple, value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            # [per-bucket counts (+Inf last), sum, count]
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def items(self):
+        return self._series.items()
+
+
+class MetricsRegistry:
+    """All request metrics for this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = Histogram()
+        self.db_time = Histogram()
+        self.queries: Dict[Tuple, int] = {}
+        self.pool_wait: Dict[Tuple, float] = {}
+
+    def observe(self, method: str, route: str, status: int, duration: float, stats) -> None:
+        with self.lock:
+            self.latency.observe((method, route, str(status)), duration)
+            self.db_time.observe((method, route), stats.db_time)
+            key = (method, route)
+            self.queries[key] = self.queries.get(key, 0) + stats.query_count
+            self.pool_wait[key] = self.pool_wait.get(key, 0.0) + stats.pool_wait
+
+    def reset(self) -> None:
+        with self.lock:
+            self.__init__()
+
+
+registry = MetricsRegistry()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}"
+
+
+def _render_histogram(lines: List[str], name: str, help_text: str, series: Dict, label_names) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, (counts, total, count) in sorted(series.items()):
+        cumulative = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS, counts):
+            cumulative += bucket_count
+            le = 'le="%s"' % bound
+            lines.append(f"{name}_bucket{_labels(label_names, labels, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{name}_bucket{_labels(label_names, labels, le)} {count}")
+        lines.append(f"{name}_sum{_labels(label_names, labels)} {total:.6f}")
+        lines.append(f"{name}_count{_labels(label_names, labels)} {count}")
+
+
+# ── Snapshots (prefork aggregation) ───────────────────────────────────────────
+
+def snapshot() -> dict:
+    """This process's counters in JSON-serializable form."""
+    with registry.lock:
+        data = {
+            name: [[list(labels), list(counts), total, count] for labels, (counts, total, count) in hist.items()]
+            for name, hist in (("latency", registry.latency), ("db_time", registry.db_time))
+        }
+        data["queries"] = [[list(labels), value] for labels, value in registry.queries.items()]
+        data["pool_wait"] = [[list(labels), value] for labels, value in registry.pool_wait.items()]
+    data["retries"] = [[list(labels), value] for labels, value in retry_stats().items()]
+    statement_cache = cache_stats()
+    statement_cache.pop("size")
+    data["statement_cache"] = statement_cache
+    data["replica_reads"] = replica.status()["reads"] if replica.enabled else {}
+    return data
+
+
+def merge_snapshots(snapshots: Iterable[dict]) -> dict:
+    """Sum snapshots into {metric: {labels: value}} (histograms: [counts, sum, count])."""
+    merged: Dict[str, dict] = {
+        name: {} for name in (
+            "latency", "db_time", "queries", "pool_wait", "retries", "statement_cache", "replica_reads",
+        )
+    }
+    for snap in snapshots:
+        for name in ("latency", "db_time"):
+            for labels, counts, total, count in snap.get(name, ()):
+                series = merged[name].setdefault(tuple(labels), [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0])
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+        for name in ("queries", "pool_wait", "retries"):
+            for labels, value in snap.get(name, ()):
+                key = tuple(labels)
+                merged[name][key] = merged[name].get(key, 0) + value
+        for name in ("statement_cache", "replica_reads"):
+            for key, value in snap.get(name, {}).items():
+                merged[name][key] = merged[name].get(key, 0) + value
+    return merged
+
+
+_export_dir: Optional[str] = None
+_export_lock = threading.Lock()
+# Part of the file name, so a reused pid never picks up a retired worker's file
+_started_ns = time.time_ns()
+
+
+def _own_file() -> str:
+    return f"{os.getpid()}-{_started_ns}.json"
+
+
+def start_export(directory: str, interval: float = EXPORT_INTERVAL_SECONDS) -> None:
+    """
+    Share this worker's counters through `directory` (called in each forked
+    worker). Counters inherited from the parent are dropped first so they
+    are not counted once per worker.
+    """
+    global _export_dir, _started_ns
+    registry.reset()
+    retry.reset_stats()
+    _started_ns = time.time_ns()
+    _export_dir = directory
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            export_snapshot()
+
+    threading.Thread(target=loop, name="metrics-export", daemon=True).start()
+
+
+def export_snapshot() -> None:
+    """Write this worker's snapshot file; also called once more as the worker exits."""
+    if _export_dir is None:
+        return
+    path = os.path.join(_export_dir, _own_file())
+    with _export_lock:
+        with open(path + ".tmp", "w") as f:
+            json.dump(snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+
+def _read(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _worker_snapshots(strict: bool) -> Optional[List[dict]]:
+    """
+    Snapshots of the other workers. With `strict`, None when a worker's file
+    vanished after retired.json was read: the parent merged it meanwhile, and
+    reading again sees it in retired.json instead of missing it entirely.
+    """
+    retired = _read(os.path.join(_export_dir, RETIRED_FILE)) or {}
+    # A retired worker's file can outlive its merge into retired.json briefly
+    skip = set(retired.get("files", ())) | {_own_file(), RETIRED_FILE}
+    snapshots = [retired] if retired else []
+    for name in os.listdir(_export_dir):
+        if not name.endswith(".json") or name in skip:
+            continue
+        snap = _read(os.path.join(_export_dir, name))
+        if snap is None:
+            if strict:
+                return None
+            continue
+        snapshots.append(snap)
+    return snapshots
+
+
+def collect_snapshots() -> List[dict]:
+    """This process's live counters plus, under prefork, every other worker's snapshot."""
+    snapshots = [snapshot()]
+    if _export_dir is None:
+        return snapshots
+    for _ in range(3):
+        others = _worker_snapshots(strict=True)
+        if others is not None:
+            return snapshots + others
+    return snapshots + _worker_snapshots(strict=False)
+
+
+def retire_worker(directory: str, pid: int) -> None:
+    """
+    Fold an exited worker's snapshot into retired.json (parent side), so its
+    counts keep contributing without one file per recycled worker.
+    """
+    names = [name for name in os.listdir(directory) if name.startswith(f"{pid}-") and name.endswith(".json")]
+    if not names:
+        return
+    retired_path = os.path.join(directory, RETIRED_FILE)
+    retired = _read(retired_path) or {}
+    snaps = [_read(os.path.join(directory, name)) for name in names]
+    merged = merge_snapshots([retired] + [snap for snap in snaps if snap is not None])
+    data = {
+        name: (
+            [[list(labels), *series] for labels, series in merged[name].items()]
+            if name in ("latency", "db_time") else
+            [[list(labels), value] for labels, value in merged[name].items()]
+        )
+        for name in ("latency", "db_time", "queries", "pool_wait", "retries")
+    }
+    data["statement_cache"] = merged["statement_cache"]
+    data["replica_reads"] = merged["replica_reads"]
+    data["files"] = retired.get("files", []) + names
+    with open(retired_path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(retired_path + ".tmp", retired_path)
+    for name in names:
+        os.remove(os.path.join(directory, name))
+
+
+def render_metrics() -> str:
+    """Render all metrics in the Prometheus text exposition format."""
+    data = merge_snapshots(collect_snapshots())
+    lines: List[str] = []
+    _render_histogram(
+        lines, "http_request_duration_seconds", "HTTP request latency by route.",
+        data["latency"], ("method", "route", "status"),
+    )
+    _render_histogram(
+        lines, "db_time_seconds", "Time spent in MySQL per request by route.",
+        data["db_time"], ("method", "route"),
+    )
+    lines.append("# HELP db_queries_total SQL statements executed by route.")
+    lines.append("# TYPE db_queries_total counter")
+    for labels, value in sorted(data["queries"].items()):
+        lines.append(f"db_queries_total{_labels(('method', 'route'), labels)} {value}")
+    lines.append("# HELP db_pool_wait_seconds_total Time spent waiting for a pooled connection by route.")
+    lines.append("# TYPE db_pool_wait_seconds_total counter")
+    for labels, value in sorted(data["pool_wait"].items()):
+        lines.append(f"db_pool_wait_seconds_total{_labels(('method', 'route'), labels)} {value:.6f}")
+    if cache_stats()["size"]:
+        lines.append("# HELP db_statement_cache_total Prepared-statement cache events (per-connection LRU).")
+        lines.append("# TYPE db_statement_cache_total counter")
+        for event, value in sorted(data["statement_cache"].items()):
+            lines.append(f"db_statement_cache_total{_labels(('event',), (event,))} {value}")
+    if data["retries"]:
+        lines.append("# HELP db_transaction_retries_total Transient transaction failures by operation, error class and outcome.")
+        lines.append("# TYPE db_transaction_retries_total counter")
+        for labels, value in sorted(data["retries"].items()):
+            lines.append(f"db_transaction_retries_total{_labels(('operation', 'error', 'outcome'), labels)} {value}")
+    if replica.enabled:
+        status = replica.status()
+        lines.append("# HELP db_replica_lag_seconds Replication lag at the last check (-1 if unknown).")
+        lines.append("# TYPE db_replica_lag_seconds gauge")
+        lag = status["lag_seconds"]
+        lines.append(f"db_replica_lag_seconds {-1 if lag is None else lag}")
+        lines.append("# HELP db_replica_reads_total Replica-eligible reads by where they were served.")
+        lines.append("# TYPE db_replica_reads_total counter")
+        for target, value in sorted(data["replica_reads"].items()):
+            lines.append(f"db_replica_reads_total{_labels(('target',), (target,))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def server_timing(duration: float, stats) -> str:
+    """Server-Timing header value for one request (durations in ms)."""
+    return (
+        f"app;dur={duration * 1000:.1f}, "
+        f"db;dur={stats.db_time * 1000:.1f};desc=\"{stats.query_count} queries\", "
+        f"pool;dur={stats.pool_wait * 1000:.1f}"
+    )
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency and DB usage per route."""
+
+    def __init__(self, app, server_timing_header: bool = True):
+        self.app = app
+        self.server_timing_header = server_timing_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = begin_request(scope)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing_header:
+                    duration = time.perf_counter() - start
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(duration, stats).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            registry.observe(scope["method"], route_path, status, time.perf_counter() - start, stats)
@@ -0,0 +1,113 @@
+"""
+API Core Serialization Module
+
+Fast path for list endpoints: cursor tuples are mapped straight to JSON bytes
+instead of building one Pydantic model per row and letting FastAPI validate
+the list again against `response_model`.
+
+Routes keep their `response_model` so the OpenAPI schema is unchanged; they
+just return the pre-rendered Response produced here. Each RowSerializer is
+declared next to the model it mirrors and must emit the same JSON.
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Iterable, Optional, Sequence, Tuple
+
+from fastapi import Response
+
+from api.core.config import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is listed in requirements.txt
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Encode `content` as compact JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+# ── Column converters ─────────────────────────────────────────────────────────
+# Each mirrors what Pydantic would emit for the matching field type.
+
+def as_float(value) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def as_float_or_zero(value) -> float:
+    return float(value) if value is not None else 0.0
+
+
+def as_str(value) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+def as_date(value) -> Optional[str]:
+    """Format DATE/DATETIME columns as YYYY-MM-DD."""
+    if value is None:
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    return str(value)
+
+
+def as_decimal(value) -> Optional[str]:
+    """Pydantic serializes Decimal fields as strings in JSON mode."""
+    if value is None:
+        return None
+    return str(value if isinstance(value, Decimal) else Decimal(str(value)))
+
+
+def as_bool(value) -> bool:
+    return bool(value)
+
+
+Field = Tuple[str, int, Optional[Callable[[Any], Any]]]
+
+
+class RowSerializer:
+    """
+    Maps cursor rows to JSON objects.
+
+    `fields` is a sequence of (output name, row index, converter) triples;
+    a converter of None passes the column value through unchanged.
+    """
+
+    def __init__(self, fields: Sequence[Field]):
+        self.fields = tuple(fields)
+
+    def to_dict(self, row: Sequence) -> dict:
+        return {
+            name: (conv(row[i]) if conv is not None else row[i])
+            for name, i, conv in self.fields
+        }
+
+    def render(self, rows: Iterable[Sequence]) -> bytes:
+        """Serialize a list of rows as a JSON array."""
+        to_dict = self.to_dict
+        return dumps([to_dict(row) for row in rows])
+
+    def render_one(self, row: Sequence) -> bytes:
+        return dumps(self.to_dict(row))
+
+
+def fast_json_enabled() -> bool:
+    return settings.FAST_JSON_RESPONSES
+
+
+def json_response(body: bytes, response: Optional[Response] = None, status_code: int = 200) -> Response:
+    """
+    Wrap pre-rendered JSON bytes in a Response, carrying over any headers
+    already set on FastAPI's injected `response` (ETag, Last-Modified, ...).
+    """
+    out = Response(content=body, status_code=status_code, media_type="application/json")
+    if response is not None:
+        for key, value in response.headers.items():
+            if key not in ("content-length", "content-type"):
+                out.headers[key] = value
+    return out
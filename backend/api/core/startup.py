@@ -0,0 +1,76 @@
+"""
+Startup-time profiling.
+
+Records how long the app takes to import (framework and each router module)
+and how long each lifespan step takes, so cold-start regressions show up in
+the boot log, at /api/admin/startup-profile and via
+`python -m cli.manage startup-profile`.
+
+Import timings are inclusive: a module shared by several routers is charged
+to the first one that imports it, as with `python -X importtime`.
+"""
+
+import importlib
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfile:
+    def __init__(self):
+        self.imports: List[Dict] = []
+        self.steps: List[Dict] = []
+        self.started_at = datetime.now()
+
+    def record_import(self, name: str, seconds: float) -> None:
+        self.imports.append({"name": name, "ms": round(seconds * 1000, 2)})
+
+    def import_module(self, name: str):
+        """importlib.import_module, recording the time it took."""
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        self.record_import(name, time.perf_counter() - start)
+        return module
+
+    @contextmanager
+    def step(self, name: str, deferred: bool = False):
+        """Time one startup step; failures are recorded and re-raised."""
+        start = time.perf_counter()
+        entry = {"name": name, "deferred": deferred, "ms": None, "ok": True}
+        self.steps.append(entry)
+        try:
+            yield
+        except BaseException:
+            entry["ok"] = False
+            raise
+        finally:
+            entry["ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+    def as_dict(self) -> Dict:
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "import_ms": round(sum(i["ms"] for i in self.imports), 2),
+            "startup_ms": round(sum(s["ms"] or 0 for s in self.steps if not s["deferred"]), 2),
+            "imports": list(self.imports),
+            "steps": list(self.steps),
+        }
+
+    def log_report(self) -> None:
+        data = self.as_dict()
+        lines = [f"Startup: imports {data['import_ms']:.0f} ms, blocking steps {data['startup_ms']:.0f} ms"]
+        for i in sorted(data["imports"], key=lambda i: i["ms"], reverse=True):
+            lines.append(f"  import {i['name']:<32} {i['ms']:>9.1f} ms")
+        for s in data["steps"]:
+            suffix = " (deferred)" if s["deferred"] else ""
+            status = "" if s["ok"] else " FAILED"
+            ms = "running" if s["ms"] is None else f"{s['ms']:.1f} ms"
+            lines.append(f"  step   {s['name']:<32} {ms:>12}{suffix}{status}")
+        logger.info("\n".join(lines))
+
+
+# Process-wide profile filled in by api.main
+startup_profile = StartupProfile()
@@ -1,15 +1,29 @@
+import time
+_import_start = time.perf_counter()
 
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from contextlib import asynccontextmanager
-from api.routes import auth, vehicles, customers, rentals, reviews, loyalty, maintenance, analytics
-from api.routes.auth import get_current_active_user
+from api.core.startup import startup_profile
+startup_profile.record_import("fastapi", time.perf_counter() - _import_start)
+
+_import_start = time.perf_counter()
 from api.core.middleware import ErrorHandlingMiddleware
+from api.core.compression import CompressionMiddleware
+from api.core.metrics import MetricsMiddleware, render_metrics
 from api.core.config import settings
-from database.connection import connect_db
-from jose import jwt, JWTError
+from api.core.cache import bump_version, last_modified
+from database.connection import configure_replica, connect_db, get_pool
+from database.migrations import apply_migrations
+from database.replica import replica
+startup_profile.record_import("api.core + database", time.perf_counter() - _import_start)
+
+# auth is needed up front for the dependency below; the other routers are
+# imported (and timed) where they are mounted at the bottom of this module
+auth = startup_profile.import_module("api.routes.auth")
+from api.routes.auth import decode_access_token, get_current_active_user, load_auth_backends
 import re
 import asyncio
 import logging
@@ -65,6 +79,19 @@ def _ensure_schema():
         logger.warning(f"Schema seed skipped: {e}")
 
 
+def _apply_migrations():
+    try:
+        db = connect_db()
+        try:
+            applied = apply_migrations(db)
+        finally:
+            db.close()
+        if applied:
+            logger.info(f"Applied migrations: {', '.join(applied)}")
+    except Exception as e:
+        logger.warning(f"Migrations skipped: {e}")
+
+
 def _ensure_users():
     """
     Create the users table and default accounts if they don't exist.
@@ -138,6 +165,7 @@ def _refresh_demo_dates():
               AND pickup_datetime < NOW()
         """)
         db.commit()
+        bump_version("Rental")
         cursor.close()
         db.close()
     except Exception as e:
@@ -150,14 +178,49 @@ async def _demo_refresh_loop():
         _refresh_demo_dates()
 
 
+def run_startup_tasks(deferred: bool = False):
+    """One-time preparation done before serving requests, timed step by step."""
+    with startup_profile.step("db_pool", deferred):
+        get_pool()                                    # open pooled connections
+    with startup_profile.step("ensure_schema", deferred):
+        _ensure_schema()                              # seed DB if old/empty data
+    with startup_profile.step("migrations", deferred):
+        _apply_migrations()                           # tables/indexes added since schema.sql
+    with startup_profile.step("ensure_users", deferred):
+        _ensure_users()                               # create admin + demo if missing
+    with startup_profile.step("refresh_demo_dates", deferred):
+        _refresh_demo_dates()                         # keep demo dates current
+    with startup_profile.step("auth_backends", deferred):
+        load_auth_backends()                          # jose/passlib, so the first login isn't slow
+
+
+async def _deferred_startup():
+    await asyncio.to_thread(run_startup_tasks, True)
+    startup_profile.log_report()
+
+
+# Set by api.serve once the parent process has run the startup tasks (it also
+# owns the 24 h demo refresh), so forked workers skip both
+STARTUP_TASKS_DONE = False
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    _ensure_schema()                                  # seed DB if old/empty data
-    _ensure_users()                                   # create admin + demo if missing
-    _refresh_demo_dates()                             # keep demo dates current
+    if STARTUP_TASKS_DONE:
+        yield
+        return
+    if settings.STARTUP_DEFER_TASKS:
+        # Serve immediately; seeding and warm-up finish in a worker thread
+        startup = asyncio.create_task(_deferred_startup())
+    else:
+        run_startup_tasks()
+        startup = None
+        startup_profile.log_report()
     task = asyncio.create_task(_demo_refresh_loop())  # then every 24 h
     yield
     task.cancel()
+    if startup is not None:
+        startup.cancel()
 
 
 class DemoReadOnlyMiddleware(BaseHTTPMiddleware):
@@ -170,28 +233,57 @@ class DemoReadOnlyMiddleware(BaseHTTPMiddleware):
         if request.method in self.WRITE_METHODS and request.url.path not in self.EXEMPT_PATHS:
             token = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
             if token:
-                try:
-                    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-                    if payload.get("sub") == "demo":
-                        return JSONResponse(
-                            status_code=403,
-                            content={"detail": "Demo account is read-only. Contact us for full access."}
-                        )
-                except JWTError:
-                    pass
+                payload = decode_access_token(token)
+                if payload is not None and payload.get("sub") == "demo":
+                    return JSONResponse(
+                        status_code=403,
+                        content={"detail": "Demo account is read-only. Contact us for full access."}
+                    )
         return await call_next(request)
 
 
 app = FastAPI(title="Car Rental API", lifespan=lifespan)
 
+# Read replica for the heavy read-only routes; the table versions double as the
+# read-after-write clock (shared across workers under api.serve)
+if settings.DB_REPLICA_HOST:
+    replica_overrides = {"host": settings.DB_REPLICA_HOST, "port": settings.DB_REPLICA_PORT}
+    if settings.DB_REPLICA_USER:
+        replica_overrides["user"] = settings.DB_REPLICA_USER
+    if settings.DB_REPLICA_PASSWORD is not None:
+        replica_overrides["password"] = settings.DB_REPLICA_PASSWORD
+    configure_replica(
+        pool_size=settings.DB_REPLICA_POOL_SIZE,
+        max_lag=settings.DB_REPLICA_MAX_LAG_SECONDS,
+        check_interval=settings.DB_REPLICA_LAG_CHECK_SECONDS,
+        **replica_overrides,
+    )
+    replica.set_write_clock(last_modified)
+
 # Root endpoint for health checks and uptime monitors
 @app.get("/")
 def root():
     return {"status": "ok"}
 
+
+# Prometheus scrape endpoint: per-route latency, DB time, query counts, pool wait
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Add custom middleware (order matters — outermost runs first)
 app.add_middleware(DemoReadOnlyMiddleware)
 app.add_middleware(ErrorHandlingMiddleware)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    brotli_level=settings.COMPRESSION_BROTLI_LEVEL,
+    zstd_level=settings.COMPRESSION_ZSTD_LEVEL,
+)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, server_timing_header=settings.SERVER_TIMING_HEADER)
 
 # CORS configuration - allow all Vercel deployments and localhost
 # Using regex pattern to match any Vercel preview URL for car-rental-management-system
@@ -223,44 +315,30 @@ app.add_middleware(
     max_age=3600,
 )
 
-# Public routes for authentication
-app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
+# Routers: (module under api.routes, prefix, requires login). analytics sets
+# its own prefix and checks the token per route.
+ROUTERS = [
+    ("auth", "/api/auth", False),
+    ("vehicles", "/api/vehicles", True),
+    ("customers", "/api/customers", True),
+    ("rentals", "/api/rentals", True),
+    ("loyalty", "/api/loyalty", True),
+    ("reviews", "/api/reviews", True),
+    ("maintenance", "/api/maintenance", True),
+    ("pricing", "/api/pricing", True),
+    ("payments", "/api/payments", True),
+    ("analytics", None, False),
+    ("admin", "/api/admin", True),
+]
 
-# Protected routes requiring authentication
-app.include_router(
-    vehicles.router,
-    prefix="/api/vehicles",
-    tags=["vehicles"],
-    dependencies=[Depends(get_current_active_user)]
-)
-app.include_router(
-    customers.router,
-    prefix="/api/customers",
-    tags=["customers"],
-    dependencies=[Depends(get_current_active_user)]
-)
-app.include_router(
-    rentals.router,
-    prefix="/api/rentals",
-    tags=["rentals"],
-    dependencies=[Depends(get_current_active_user)]
-)
-app.include_router(
-    loyalty.router,
-    prefix="/api/loyalty",
-    tags=["loyalty"],
-    dependencies=[Depends(get_current_active_user)]
-)
-app.include_router(
-    reviews.router,
-    prefix="/api/reviews",
-    tags=["reviews"],
-    dependencies=[Depends(get_current_active_user)]
-)
-app.include_router(
-    maintenance.router,
-    prefix="/api/maintenance",
-    tags=["maintenance"],
-    dependencies=[Depends(get_current_active_user)]
-)
-app.include_router(analytics.router)
+for _name, _prefix, _protected in ROUTERS:
+    _module = auth if _name == "auth" else startup_profile.import_module(f"api.routes.{_name}")
+    if _prefix is None:
+        app.include_router(_module.router)
+        continue
+    app.include_router(
+        _module.router,
+        prefix=_prefix,
+        tags=[_name],
+        dependencies=[Depends(get_current_active_user)] if _protected else [],
+    )
@@ -0,0 +1,73 @@
+import os
+
+from fastapi import APIRouter, HTTPException, Query
+
+from api.core.startup import startup_profile
+from database.connection import connect_db
+from database.instrumentation import slow_query_log
+from database.replica import replica
+
+router = APIRouter()
+
+
+@router.get("/slow-queries")
+def get_slow_queries(
+    limit: int = Query(50, ge=1, le=500),
+    explain: bool = Query(False, description="Capture EXPLAIN FORMAT=JSON for each entry")
+):
+    """
+    Return the newest entries of the slow-query log.
+    Plans are captured on demand and cached on the entry. Under the prefork
+    server the log belongs to the worker that answers (`worker`).
+    """
+    entries = slow_query_log.entries(limit)
+    if explain:
+        db = connect_db()
+        try:
+            for entry in entries:
+                try:
+                    entry["plan"] = slow_query_log.explain(entry["id"], db)
+                except Exception as e:
+                    entry["plan_error"] = str(e)
+        finally:
+            db.close()
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "worker": os.getpid(),
+        "entries": entries,
+    }
+
+
+@router.get("/slow-queries/{entry_id}/explain")
+def explain_slow_query(entry_id: int):
+    """Run EXPLAIN FORMAT=JSON for a single slow-query entry."""
+    if slow_query_log.get(entry_id) is None:
+        raise HTTPException(status_code=404, detail="Slow query entry not found")
+    db = connect_db()
+    try:
+        plan = slow_query_log.explain(entry_id, db)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"EXPLAIN failed: {str(e)}")
+    finally:
+        db.close()
+    return {"id": entry_id, "plan": plan}
+
+
+@router.delete("/slow-queries")
+def clear_slow_queries():
+    slow_query_log.clear()
+    return {"message": "Slow query log cleared"}
+
+
+@router.get("/startup-profile")
+def get_startup_profile():
+    """Import and lifespan step timings recorded when this process booted."""
+    return startup_profile.as_dict()
+
+
+@router.get("/replica")
+def get_replica_status(refresh: bool = Query(False, description="Re-check replication lag now")):
+    """Read-replica health, lag and how replica-eligible reads were served."""
+    if refresh and replica.enabled:
+        replica.check(force=True)
+    return replica.status()
@@ -1,11 +1,119 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from database.connection import get_db_connection
-from api.routes.auth import get_current_user
+from database.replica import reads_from_replica
+from api.routes.auth import get_current_user, get_current_active_user
+from api.core.cache import TTLCache, make_etag, etag_matches, table_versions
+from api.services.maintenance import fleet_forecast
 import datetime
+import json
 
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
+# Dashboard KPIs change slowly relative to how often the page is opened;
+# a short TTL keeps the overdue count fresh without re-aggregating per request.
+SUMMARY_TTL_SECONDS = 30
+_summary_cache = TTLCache(ttl=SUMMARY_TTL_SECONDS, maxsize=4)
+SUMMARY_TABLES = ("Vehicle", "Rental", "Customer")
+
+
+def _build_summary() -> dict:
+    """Compute the dashboard KPIs with one aggregate query per table."""
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT
+                COUNT(*) as total_vehicles,
+                COALESCE(SUM(status = 'Available'), 0) as available_vehicles,
+                COALESCE(SUM(status = 'Rented'), 0) as rented_vehicles
+            FROM Vehicle
+        """)
+        vehicles = cursor.fetchone()
+
+        cursor.execute("""
+            SELECT
+                COALESCE(SUM(status = 'Active' AND actual_return_datetime IS NULL
+                             AND return_datetime >= NOW()), 0) as active_rentals,
+                COALESCE(SUM(status = 'Active' AND actual_return_datetime IS NULL
+                             AND return_datetime < NOW()), 0) as overdue_returns,
+                AVG(CASE WHEN status = 'Completed'
+                         THEN DATEDIFF(return_datetime, pickup_datetime) END) as avg_duration_days
+            FROM Rental
+        """)
+        rentals = cursor.fetchone()
+
+        cursor.execute("SELECT COUNT(*) as total_customers FROM Customer")
+        customers = cursor.fetchone()
+
+        # The dashboard also lists the latest few bookings
+        cursor.execute("""
+            SELECT
+                r.rental_id,
+                CONCAT(c.first_name, ' ', c.last_name) as customer_name,
+                CONCAT(v.brand, ' ', v.model) as vehicle_info,
+                DATE(r.pickup_datetime) as pickup_date,
+                CASE
+                    WHEN r.status = 'Active'
+                         AND r.actual_return_datetime IS NULL
+                         AND r.return_datetime < NOW()
+                    THEN 'Overdue'
+                    ELSE r.status
+                END as status
+            FROM Rental r
+            JOIN Customer c ON r.customer_id = c.customer_id
+            JOIN Vehicle v ON r.vehicle_id = v.vehicle_id
+            ORDER BY r.pickup_datetime DESC
+            LIMIT 6
+        """)
+        recent_rentals = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    avg_duration = rentals["avg_duration_days"]
+    return {
+        "total_vehicles": int(vehicles["total_vehicles"]),
+        "available_vehicles": int(vehicles["available_vehicles"]),
+        "rented_vehicles": int(vehicles["rented_vehicles"]),
+        "active_rentals": int(rentals["active_rentals"]),
+        "overdue_returns": int(rentals["overdue_returns"]),
+        "avg_duration_days": round(float(avg_duration)) if avg_duration is not None else 0,
+        "total_customers": int(customers["total_customers"]),
+        "recent_rentals": [
+            {**r, "pickup_date": str(r["pickup_date"]) if r["pickup_date"] else None}
+            for r in recent_rentals
+        ],
+        "generated_at": datetime.datetime.now().isoformat(),
+    }
+
+
+@router.get("/summary")
+@reads_from_replica(*SUMMARY_TABLES)
+async def get_dashboard_summary(request: Request, current_user = Depends(get_current_active_user)):
+    """
+    Get the dashboard KPIs in a single small payload (requires login: it
+    includes customer names in recent_rentals).
+    Cached until the next write to a source table (or the TTL lapses) and
+    served with an ETag so unchanged summaries are answered with 304.
+    """
+    key = table_versions(*SUMMARY_TABLES)
+    try:
+        entry = _summary_cache.get(key)
+        if entry is None:
+            body = json.dumps(_build_summary()).encode()
+            entry = (body, make_etag(body))
+            _summary_cache.set(key, entry)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching summary: {str(e)}")
+
+    body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/dashboard")
+@reads_from_replica("Vehicle", "Rental", "VehicleMaintenance")
 async def get_dashboard_analytics():
     """Get comprehensive dashboard analytics"""
     try:
@@ -47,24 +155,29 @@ async def get_dashboard_analytics():
         """)
         customer_insights = cursor.fetchone()
         
-        # Maintenance alerts - vehicles due for maintenance
-        cursor.execute("""
-            SELECT 
-                v.brand,
-                v.model,
-                v.vehicle_code,
-                DATEDIFF(CURRENT_DATE, COALESCE(vm.last_maintenance_date, v.vehicle_id * 10)) as days_since_maintenance
-            FROM Vehicle v
-            LEFT JOIN (
-                SELECT vehicle_id, MAX(maintenance_date) as last_maintenance_date
-                FROM VehicleMaintenance 
-                GROUP BY vehicle_id
-            ) vm ON v.vehicle_id = vm.vehicle_id
-            WHERE DATEDIFF(CURRENT_DATE, COALESCE(vm.last_maintenance_date, DATE_SUB(CURRENT_DATE, INTERVAL 60 DAY))) > 30
-            ORDER BY days_since_maintenance DESC
-            LIMIT 5
-        """)
-        maintenance_alerts = cursor.fetchall()
+        # Maintenance alerts - vehicles whose forecast service date is closest
+        forecast_cursor = conn.cursor()
+        try:
+            forecasts = fleet_forecast.forecasts(forecast_cursor)
+        finally:
+            forecast_cursor.close()
+        today = datetime.date.today()
+        maintenance_alerts = [
+            {
+                "vehicle_code": f["vehicle_code"],
+                "vehicle_info": f["vehicle_info"],
+                "days_since_maintenance": (
+                    (today - datetime.date.fromisoformat(f["last_service_date"])).days
+                    if f["last_service_date"] else None
+                ),
+                "last_service_date": f["last_service_date"],
+                "next_service_date": f["next_service_date"],
+                "days_until_due": f["days_until_due"],
+                "status": f["status"],
+            }
+            for f in forecasts
+            if f["status"] in ("overdue", "due_soon")
+        ][:5]
         
         cursor.close()
         conn.close()
@@ -81,6 +194,7 @@ async def get_dashboard_analytics():
         raise HTTPException(status_code=500, detail=f"Error fetching analytics: {str(e)}")
 
 @router.get("/revenue")
+@reads_from_replica("Rental")
 async def get_revenue_analytics(period: str = "month"):
     """Get revenue analytics"""
     try:
@@ -128,6 +242,7 @@ async def get_revenue_analytics(period: str = "month"):
         raise HTTPException(status_code=500, detail=f"Error fetching revenue: {str(e)}")
 
 @router.get("/fleet-status") 
+@reads_from_replica("Vehicle", "Branch")
 async def get_fleet_status():
     """Get fleet status overview"""
     try:
@@ -1,12 +1,11 @@
 import hashlib
 import logging
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from pydantic import BaseModel
 
 from api.core.config import settings
@@ -18,7 +17,6 @@ SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES or (60 * 24)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 router = APIRouter()
@@ -43,6 +41,30 @@ class UserInDB(User):
     hashed_password: str
 
 
+# ── Crypto backends ───────────────────────────────────────────────────────────
+# jose and passlib are imported on first use; together they add ~90 ms to a
+# cold import of the app. load_auth_backends() warms them during startup.
+
+@lru_cache(maxsize=None)
+def _pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def load_auth_backends() -> None:
+    import jose.jwt  # noqa: F401
+    _pwd_context()
+
+
+def decode_access_token(token: str) -> Optional[dict]:
+    """Return the token's claims, or None if it is invalid or expired."""
+    from jose import JWTError, jwt
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+
+
 # ── Password helpers ──────────────────────────────────────────────────────────
 
 def _is_legacy_sha256(h: str) -> bool:
@@ -54,11 +76,11 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     if _is_legacy_sha256(hashed_password):
         # Accept legacy hash; caller will upgrade it to bcrypt
         return hashlib.sha256(plain_password.encode()).hexdigest() == hashed_password
-    return pwd_context.verify(plain_password, hashed_password)
+    return _pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return _pwd_context().hash(password)
 
 
 def _upgrade_to_bcrypt(username: str, plain_password: str) -> None:
@@ -118,6 +140,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
     to_encode.update({"exp": expire})
+    from jose import jwt
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
@@ -129,14 +152,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
+    payload = decode_access_token(token)
+    if payload is None:
+        raise credentials_exception
+    username: str = payload.get("sub")
+    if username is None:
         raise credentials_exception
+    token_data = TokenData(username=username)
     user = get_user(username=token_data.username)
     if user is None:
         raise credentials_exception
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from typing import List, Optional
 from pydantic import BaseModel, EmailStr, Field
 import re
 
 from database.connection import connect_db
+from api.core.cache import bump_version, check_not_modified
+from api.core.serialization import RowSerializer, as_bool, as_date, fast_json_enabled, json_response
 
 router = APIRouter()
 
@@ -40,12 +42,31 @@ class CustomerOut(CustomerBase):
     phone: Optional[str] = None  # no pattern constraint on output — stores any format
 
 
+# Fast-path equivalent of CustomerOut over the get_customers select list
+CUSTOMER_ROW = RowSerializer([
+    ("first_name", 2, None),
+    ("last_name", 3, None),
+    ("email", 4, None),
+    ("phone", 5, None),
+    ("date_of_birth", 9, as_date),
+    ("license_number", 6, None),
+    ("country_of_residence", 7, None),
+    ("is_loyalty_member", 8, as_bool),
+    ("customer_id", 0, None),
+    ("customer_code", 1, None),
+])
+
+
 @router.get("/", response_model=List[CustomerOut])
-def get_customers(search: Optional[str] = None):
+def get_customers(request: Request, response: Response, search: Optional[str] = None):
     """
     Get all customers, optionally filtered by search term.
     Search applies to name, email, and phone.
     """
+    not_modified = check_not_modified(request, response, ("Customer",))
+    if not_modified:
+        return not_modified
+
     db = connect_db()
     cursor = db.cursor()
     
@@ -74,6 +95,9 @@ def get_customers(search: Optional[str] = None):
     cursor.close()
     db.close()
 
+    if fast_json_enabled():
+        return json_response(CUSTOMER_ROW.render(rows), response)
+
     return [
         CustomerOut(
             customer_id=row[0],
@@ -182,6 +206,7 @@ def create_customer(customer: CustomerCreate):
             )
         )
         db.commit()
+        bump_version("Customer")
         customer_id = cursor.lastrowid
         
         # Fetch the created customer
@@ -262,6 +287,7 @@ def update_customer(customer_id: int, customer: CustomerUpdate):
     try:
         cursor.execute(query, values)
         db.commit()
+        bump_version("Customer")
         
         # Fetch the updated customer
         cursor.execute(
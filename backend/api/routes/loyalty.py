@@ -1,14 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from typing import List, Optional
 from pydantic import BaseModel, Field
 from datetime import date
 from decimal import Decimal
 
 from database.connection import connect_db
+from database.replica import reads_from_replica
+from database.retry import run_transaction
 from api.routes.auth import get_current_active_user
+from api.core.cache import TTLCache, bump_version, check_not_modified, job_versions, table_versions
+from api.core.config import settings
+from api.services import loyalty as ledger
 
 router = APIRouter()
 
+# Leaderboard and distribution are cached per worker until the next write to
+# the tables they read, by this API or by a loyalty job (ledger.RANKING_JOBS);
+# the TTL only bounds how long an idle entry is kept
+RANKING_TABLES = ("LoyaltyProgram", "Customer")
+_ranking_cache = TTLCache(ttl=300, maxsize=64)
+
 class LoyaltyProgramBase(BaseModel):
     customer_id: int
     points_balance: int = 0
@@ -24,15 +35,57 @@ class LoyaltyProgramOut(LoyaltyProgramBase):
     program_id: int
 
 
-@router.post("/", response_model=LoyaltyProgramOut)
-async def create_loyalty_program(program: LoyaltyProgramCreate, current_user = Depends(get_current_active_user)):
+class LeaderboardEntry(BaseModel):
+    rank: int
+    customer_id: int
+    customer_name: str
+    membership_tier: str
+    points_balance: int
+
+
+class TierCount(BaseModel):
+    tier: str
+    members: int
+
+
+class TierDistribution(BaseModel):
+    total_members: int
+    tiers: List[TierCount]
+
+
+def _ranking_response(request: Request, response: Response, key, build):
+    """
+    304 while the client's copy is current, else the cached or freshly built
+    ranking. The job versions are read on the same (possibly replica)
+    connection as the ranking, so the ETag never runs ahead of the data; on
+    a replica, a job's changes show up within DB_REPLICA_MAX_LAG_SECONDS.
+    """
     db = connect_db()
     cursor = db.cursor()
-    
     try:
-        # Check if customer exists and is not already a loyalty member
+        jobs = job_versions(cursor, ledger.RANKING_JOBS)
+        not_modified = check_not_modified(request, response, RANKING_TABLES, jobs=jobs)
+        if not_modified:
+            return not_modified
+        key = (table_versions(*RANKING_TABLES), jobs[0]) + key
+        result = _ranking_cache.get(key)
+        if result is None:
+            result = build(cursor)
+            _ranking_cache.set(key, result)
+        return result
+    finally:
+        cursor.close()
+        db.close()
+
+
+@router.post("/", response_model=LoyaltyProgramOut)
+def create_loyalty_program(program: LoyaltyProgramCreate, current_user = Depends(get_current_active_user)):
+    def enroll(cursor):
+        # Check if customer exists and is not already a loyalty member; the
+        # lock makes a concurrent enrollment wait and then see the membership,
+        # so only one opening entry is written
         cursor.execute(
-            "SELECT is_loyalty_member FROM Customer WHERE customer_id = %s",
+            "SELECT is_loyalty_member FROM Customer WHERE customer_id = %s FOR UPDATE",
             (program.customer_id,)
         )
         customer = cursor.fetchone()
@@ -41,7 +94,8 @@ async def create_loyalty_program(program: LoyaltyProgramCreate, current_user = D
         if customer[0]:
             raise HTTPException(status_code=400, detail="Customer is already a loyalty member")
 
-        # Create loyalty program entry
+        # Create loyalty program entry, with its opening ledger entry and
+        # tier count, all committed together
         cursor.execute(
             """
             INSERT INTO LoyaltyProgram (
@@ -56,29 +110,117 @@ async def create_loyalty_program(program: LoyaltyProgramCreate, current_user = D
             )
         )
         program_id = cursor.lastrowid
+        ledger.record_entry(cursor, program.customer_id, program.points_balance, "opening")
+        ledger.move_members(cursor, {(None, program.membership_tier): 1})
 
         # Update customer's loyalty status
         cursor.execute(
             "UPDATE Customer SET is_loyalty_member = TRUE WHERE customer_id = %s",
             (program.customer_id,)
         )
-        
-        db.commit()
-        
-        return LoyaltyProgramOut(
-            program_id=program_id,
-            customer_id=program.customer_id,
-            points_balance=program.points_balance,
-            membership_tier=program.membership_tier,
-            date_joined=program.date_joined
-        )
+        return program_id
 
+    try:
+        # Not idempotent: an enrollment whose COMMIT outcome is unknown is not re-run
+        program_id = run_transaction(enroll, "create_loyalty_program")
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
-        db.close()
+    bump_version("LoyaltyProgram", "Customer")
+
+    return LoyaltyProgramOut(
+        program_id=program_id,
+        customer_id=program.customer_id,
+        points_balance=program.points_balance,
+        membership_tier=program.membership_tier,
+        date_joined=program.date_joined
+    )
+
+
+@router.post("/accrual")
+def run_points_accrual(current_user = Depends(get_current_active_user)):
+    """
+    Credit points for every rental completed since the last run, in one batch.
+    Safe to call repeatedly; also available as `python -m cli.manage loyalty-accrual`.
+    """
+    try:
+        result = run_transaction(
+            lambda cursor: ledger.accrue_completed_rentals(
+                cursor, settings.LOYALTY_POINTS_PER_UNIT, settings.LOYALTY_ACCRUAL_LOOKBACK_DAYS
+            ),
+            "loyalty_accrual",
+            idempotent=True,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if result["rentals_credited"]:
+        bump_version("LoyaltyProgram")
+    return result
+
+
+@router.post("/tiers/recompute")
+def recompute_membership_tiers(
+    dry_run: bool = Query(True, description="Only report the changes (default); false applies them"),
+    reset: bool = Query(False, description="Drop members below the lowest threshold to Bronze"),
+    chunk_size: int = Query(50000, ge=1000, le=500000),
+    silver: Optional[int] = Query(None, description="Preview a different Silver threshold (dry run only)"),
+    gold: Optional[int] = Query(None, description="Preview a different Gold threshold (dry run only)"),
+    platinum: Optional[int] = Query(None, description="Preview a different Platinum threshold (dry run only)"),
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Recompute every member's tier from their balance in chunked set-based
+    UPDATEs. Also available as `python -m cli.manage loyalty-tiers`.
+    """
+    configured = dict(settings.LOYALTY_TIER_THRESHOLDS)
+    proposed = {
+        tier: value if value is not None else configured[tier]
+        for tier, value in (("Silver", silver), ("Gold", gold), ("Platinum", platinum))
+    }
+    try:
+        thresholds = ledger.tier_thresholds(proposed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not dry_run and thresholds != ledger.TIER_THRESHOLDS:
+        # Points changes keep using the configured thresholds; applying others would not stick
+        raise HTTPException(
+            status_code=400,
+            detail="Only the configured thresholds can be applied; set LOYALTY_TIER_THRESHOLDS and restart first",
+        )
+    try:
+        result = ledger.recompute_tiers(thresholds, reset=reset, dry_run=dry_run, chunk_size=chunk_size)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if result["changed"] and not dry_run:
+        bump_version("LoyaltyProgram")
+    return result
+
+
+@router.get("/leaderboard", response_model=List[LeaderboardEntry])
+@reads_from_replica(*RANKING_TABLES)
+def get_leaderboard(
+    request: Request,
+    response: Response,
+    tier: Optional[str] = Query(None, pattern='^(Bronze|Silver|Gold|Platinum)$'),
+    limit: int = Query(10, ge=1, le=100),
+    current_user = Depends(get_current_active_user)
+):
+    """Top members by points balance, overall or within one tier."""
+    return _ranking_response(
+        request, response, ("leaderboard", tier, limit), lambda cursor: ledger.leaderboard(cursor, tier, limit)
+    )
+
+
+@router.get("/distribution", response_model=TierDistribution)
+@reads_from_replica("LoyaltyProgram")
+def get_tier_distribution(
+    request: Request,
+    response: Response,
+    current_user = Depends(get_current_active_user)
+):
+    """Member count per tier, from the counts maintained by every tier change."""
+    return _ranking_response(request, response, ("distribution",), ledger.tier_distribution)
 
 
 @router.get("/{customer_id}", response_model=LoyaltyProgramOut)
@@ -116,16 +258,14 @@ async def get_loyalty_program(customer_id: int, current_user = Depends(get_curre
 
 
 @router.put("/{customer_id}/points", response_model=LoyaltyProgramOut)
-async def update_points_balance(
+def update_points_balance(
     customer_id: int,
     points_change: int = Query(..., description="Points to add (positive) or subtract (negative)"),
     current_user = Depends(get_current_active_user)
 ):
-    db = connect_db()
-    cursor = db.cursor()
-    
-    try:
-        # Get current points and verify program exists
+    def apply_change(cursor):
+        # Get current points and verify program exists; the row stays locked
+        # until the transaction commits
         cursor.execute(
             """
             SELECT program_id, points_balance, membership_tier, date_joined
@@ -143,13 +283,9 @@ async def update_points_balance(
         new_balance = max(0, program[1] + points_change)  # Points can't go below 0
         
         # Update points balance and determine new tier
-        new_tier = program[2]  # Default to current tier
-        if new_balance >= 10000:
-            new_tier = 'Platinum'
-        elif new_balance >= 5000:
-            new_tier = 'Gold'
-        elif new_balance >= 1000:
-            new_tier = 'Silver'
+        new_tier = ledger.tier_for(new_balance, program[2])
+        ledger.record_entry(cursor, customer_id, new_balance - program[1], "adjustment")
+        ledger.move_members(cursor, {(program[2], new_tier): 1})
             
         cursor.execute(
             """
@@ -161,8 +297,6 @@ async def update_points_balance(
             (new_balance, new_tier, customer_id)
         )
         
-        db.commit()
-        
         return LoyaltyProgramOut(
             program_id=program[0],
             customer_id=customer_id,
@@ -171,40 +305,45 @@ async def update_points_balance(
             date_joined=program[3].strftime('%Y-%m-%d')
         )
 
+    try:
+        # A relative change is not idempotent: never re-run after an unknown COMMIT
+        result = run_transaction(apply_change, "update_points_balance")
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
-        db.close()
+    bump_version("LoyaltyProgram")
+    return result
 
 
 @router.delete("/{customer_id}")
-async def delete_loyalty_program(customer_id: int, current_user = Depends(get_current_active_user)):
-    db = connect_db()
-    cursor = db.cursor()
-    
-    try:
-        # Verify program exists
+def delete_loyalty_program(customer_id: int, current_user = Depends(get_current_active_user)):
+    def close(cursor):
+        # Verify program exists; the lock makes a concurrent delete wait and
+        # then find nothing, so only one closing entry is written
         cursor.execute(
-            "SELECT 1 FROM LoyaltyProgram WHERE customer_id = %s",
+            "SELECT points_balance, membership_tier FROM LoyaltyProgram WHERE customer_id = %s FOR UPDATE",
             (customer_id,)
         )
-        if not cursor.fetchone():
+        program = cursor.fetchone()
+        if not program:
             raise HTTPException(status_code=404, detail="Loyalty program not found for this customer")
-            
+        # Close the customer's ledger so it sums to zero, like the missing
+        # balance, and take the member out of their tier's count
+        ledger.record_entry(cursor, customer_id, -program[0], "closing")
+        ledger.move_members(cursor, {(program[1], None): 1})
+
         # Delete program (customer.is_loyalty_member will be updated by trigger)
         cursor.execute(
             "DELETE FROM LoyaltyProgram WHERE customer_id = %s",
             (customer_id,)
         )
-        
-        db.commit()
-        return {"message": "Loyalty program deleted successfully"}
 
+    try:
+        run_transaction(close, "delete_loyalty_program")
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
-        db.close()
\ No newline at end of file
+    bump_version("LoyaltyProgram")
+    return {"message": "Loyalty program deleted successfully"}
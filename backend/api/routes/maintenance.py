@@ -1,11 +1,18 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from typing import List, Optional
 from pydantic import BaseModel, Field, validator
 from datetime import date, datetime
 from decimal import Decimal
 
 from database.connection import connect_db
+from database.replica import reads_from_replica
+from database.retry import run_transaction
 from api.routes.auth import get_current_active_user
+from api.core.cache import bump_version, check_not_modified
+from api.core.serialization import RowSerializer, as_date, as_decimal, fast_json_enabled, json_response
+from api.services.maintenance import (
+    FORECAST_TABLES, cost_breakdown, cost_stats, fleet_forecast, refresh_cost_buckets,
+)
 
 router = APIRouter()
 
@@ -33,12 +40,46 @@ class MaintenanceOut(MaintenanceBase):
     vehicle_info: str  # e.g., "Toyota Camry (ABC-123)"
 
 
-@router.post("/", response_model=MaintenanceOut)
-async def create_maintenance(maintenance: MaintenanceCreate):
-    db = connect_db()
-    cursor = db.cursor()
-    
+class ServiceForecast(BaseModel):
+    vehicle_id: int
+    vehicle_code: str
+    vehicle_info: str
+    last_service_date: Optional[str] = None
+    services: int
+    service_interval_rental_days: float
+    interval_basis: str              # history, fleet or default
+    rental_days_since_service: float
+    daily_usage: float               # rental-days per day over the usage window
+    next_service_date: Optional[str] = None
+    due_by: Optional[str] = None     # usage or calendar
+    days_until_due: Optional[int] = None
+    status: str                      # overdue, due_soon, ok or unused
+
+
+# Fast-path equivalent of MaintenanceOut over `m.*` plus vehicle_info
+MAINTENANCE_ROW = RowSerializer([
+    ("vehicle_id", 1, None),
+    ("description", 2, None),
+    ("maintenance_date", 3, as_date),
+    ("cost", 4, as_decimal),
+    ("performed_by", 5, None),
+    ("maintenance_id", 0, None),
+    ("vehicle_info", 6, None),
+])
+
+
+def _parse_date(value: str) -> date:
     try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="maintenance_date must be YYYY-MM-DD")
+
+
+@router.post("/", response_model=MaintenanceOut)
+def create_maintenance(maintenance: MaintenanceCreate):
+    maintenance_date = _parse_date(maintenance.maintenance_date)
+
+    def create(cursor):
         # Verify vehicle exists
         cursor.execute(
             """
@@ -62,31 +103,35 @@ async def create_maintenance(maintenance: MaintenanceCreate):
             (
                 maintenance.vehicle_id,
                 maintenance.description,
-                maintenance.maintenance_date,
+                maintenance_date,
                 float(maintenance.cost) if maintenance.cost else None,
                 maintenance.performed_by
             )
         )
         maintenance_id = cursor.lastrowid
-        
-        db.commit()
-        
-        return MaintenanceOut(
-            maintenance_id=maintenance_id,
-            vehicle_info=vehicle[0],
-            **maintenance.dict()
-        )
+        refresh_cost_buckets(cursor, [(maintenance.vehicle_id, maintenance_date)])
+        return maintenance_id, vehicle[0]
 
+    try:
+        # Not idempotent: a record whose COMMIT outcome is unknown is not re-run
+        maintenance_id, vehicle_info = run_transaction(create, "create_maintenance")
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
-        db.close()
+    bump_version("VehicleMaintenance")
+
+    return MaintenanceOut(
+        maintenance_id=maintenance_id,
+        vehicle_info=vehicle_info,
+        **maintenance.dict()
+    )
 
 
 @router.get("/", response_model=List[MaintenanceOut])
 async def list_maintenance(
+    request: Request,
+    response: Response,
     vehicle_id: Optional[int] = None,
     start_date: Optional[str] = None,  # Format: YYYY-MM-DD
     end_date: Optional[str] = None,    # Format: YYYY-MM-DD
@@ -95,6 +140,10 @@ async def list_maintenance(
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0)
 ):
+    not_modified = check_not_modified(request, response, ("VehicleMaintenance", "Vehicle"))
+    if not_modified:
+        return not_modified
+
     db = connect_db()
     cursor = db.cursor()
     
@@ -138,6 +187,9 @@ async def list_maintenance(
         cursor.execute(query, params)
         records = cursor.fetchall()
 
+        if fast_json_enabled():
+            return json_response(MAINTENANCE_ROW.render(records), response)
+
         return [
             MaintenanceOut(
                 maintenance_id=r[0],
@@ -157,61 +209,73 @@ async def list_maintenance(
 
 
 @router.get("/stats")
+@reads_from_replica("Vehicle", "VehicleMaintenance")
 async def get_maintenance_stats(
     vehicle_id: Optional[int] = None,
     year: Optional[int] = None
 ):
+    """Records and cost per vehicle, from the monthly cost rollup."""
     db = connect_db()
     cursor = db.cursor()
-    
     try:
-        query = """
-            SELECT 
-                v.vehicle_id,
-                CONCAT(v.brand, ' ', v.model, ' (', v.plate_number, ')') as vehicle_info,
-                COUNT(m.maintenance_id) as maintenance_count,
-                COALESCE(SUM(m.cost), 0) as total_cost,
-                MIN(m.maintenance_date) as first_maintenance,
-                MAX(m.maintenance_date) as last_maintenance
-            FROM Vehicle v
-            LEFT JOIN VehicleMaintenance m ON v.vehicle_id = m.vehicle_id
-        """
-        params = []
-
-        if vehicle_id:
-            query += " WHERE v.vehicle_id = %s"
-            params.append(vehicle_id)
+        return cost_stats(cursor, vehicle_id, year)
+    finally:
+        cursor.close()
+        db.close()
 
-        if year:
-            query += " AND" if vehicle_id else " WHERE"
-            query += " YEAR(m.maintenance_date) = %s"
-            params.append(year)
 
-        query += """
-            GROUP BY v.vehicle_id
-            ORDER BY total_cost DESC
-        """
+@router.get("/stats/breakdown")
+@reads_from_replica("VehicleMaintenance")
+async def get_maintenance_cost_breakdown(
+    period: str = Query("year", pattern="^(year|month)$"),
+    vehicle_id: Optional[int] = None,
+    year: Optional[int] = None
+):
+    """Records and cost per year or month, fleet-wide or for one vehicle."""
+    db = connect_db()
+    cursor = db.cursor()
+    try:
+        return cost_breakdown(cursor, period, vehicle_id, year)
+    finally:
+        cursor.close()
+        db.close()
 
-        cursor.execute(query, params)
-        stats = cursor.fetchall()
 
-        return [
-            {
-                "vehicle_id": s[0],
-                "vehicle_info": s[1],
-                "maintenance_count": s[2],
-                "total_cost": float(s[3]),
-                "first_maintenance": s[4].strftime('%Y-%m-%d') if s[4] else None,
-                "last_maintenance": s[5].strftime('%Y-%m-%d') if s[5] else None,
-                "average_cost": float(s[3] / s[2]) if s[2] > 0 else 0
-            }
-            for s in stats
-        ]
+@router.get("/forecast", response_model=List[ServiceForecast])
+@reads_from_replica(*FORECAST_TABLES)
+async def get_maintenance_forecast(
+    request: Request,
+    response: Response,
+    status: Optional[str] = Query(None, pattern="^(overdue|due_soon|ok|unused)$"),
+    within_days: Optional[int] = Query(None, ge=0, description="Only vehicles due within this many days"),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Predicted next service date per vehicle, soonest first, from its service
+    history and rental usage (see api/services/maintenance.py).
+    """
+    # Forecasts move with the date as well as with writes
+    not_modified = check_not_modified(request, response, FORECAST_TABLES, ttl=3600)
+    if not_modified:
+        return not_modified
 
+    db = connect_db()
+    cursor = db.cursor()
+    try:
+        forecasts = fleet_forecast.forecasts(cursor)
     finally:
         cursor.close()
         db.close()
 
+    if status:
+        forecasts = [f for f in forecasts if f["status"] == status]
+    if within_days is not None:
+        forecasts = [
+            f for f in forecasts
+            if f["days_until_due"] is not None and f["days_until_due"] <= within_days
+        ]
+    return forecasts[:limit]
+
 
 @router.get("/{maintenance_id}", response_model=MaintenanceOut)
 async def get_maintenance(maintenance_id: int):
@@ -302,29 +366,36 @@ async def get_vehicle_maintenance_history(
 
 
 @router.put("/{maintenance_id}", response_model=MaintenanceOut)
-async def update_maintenance(
+def update_maintenance(
     maintenance_id: int,
     maintenance: MaintenanceUpdate
 ):
-    db = connect_db()
-    cursor = db.cursor()
-    
-    try:
-        # Build update query based on provided fields
-        update_parts = []
-        params = []
-        
-        for field, value in maintenance.dict(exclude_unset=True).items():
-            if value is not None:
-                update_parts.append(f"{field} = %s")
-                # Convert Decimal to float for MySQL
-                params.append(float(value) if isinstance(value, Decimal) else value)
-                
-        if not update_parts:
-            raise HTTPException(status_code=400, detail="No updates provided")
-            
-        params.append(maintenance_id)
-        
+    # Build update query based on provided fields
+    update_parts = []
+    params = []
+
+    for field, value in maintenance.dict(exclude_unset=True).items():
+        if value is not None:
+            if field == "maintenance_date":
+                value = _parse_date(value)
+            update_parts.append(f"{field} = %s")
+            # Convert Decimal to float for MySQL
+            params.append(float(value) if isinstance(value, Decimal) else value)
+
+    if not update_parts:
+        raise HTTPException(status_code=400, detail="No updates provided")
+
+    params.append(maintenance_id)
+
+    def update(cursor):
+        cursor.execute(
+            "SELECT vehicle_id, maintenance_date FROM VehicleMaintenance WHERE maintenance_id = %s FOR UPDATE",
+            (maintenance_id,)
+        )
+        previous = cursor.fetchone()
+        if not previous:
+            raise HTTPException(status_code=404, detail="Maintenance record not found")
+
         cursor.execute(
             f"""
             UPDATE VehicleMaintenance
@@ -333,10 +404,7 @@ async def update_maintenance(
             """,
             params
         )
-        
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Maintenance record not found")
-            
+
         # Fetch updated record
         cursor.execute(
             """
@@ -350,47 +418,50 @@ async def update_maintenance(
             (maintenance_id,)
         )
         record = cursor.fetchone()
-        
-        db.commit()
-        
-        return MaintenanceOut(
-            maintenance_id=record[0],
-            vehicle_id=record[1],
-            description=record[2],
-            maintenance_date=record[3].strftime('%Y-%m-%d'),
-            cost=record[4],
-            performed_by=record[5],
-            vehicle_info=record[6]
-        )
+        refresh_cost_buckets(cursor, [previous, (record[1], record[3])])
+        return record
 
+    try:
+        record = run_transaction(update, "update_maintenance", idempotent=True)
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
-        db.close()
+    bump_version("VehicleMaintenance")
+
+    return MaintenanceOut(
+        maintenance_id=record[0],
+        vehicle_id=record[1],
+        description=record[2],
+        maintenance_date=record[3].strftime('%Y-%m-%d'),
+        cost=record[4],
+        performed_by=record[5],
+        vehicle_info=record[6]
+    )
 
 
 @router.delete("/{maintenance_id}")
-async def delete_maintenance(maintenance_id: int):
-    db = connect_db()
-    cursor = db.cursor()
-    
-    try:
+def delete_maintenance(maintenance_id: int):
+    def delete(cursor):
         cursor.execute(
-            "DELETE FROM VehicleMaintenance WHERE maintenance_id = %s",
+            "SELECT vehicle_id, maintenance_date FROM VehicleMaintenance WHERE maintenance_id = %s FOR UPDATE",
             (maintenance_id,)
         )
-        
-        if cursor.rowcount == 0:
+        previous = cursor.fetchone()
+        if not previous:
             raise HTTPException(status_code=404, detail="Maintenance record not found")
-            
-        db.commit()
-        return {"message": "Maintenance record deleted successfully"}
 
+        cursor.execute(
+            "DELETE FROM VehicleMaintenance WHERE maintenance_id = %s",
+            (maintenance_id,)
+        )
+        refresh_cost_buckets(cursor, [previous])
+
+    try:
+        run_transaction(delete, "delete_maintenance")
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
-        db.close()
\ No newline at end of file
+    bump_version("VehicleMaintenance")
+    return {"message": "Maintenance record deleted successfully"}
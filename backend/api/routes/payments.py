@@ -0,0 +1,120 @@
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from typing import List, Optional
+from pydantic import BaseModel
+from datetime import date, datetime
+
+from database.connection import connect_db
+from api.core.cache import check_not_modified, job_versions
+from api.core.config import settings
+from api.services import payments as reconciliation
+
+router = APIRouter()
+
+KIND_PATTERN = "^(" + "|".join(reconciliation.EXCEPTION_KINDS) + ")$"
+
+
+class KindSummary(BaseModel):
+    kind: str
+    rentals: int
+    expected: float
+    paid: float
+    difference: float
+
+
+class ReconciliationSummary(BaseModel):
+    open_exceptions: int
+    kinds: List[KindSummary]
+    last_run_at: Optional[datetime] = None
+    runs: int
+    last_run: Optional[dict] = None
+
+
+class PaymentExceptionOut(BaseModel):
+    rental_id: int
+    kind: str
+    rental_status: str
+    pickup_date: date
+    expected: float
+    paid: float
+    difference: float
+    failed_payments: int
+    last_payment_date: Optional[date] = None
+    detected_at: datetime
+
+
+def _not_modified(request: Request, response: Response, cursor) -> Optional[Response]:
+    """
+    304 while no reconciliation has run since the client's copy. Runs rewrite
+    PaymentException from the CLI as well as from here, so the ETag comes from
+    the run count _record_run keeps in JobWatermark.
+    """
+    jobs = job_versions(cursor, (reconciliation.RECONCILIATION_JOB,))
+    return check_not_modified(request, response, (), jobs=jobs)
+
+
+@router.post("/reconciliation")
+def run_reconciliation(
+    days: Optional[int] = Query(None, ge=1, le=3660, description="Days of pickups to check (default: configured)"),
+):
+    """
+    Reconcile rentals picked up in the last `days` against their payments and
+    refresh the exceptions. Also available as `python -m cli.manage payments-reconcile`.
+    """
+    try:
+        result = reconciliation.reconcile_payments(
+            days or settings.PAYMENT_RECONCILIATION_DAYS, settings.PAYMENT_RECONCILIATION_CHUNK_SIZE
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return result
+
+
+@router.get("/reconciliation", response_model=ReconciliationSummary)
+def get_reconciliation_summary(request: Request, response: Response):
+    """Open payment exceptions per kind, and the last reconciliation run."""
+    db = connect_db()
+    cursor = db.cursor()
+    try:
+        not_modified = _not_modified(request, response, cursor)
+        if not_modified:
+            return not_modified
+        return reconciliation.exception_summary(cursor)
+    finally:
+        cursor.close()
+        db.close()
+
+
+@router.get("/reconciliation/exceptions", response_model=List[PaymentExceptionOut])
+def get_payment_exceptions(
+    request: Request,
+    response: Response,
+    kind: Optional[str] = Query(None, pattern=KIND_PATTERN),
+    before: Optional[int] = Query(None, description="rental_id of the last exception on the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Open exceptions, newest rental first."""
+    db = connect_db()
+    cursor = db.cursor()
+    try:
+        not_modified = _not_modified(request, response, cursor)
+        if not_modified:
+            return not_modified
+        rows = reconciliation.list_exceptions(cursor, kind, before, limit)
+    finally:
+        cursor.close()
+        db.close()
+    return [
+        PaymentExceptionOut(
+            rental_id=row[0],
+            kind=row[1],
+            rental_status=row[2],
+            pickup_date=row[3],
+            expected=float(row[4]),
+            paid=float(row[5]),
+            difference=float(row[6]),
+            failed_payments=row[7],
+            last_payment_date=row[8],
+            detected_at=row[9],
+        )
+        for row in rows
+    ]
@@ -0,0 +1,362 @@
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel, Field
+from typing import List, Optional, Union
+from datetime import date
+
+from database.connection import connect_db
+from database.retry import run_transaction
+from api.core.cache import bump_version
+from api.routes.rentals import parse_api_datetime
+from api.services.pricing import PROMO_COLUMNS, PromoNotApplicable, promo_index, quote, quote_window, rental_days
+
+router = APIRouter()
+
+# Largest list POST /quote prices in one request, and the most candidates
+# POST /quotes returns
+MAX_QUOTES = 500
+
+
+class QuoteRequest(BaseModel):
+    vehicle_id: int
+    pickup_datetime: str
+    return_datetime: str
+    promo_id: Optional[int] = None  # default: the best promo that applies automatically
+
+
+class AppliedPromo(BaseModel):
+    promo_id: int
+    name: str
+    discount_percent: int
+
+
+class QuoteOut(BaseModel):
+    vehicle_id: int
+    vehicle_info: str
+    days: int
+    daily_rate: float
+    base_price: float
+    promo: Optional[AppliedPromo] = None
+    discount: float
+    total: float
+
+
+class QuoteSearch(BaseModel):
+    pickup_datetime: str
+    return_datetime: str
+    # Candidates: these vehicles, or every vehicle matching the filters
+    vehicle_ids: Optional[List[int]] = Field(None, max_length=MAX_QUOTES)
+    type: Optional[str] = None
+    # Only bookable vehicles unless asked otherwise; null quotes every status
+    status: Optional[str] = "Available"
+    branch_id: Optional[int] = None
+    promo_id: Optional[int] = None
+    # Applies to filter searches; listed vehicle_ids are all quoted
+    limit: int = Field(200, ge=1, le=MAX_QUOTES)
+
+
+class CandidateQuote(QuoteOut):
+    vehicle_code: str
+    vehicle_type: Optional[str] = None
+    branch_id: int
+    late_fee_per_day: float  # charged for each calendar day returned late
+
+
+class QuoteGrid(BaseModel):
+    pickup_datetime: str
+    return_datetime: str
+    days: int
+    count: int
+    quotes: List[CandidateQuote]
+
+
+class PromoBase(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    discount_percent: int = Field(..., ge=1, le=100)
+    valid_from: date
+    valid_to: date
+    conditions: Optional[str] = None
+    min_days: Optional[int] = Field(None, ge=1)
+    vehicle_type: Optional[str] = Field(None, max_length=50)
+    auto_apply: bool = True
+
+
+class PromoCreate(PromoBase):
+    pass
+
+
+class PromoUpdate(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=100)
+    discount_percent: Optional[int] = Field(None, ge=1, le=100)
+    valid_from: Optional[date] = None
+    valid_to: Optional[date] = None
+    conditions: Optional[str] = None
+    min_days: Optional[int] = Field(None, ge=1)
+    vehicle_type: Optional[str] = Field(None, max_length=50)
+    auto_apply: Optional[bool] = None
+
+
+class PromoOut(PromoBase):
+    promo_id: int
+
+
+def _promo_from_row(row) -> PromoOut:
+    """PromoOut from a PROMO_COLUMNS row followed by conditions."""
+    return PromoOut(
+        promo_id=row[0],
+        name=row[1],
+        discount_percent=row[2],
+        valid_from=row[3],
+        valid_to=row[4],
+        min_days=row[5],
+        vehicle_type=row[6],
+        auto_apply=bool(row[7]),
+        conditions=row[8],
+    )
+
+
+def price_quotes(cursor, requests: List[QuoteRequest]) -> List[dict]:
+    """Price `requests` with one vehicle query; promos come from the in-memory index."""
+    vehicle_ids = sorted({r.vehicle_id for r in requests})
+    cursor.execute(
+        "SELECT vehicle_id, CONCAT(brand, ' ', model), daily_rate, type FROM Vehicle "
+        f"WHERE vehicle_id IN ({', '.join(['%s'] * len(vehicle_ids))})",
+        vehicle_ids
+    )
+    vehicles = {row[0]: row[1:] for row in cursor.fetchall()}
+    missing = [v for v in vehicle_ids if v not in vehicles]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Vehicle not found: {', '.join(map(str, missing))}")
+
+    promo_index.ensure_loaded(cursor)
+    quotes = []
+    for i, request in enumerate(requests):
+        prefix = f"Quote {i}: " if len(requests) > 1 else ""
+        try:
+            pickup = parse_api_datetime(request.pickup_datetime)
+            planned_return = parse_api_datetime(request.return_datetime)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=prefix + "Invalid date format")
+        if planned_return <= pickup:
+            raise HTTPException(status_code=400, detail=prefix + "return_datetime must be after pickup_datetime")
+        vehicle_info, daily_rate, vehicle_type = vehicles[request.vehicle_id]
+        try:
+            price = quote(promo_index, daily_rate, vehicle_type, pickup, planned_return, request.promo_id)
+        except PromoNotApplicable as e:
+            raise HTTPException(status_code=400, detail=prefix + str(e))
+        quotes.append({"vehicle_id": request.vehicle_id, "vehicle_info": vehicle_info, **price})
+    return quotes
+
+
+@router.post("/quote", response_model=Union[QuoteOut, List[QuoteOut]])
+def get_quote(request: Union[QuoteRequest, List[QuoteRequest]]):
+    """
+    Price a rental, or a list of rentals: daily rate times duration, less the
+    best promotion that applies (or the one named by promo_id).
+    """
+    requests = request if isinstance(request, list) else [request]
+    if not requests:
+        return []
+    if len(requests) > MAX_QUOTES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_QUOTES} quotes per request")
+
+    db = connect_db()
+    cursor = db.cursor()
+    try:
+        quotes = price_quotes(cursor, requests)
+    finally:
+        cursor.close()
+        db.close()
+    return quotes if isinstance(request, list) else quotes[0]
+
+
+@router.post("/quotes", response_model=QuoteGrid)
+def get_quotes(search: QuoteSearch):
+    """
+    Price every candidate vehicle for one rental window, cheapest first: the
+    listed vehicle_ids, or the vehicles matching type/status/branch_id (the
+    `limit` lowest daily rates). status defaults to Available. One vehicle
+    query; promos come from the in-memory index.
+    """
+    try:
+        pickup = parse_api_datetime(search.pickup_datetime)
+        planned_return = parse_api_datetime(search.return_datetime)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format")
+    if planned_return <= pickup:
+        raise HTTPException(status_code=400, detail="return_datetime must be after pickup_datetime")
+
+    query = """
+        SELECT vehicle_id, vehicle_code, CONCAT(brand, ' ', model), daily_rate, type, branch_id
+        FROM Vehicle
+        WHERE 1=1
+    """
+    params = []
+    if search.vehicle_ids:
+        query += f" AND vehicle_id IN ({', '.join(['%s'] * len(search.vehicle_ids))})"
+        params.extend(search.vehicle_ids)
+    if search.type:
+        query += " AND type = %s"
+        params.append(search.type)
+    if search.status:
+        query += " AND status = %s"
+        params.append(search.status)
+    if search.branch_id is not None:
+        query += " AND branch_id = %s"
+        params.append(search.branch_id)
+    query += " ORDER BY daily_rate, vehicle_id LIMIT %s"
+    params.append(len(search.vehicle_ids) if search.vehicle_ids else search.limit)
+
+    db = connect_db()
+    cursor = db.cursor()
+    try:
+        cursor.execute(query, params)
+        vehicles = cursor.fetchall()
+        promo_index.ensure_loaded(cursor)
+    finally:
+        cursor.close()
+        db.close()
+
+    try:
+        prices = quote_window(
+            promo_index, ((row[3] or 0, row[4]) for row in vehicles), pickup, planned_return, search.promo_id
+        )
+    except PromoNotApplicable as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    quotes = [
+        {
+            "vehicle_id": row[0],
+            "vehicle_code": row[1],
+            "vehicle_info": row[2],
+            "vehicle_type": row[4],
+            "branch_id": row[5],
+            "late_fee_per_day": price["daily_rate"],
+            **price,
+        }
+        for row, price in zip(vehicles, prices)
+    ]
+    quotes.sort(key=lambda q: (q["total"], q["vehicle_id"]))
+    return {
+        "pickup_datetime": search.pickup_datetime,
+        "return_datetime": search.return_datetime,
+        "days": rental_days(pickup, planned_return),
+        "count": len(quotes),
+        "quotes": quotes,
+    }
+
+
+@router.get("/promos", response_model=List[PromoOut])
+def list_promos(active_on: Optional[date] = Query(None, description="Only promos valid on this date")):
+    db = connect_db()
+    cursor = db.cursor()
+    try:
+        query = f"SELECT {PROMO_COLUMNS}, conditions FROM PromoOffer"
+        params = []
+        if active_on:
+            query += " WHERE valid_from <= %s AND valid_to >= %s"
+            params = [active_on, active_on]
+        query += " ORDER BY valid_from DESC, promo_id DESC"
+        cursor.execute(query, params)
+        return [_promo_from_row(row) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        db.close()
+
+
+@router.post("/promos", response_model=PromoOut)
+def create_promo(promo: PromoCreate):
+    if promo.valid_to < promo.valid_from:
+        raise HTTPException(status_code=400, detail="valid_to must not be before valid_from")
+
+    db = connect_db()
+    cursor = db.cursor()
+    try:
+        cursor.execute(
+            """
+            INSERT INTO PromoOffer (
+                name, discount_percent, valid_from, valid_to, conditions, min_days, vehicle_type, auto_apply
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            (
+                promo.name, promo.discount_percent, promo.valid_from, promo.valid_to,
+                promo.conditions, promo.min_days, promo.vehicle_type, promo.auto_apply
+            )
+        )
+        promo_id = cursor.lastrowid
+        db.commit()
+        bump_version("PromoOffer")
+        return PromoOut(promo_id=promo_id, **promo.model_dump())
+
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        cursor.close()
+        db.close()
+
+
+@router.put("/promos/{promo_id}", response_model=PromoOut)
+def update_promo(promo_id: int, promo: PromoUpdate):
+    updates = promo.model_dump(exclude_unset=True)
+    if not updates:
+        raise HTTPException(status_code=400, detail="No updates provided")
+
+    def update(cursor):
+        # Validated against the locked row, so a concurrent edit of the other
+        # end of the window cannot leave valid_to before valid_from
+        cursor.execute(
+            f"SELECT {PROMO_COLUMNS}, conditions FROM PromoOffer WHERE promo_id = %s FOR UPDATE",
+            (promo_id,)
+        )
+        row = cursor.fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="Promo not found")
+
+        updated = _promo_from_row(row).model_copy(update=updates)
+        if updated.valid_to < updated.valid_from:
+            raise HTTPException(status_code=400, detail="valid_to must not be before valid_from")
+
+        cursor.execute(
+            f"UPDATE PromoOffer SET {', '.join(f'{field} = %s' for field in updates)} WHERE promo_id = %s",
+            list(updates.values()) + [promo_id]
+        )
+        return updated
+
+    try:
+        updated = run_transaction(update, "update_promo", idempotent=True)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    bump_version("PromoOffer")
+    return updated
+
+
+@router.delete("/promos/{promo_id}")
+def delete_promo(promo_id: int):
+    def delete(cursor):
+        # Lock the promo first: a booking inserting its RentalPromo row holds
+        # a shared lock on it (foreign key check), so the check below either
+        # waits for that booking and sees it, or the booking waits for the
+        # delete and fails instead of losing its discount to the cascade
+        cursor.execute("SELECT promo_id FROM PromoOffer WHERE promo_id = %s FOR UPDATE", (promo_id,))
+        if not cursor.fetchone():
+            raise HTTPException(status_code=404, detail="Promo not found")
+        # Deleting would cascade to RentalPromo and drop the discount from
+        # bookings still to be priced on return
+        cursor.execute("SELECT 1 FROM RentalPromo WHERE promo_id = %s LIMIT 1", (promo_id,))
+        if cursor.fetchone():
+            raise HTTPException(
+                status_code=409,
+                detail="Promo has been applied to rentals; end it by setting valid_to instead",
+            )
+        cursor.execute("DELETE FROM PromoOffer WHERE promo_id = %s", (promo_id,))
+
+    try:
+        run_transaction(delete, "delete_promo")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    bump_version("PromoOffer")
+    return {"message": "Promo deleted successfully"}
@@ -1,19 +1,30 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime, date
 import json
 
 from database.connection import connect_db
+from database.retry import run_transaction
+from api.core.cache import bump_version, check_not_modified
+from api.services import rentals as rental_store
+from api.services.pricing import PromoNotApplicable, final_rental_cost, promo_index, quote
+from api.core.serialization import RowSerializer, as_float, as_str, fast_json_enabled, json_response
 
 router = APIRouter()
 
+# Tables the rental listing reads from; any write to them changes the ETag
+RENTAL_LIST_TABLES = ("Rental", "Customer", "Vehicle")
+# The Overdue status depends on NOW(), so list ETags also roll over every minute
+OVERDUE_ETAG_TTL_SECONDS = 60
+
 
 class RentalCreate(BaseModel):
     customer_id: int
     vehicle_id: int
     pickup_datetime: str
     return_datetime: str
+    promo_id: Optional[int] = None  # default: the best promo that applies automatically
 
 
 class RentalUpdate(BaseModel):
@@ -36,79 +47,75 @@ class RentalOut(BaseModel):
     total_cost: Optional[float] = None
 
 
+# Fast-path equivalent of RentalOut over the rental/customer/vehicle join
+RENTAL_ROW = RowSerializer([
+    ("rental_id", 0, None),
+    ("customer_id", 1, None),
+    ("customer_name", 2, None),
+    ("vehicle_id", 3, None),
+    ("vehicle_info", 4, None),
+    ("daily_rate", 5, as_float),
+    ("pickup_date", 6, as_str),
+    ("expected_return_date", 7, as_str),
+    ("actual_return_date", 8, as_str),
+    ("status", 9, None),
+    ("total_cost", 10, as_float),
+])
+
+
+def rental_from_row(row) -> RentalOut:
+    """Build a RentalOut from a row of the rental/customer/vehicle join."""
+    return RentalOut(
+        rental_id=row[0],
+        customer_id=row[1],
+        customer_name=row[2],
+        vehicle_id=row[3],
+        vehicle_info=row[4],
+        daily_rate=float(row[5]),
+        pickup_date=str(row[6]) if row[6] is not None else None,
+        expected_return_date=str(row[7]) if row[7] is not None else None,
+        actual_return_date=str(row[8]) if row[8] is not None else None,
+        status=row[9],
+        total_cost=float(row[10]) if row[10] is not None else None
+    )
+
+
+# ── Cost helpers ──────────────────────────────────────────────────────────────
+
+def parse_api_datetime(value: str) -> datetime:
+    """Parse an ISO-8601 timestamp from a request body (a trailing Z is UTC)."""
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
 @router.get("/", response_model=List[RentalOut])
 def get_rentals(
+    request: Request,
+    response: Response,
     status: Optional[str] = Query(None, pattern="^(ongoing|completed|cancelled)$"),
     customer_id: Optional[int] = None,
     vehicle_code: Optional[str] = None
 ):
     """Get all rentals, optionally filtered by status, customer, or vehicle"""
+    not_modified = check_not_modified(
+        request, response, RENTAL_LIST_TABLES, ttl=OVERDUE_ETAG_TTL_SECONDS
+    )
+    if not_modified:
+        return not_modified
+
     db = connect_db()
     cursor = db.cursor()
-    
-    query = """
-        SELECT
-            r.rental_id,
-            r.customer_id,
-            CONCAT(c.first_name, ' ', c.last_name) as customer_name,
-            r.vehicle_id,
-            CONCAT(v.brand, ' ', v.model) as vehicle_info,
-            v.daily_rate,
-            DATE(r.pickup_datetime) as pickup_date,
-            DATE(r.return_datetime) as expected_return_date,
-            DATE(r.actual_return_datetime) as actual_return_date,
-            CASE
-                WHEN r.status = 'Active'
-                     AND r.actual_return_datetime IS NULL
-                     AND r.return_datetime < NOW()
-                THEN 'Overdue'
-                ELSE r.status
-            END as effective_status,
-            r.total_cost
-        FROM Rental r
-        JOIN Customer c ON r.customer_id = c.customer_id
-        JOIN Vehicle v ON r.vehicle_id = v.vehicle_id
-        WHERE 1=1
-    """
-    params = []
-    
-    if status:
-        if status == 'ongoing':
-            query += " AND r.actual_return_datetime IS NULL"
-        elif status == 'completed':
-            query += " AND r.actual_return_datetime IS NOT NULL"
-    
-    if customer_id:
-        query += " AND r.customer_id = %s"
-        params.append(customer_id)
-        
-    if vehicle_code:
-        query += " AND v.vehicle_id = %s"
-        params.append(vehicle_code)
-        
-    query += " ORDER BY r.pickup_datetime DESC"
-    
-    cursor.execute(query, params)
-    rentals = cursor.fetchall()
-    cursor.close()
-    db.close()
-    
-    return [
-        RentalOut(
-            rental_id=r[0],
-            customer_id=r[1],
-            customer_name=r[2],
-            vehicle_id=r[3],
-            vehicle_info=r[4],
-            daily_rate=float(r[5]),
-            pickup_date=str(r[6]) if r[6] else None,
-            expected_return_date=str(r[7]) if r[7] else None,
-            actual_return_date=str(r[8]) if r[8] is not None else None,
-            status=r[9],
-            total_cost=float(r[10]) if r[10] is not None else None
+    try:
+        rentals = rental_store.list_rentals(
+            cursor, status=status, customer_id=customer_id, vehicle_id=vehicle_code
         )
-        for r in rentals
-    ]
+    finally:
+        cursor.close()
+        db.close()
+
+    if fast_json_enabled():
+        return json_response(RENTAL_ROW.render(rentals), response)
+
+    return [rental_from_row(r) for r in rentals]
 
 
 @router.get("/{rental_id}", response_model=RentalOut)
@@ -116,253 +123,135 @@ def get_rental(rental_id: int):
     """Get a specific rental by ID"""
     db = connect_db()
     cursor = db.cursor()
-    
-    cursor.execute("""
-        SELECT
-            r.rental_id,
-            r.customer_id,
-            CONCAT(c.first_name, ' ', c.last_name) as customer_name,
-            r.vehicle_id,
-            CONCAT(v.brand, ' ', v.model) as vehicle_info,
-            v.daily_rate,
-            DATE(r.pickup_datetime) as pickup_date,
-            DATE(r.return_datetime) as expected_return_date,
-            DATE(r.actual_return_datetime) as actual_return_date,
-            CASE
-                WHEN r.status = 'Active'
-                     AND r.actual_return_datetime IS NULL
-                     AND r.return_datetime < NOW()
-                THEN 'Overdue'
-                ELSE r.status
-            END as effective_status,
-            r.total_cost
-        FROM Rental r
-        JOIN Customer c ON r.customer_id = c.customer_id
-        JOIN Vehicle v ON r.vehicle_id = v.vehicle_id
-        WHERE r.rental_id = %s
-    """, (rental_id,))
-    
-    rental = cursor.fetchone()
-    cursor.close()
-    db.close()
-    
+    try:
+        rental = rental_store.get_rental(cursor, rental_id)
+    finally:
+        cursor.close()
+        db.close()
+
     if not rental:
         raise HTTPException(status_code=404, detail="Rental not found")
         
-    return RentalOut(
-        rental_id=rental[0],
-        customer_id=rental[1],
-        customer_name=rental[2],
-        vehicle_id=rental[3],
-        vehicle_info=rental[4],
-        daily_rate=float(rental[5]),
-        pickup_date=str(rental[6]) if rental[6] else None,
-        expected_return_date=str(rental[7]) if rental[7] else None,
-        actual_return_date=str(rental[8]) if rental[8] is not None else None,
-        status=rental[9],
-        total_cost=float(rental[10]) if rental[10] is not None else None
-    )
+    return rental_from_row(rental)
 
 
 @router.post("/", response_model=RentalOut, status_code=201)
 def create_rental(rental: RentalCreate):
     """Create a new rental"""
-    db = connect_db()
-    cursor = db.cursor()
-    
-    # Verify customer exists
-    cursor.execute("SELECT CONCAT(first_name, ' ', last_name) FROM Customer WHERE customer_id = %s", (rental.customer_id,))
-    customer = cursor.fetchone()
-    if not customer:
-        cursor.close()
-        db.close()
-        raise HTTPException(status_code=404, detail="Customer not found")
-    
-    # Verify vehicle exists and is available
-    cursor.execute(
-        "SELECT CONCAT(brand, ' ', model), daily_rate, status FROM Vehicle WHERE vehicle_id = %s",
-        (rental.vehicle_id,)
-    )
-    vehicle = cursor.fetchone()
-    if not vehicle:
-        cursor.close()
-        db.close()
-        raise HTTPException(status_code=404, detail="Vehicle not found")
-    
-    if vehicle[2].lower() != 'available':
-        cursor.close()
-        db.close()
-        raise HTTPException(status_code=400, detail="Vehicle is not available")
-    
-    try:
-        # Calculate total cost based on rental duration and daily rate
-        from datetime import datetime
-        pickup_dt = datetime.fromisoformat(rental.pickup_datetime.replace('Z', '+00:00'))
-        return_dt = datetime.fromisoformat(rental.return_datetime.replace('Z', '+00:00'))
-        duration_days = max(1, (return_dt - pickup_dt).days)
-        daily_rate = float(vehicle[1])
-        estimated_total_cost = duration_days * daily_rate
+    def book(cursor):
+        # Verify customer exists
+        cursor.execute("SELECT CONCAT(first_name, ' ', last_name) FROM Customer WHERE customer_id = %s", (rental.customer_id,))
+        customer = cursor.fetchone()
+        if not customer:
+            raise HTTPException(status_code=404, detail="Customer not found")
+        
+        # Verify vehicle exists and is available
+        cursor.execute(
+            "SELECT CONCAT(brand, ' ', model), daily_rate, status, type FROM Vehicle WHERE vehicle_id = %s",
+            (rental.vehicle_id,)
+        )
+        vehicle = cursor.fetchone()
+        if not vehicle:
+            raise HTTPException(status_code=404, detail="Vehicle not found")
+        
+        if vehicle[2].lower() != 'available':
+            raise HTTPException(status_code=400, detail="Vehicle is not available")
+        
+        # Price from the daily rate, duration and promotions (in memory)
+        pickup = parse_api_datetime(rental.pickup_datetime)
+        planned_return = parse_api_datetime(rental.return_datetime)
+        promo_index.ensure_loaded(cursor)
+        try:
+            price = quote(promo_index, vehicle[1], vehicle[3], pickup, planned_return, rental.promo_id)
+        except PromoNotApplicable as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        estimated_total_cost = price["total"]
         
         # Use default branch ID (branch should exist in database)
         default_branch_id = 1
         
-        # Create rental with calculated total cost
-        cursor.execute("""
-            INSERT INTO Rental (
-                customer_id, vehicle_id, pickup_branch_id, return_branch_id, 
-                pickup_datetime, return_datetime, status, total_cost
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
+        rental_id = rental_store.insert_rental(
+            cursor,
             rental.customer_id,
             rental.vehicle_id,
             default_branch_id,
-            default_branch_id,
             rental.pickup_datetime,
             rental.return_datetime,
-            'Active',
-            estimated_total_cost
-        ))
-        
-        rental_id = cursor.lastrowid
-        
-        # Update vehicle status
-        cursor.execute(
-            "UPDATE Vehicle SET status = 'Rented' WHERE vehicle_id = %s",
-            (rental.vehicle_id,)
+            estimated_total_cost,
         )
+        if price["promo"]:
+            cursor.execute(
+                "INSERT INTO RentalPromo (rental_id, promo_id, discount_percent, discount) VALUES (%s, %s, %s, %s)",
+                (rental_id, price["promo"]["promo_id"], price["promo"]["discount_percent"], price["discount"])
+            )
         
-        db.commit()
-        
-        # Fetch the created rental
-        cursor.execute("""
-            SELECT 
-                r.rental_id,
-                r.customer_id,
-                CONCAT(c.first_name, ' ', c.last_name) as customer_name,
-                r.vehicle_id,
-                CONCAT(v.brand, ' ', v.model) as vehicle_info,
-                v.daily_rate,
-                DATE(r.pickup_datetime) as pickup_date,
-                DATE(r.return_datetime) as expected_return_date,
-                DATE(r.actual_return_datetime) as actual_return_date,
-                r.status,
-                r.total_cost
-            FROM Rental r
-            JOIN Customer c ON r.customer_id = c.customer_id
-            JOIN Vehicle v ON r.vehicle_id = v.vehicle_id
-            WHERE r.rental_id = %s
-        """, (rental_id,))
-        
-        new_rental = cursor.fetchone()
-        
+        # Customer and vehicle were read above; no need to re-select the join
+        return rental_store.booked_row(
+            rental_id,
+            rental.customer_id,
+            customer[0],
+            rental.vehicle_id,
+            vehicle[0],
+            vehicle[1],
+            pickup,
+            planned_return,
+            estimated_total_cost,
+        )
+    
+    try:
+        # Not idempotent: a booking whose COMMIT outcome is unknown is not re-run
+        new_rental = run_transaction(book, "create_rental")
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        db.close()
+    bump_version("Rental", "Vehicle")
     
-    return RentalOut(
-        rental_id=new_rental[0],
-        customer_id=new_rental[1],
-        customer_name=new_rental[2],
-        vehicle_id=new_rental[3],
-        vehicle_info=new_rental[4],
-        daily_rate=float(new_rental[5]),
-        pickup_date=str(new_rental[6]) if new_rental[6] is not None else None,
-        expected_return_date=str(new_rental[7]) if new_rental[7] is not None else None,
-        actual_return_date=str(new_rental[8]) if new_rental[8] is not None else None,
-        status=new_rental[9],
-        total_cost=float(new_rental[10]) if new_rental[10] is not None else None
-    )
+    return rental_from_row(new_rental)
 
 
 @router.post("/{rental_id}/return", response_model=RentalOut)
 def return_vehicle(rental_id: int, return_data: RentalUpdate):
     """Process a vehicle return"""
-    db = connect_db()
-    cursor = db.cursor()
-    
-    # Check if rental exists and is ongoing
-    cursor.execute("""
-        SELECT r.vehicle_id, DATE(r.pickup_datetime), v.daily_rate
-        FROM Rental r
-        JOIN Vehicle v ON r.vehicle_id = v.vehicle_id
-        WHERE r.rental_id = %s AND r.actual_return_datetime IS NULL
-    """, (rental_id,))
-    
-    rental = cursor.fetchone()
-    if not rental:
-        cursor.close()
-        db.close()
-        raise HTTPException(status_code=404, detail="Rental not found or already completed")
-    
-    vehicle_id, pickup_date, daily_rate = rental
-    
-    # Calculate total cost - parse the actual_return_datetime from the return_data
-    from datetime import datetime
-    actual_return = datetime.fromisoformat(return_data.actual_return_datetime.replace('Z', '+00:00'))
-    days_rented = max(1, (actual_return.date() - pickup_date).days + 1)
-    total_cost = days_rented * float(daily_rate) + return_data.additional_charges
-    
-    try:
-        # Update rental
-        cursor.execute("""
-            UPDATE Rental
-            SET actual_return_datetime = %s, total_cost = %s, status = 'Completed'
-            WHERE rental_id = %s
-        """, (return_data.actual_return_datetime, total_cost, rental_id))
+    def complete(cursor):
+        # Check if rental exists and is ongoing; the row doubles as the response
+        rental = rental_store.get_rental(cursor, rental_id, ongoing=True)
+        if not rental:
+            raise HTTPException(status_code=404, detail="Rental not found or already completed")
         
-        # Update vehicle status
+        vehicle_id, pickup_date, daily_rate = rental[3], rental[6], rental[5]
+        actual_return = parse_api_datetime(return_data.actual_return_datetime)
+        
+        # The promo applied at booking discounts the final price too
         cursor.execute(
-            "UPDATE Vehicle SET status = 'Available' WHERE vehicle_id = %s",
-            (vehicle_id,)
+            "SELECT COALESCE(SUM(discount_percent), 0) FROM RentalPromo WHERE rental_id = %s",
+            (rental_id,)
         )
+        discount_percent = int(cursor.fetchone()[0])
         
-        db.commit()
-        
-        # Fetch updated rental
-        cursor.execute("""
-            SELECT 
-                r.rental_id,
-                r.customer_id,
-                CONCAT(c.first_name, ' ', c.last_name) as customer_name,
-                r.vehicle_id,
-                CONCAT(v.brand, ' ', v.model) as vehicle_info,
-                v.daily_rate,
-                DATE(r.pickup_datetime) as pickup_date,
-                DATE(r.return_datetime) as expected_return_date,
-                DATE(r.actual_return_datetime) as actual_return_date,
-                'Completed' as status,
-                r.total_cost
-            FROM Rental r
-            JOIN Customer c ON r.customer_id = c.customer_id
-            JOIN Vehicle v ON r.vehicle_id = v.vehicle_id
-            WHERE r.rental_id = %s
-        """, (rental_id,))
-        
-        updated_rental = cursor.fetchone()
+        # Calculate total cost - parse the actual_return_datetime from the return_data
+        total_cost = final_rental_cost(
+            pickup_date,
+            actual_return,
+            daily_rate,
+            return_data.additional_charges,
+            discount_percent,
+        )
         
+        rental_store.complete_rental(
+            cursor, rental_id, vehicle_id, return_data.actual_return_datetime, total_cost
+        )
+        return rental_store.returned_row(rental, actual_return.date(), total_cost)
+    
+    try:
+        updated_rental = run_transaction(complete, "return_vehicle")
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        db.close()
+    bump_version("Rental", "Vehicle")
     
-    return RentalOut(
-        rental_id=updated_rental[0],
-        customer_id=updated_rental[1],
-        customer_name=updated_rental[2],
-        vehicle_id=updated_rental[3],
-        vehicle_info=updated_rental[4],
-        daily_rate=float(updated_rental[5]),
-        pickup_date=str(updated_rental[6]) if updated_rental[6] is not None else None,
-        expected_return_date=str(updated_rental[7]) if updated_rental[7] is not None else None,
-        actual_return_date=str(updated_rental[8]) if updated_rental[8] is not None else None,
-        status=updated_rental[9],
-        total_cost=float(updated_rental[10]) if updated_rental[10] is not None else None
-    )
+    return rental_from_row(updated_rental)
 
     # Insert rental (include required branch ids)
     insert_q = """
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from typing import List, Optional
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, ValidationError, validator
 from datetime import date
 from decimal import Decimal
+import asyncio
 
 from database.connection import connect_db
+from database.retry import run_transaction
 from api.routes.auth import get_current_active_user
+from api.core.cache import bump_version
+from api.core.config import settings
+from api.services import reviews as review_store
 
 router = APIRouter()
 
@@ -34,24 +39,22 @@ class ReviewOut(ReviewBase):
     customer_name: str
 
 
+class VehicleRating(BaseModel):
+    vehicle_id: int
+    reviews: int
+    average_rating: Optional[float] = None
+
+
+# Errors listed in a bulk import response; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
 @router.post("/", response_model=ReviewOut)
-async def create_review(review: ReviewCreate, current_user = Depends(get_current_active_user)):
-    db = connect_db()
-    cursor = db.cursor()
-    
-    try:
-        # Verify rental exists and hasn't been reviewed
+def create_review(review: ReviewCreate, current_user = Depends(get_current_active_user)):
+    def create(cursor):
+        # Verify rental exists
         cursor.execute(
-            """
-            SELECT r.rental_id, 
-                   CONCAT(v.brand, ' ', v.model, ' (', v.plate_number, ')') as vehicle_info,
-                   CONCAT(c.first_name, ' ', c.last_name) as customer_name
-            FROM Rental r
-            JOIN Vehicle v ON r.vehicle_id = v.vehicle_id
-            JOIN Customer c ON r.customer_id = c.customer_id
-            LEFT JOIN ReviewRatings rr ON r.rental_id = rr.rental_id
-            WHERE r.rental_id = %s
-            """,
+            "SELECT rental_id, vehicle_id, customer_id FROM Rental WHERE rental_id = %s",
             (review.rental_id,)
         )
         rental = cursor.fetchone()
@@ -63,19 +66,20 @@ async def create_review(review: ReviewCreate, current_user = Depends(get_current
         cursor.execute(
             """
             INSERT INTO ReviewRatings (
-                rental_id, rating_score, review_text, review_date
-            ) VALUES (%s, %s, %s, %s)
+                rental_id, rating_score, review_text, review_date, vehicle_id, customer_id
+            ) VALUES (%s, %s, %s, %s, %s, %s)
             """,
             (
                 review.rental_id,
                 float(review.rating_score),  # Convert Decimal to float for MySQL
                 review.review_text,
-                review.review_date
+                review.review_date,
+                rental[1],
+                rental[2]
             )
         )
         review_id = cursor.lastrowid
-        
-        db.commit()
+        review_store.adjust_vehicle_ratings(cursor, {rental[1]: (1, review.rating_score)})
         
         return ReviewOut(
             review_id=review_id,
@@ -83,16 +87,86 @@ async def create_review(review: ReviewCreate, current_user = Depends(get_current
             rating_score=review.rating_score,
             review_text=review.review_text,
             review_date=review.review_date,
-            vehicle_info=rental[1],
-            customer_name=rental[2]
+            vehicle_info=review_store.vehicle_names.get_many(cursor, [rental[1]]).get(rental[1], ""),
+            customer_name=review_store.customer_names.get_many(cursor, [rental[2]]).get(rental[2], "")
         )
 
+    try:
+        # Not idempotent: a review whose COMMIT outcome is unknown is not re-run
+        created = run_transaction(create, "create_review")
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
-        db.close()
+    bump_version("ReviewRatings")
+    return created
+
+
+@router.post(
+    "/bulk",
+    openapi_extra={"requestBody": {
+        "required": True,
+        "content": {"application/x-ndjson": {"schema": {
+            "type": "string", "description": "One ReviewCreate JSON object per line"
+        }}},
+    }},
+)
+async def bulk_import_reviews(request: Request, current_user = Depends(get_current_active_user)):
+    """
+    Import a file of reviews in one transaction. A review for an already
+    reviewed rental replaces it, so re-sending a file is harmless. Lines that
+    fail validation or name an unknown rental are reported and skipped.
+    """
+    # The body is read as-is whatever the Content-Type; parsing and the
+    # import run off the event loop
+    return await asyncio.to_thread(_import_ndjson, await request.body())
+
+
+def _import_ndjson(body: bytes) -> dict:
+    lines = body.splitlines()
+    if len(lines) > settings.REVIEW_IMPORT_MAX_LINES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.REVIEW_IMPORT_MAX_LINES} reviews per import"
+        )
+
+    reviews = []
+    errors = []
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            review = ReviewCreate.model_validate_json(line)
+            date.fromisoformat(review.review_date)
+        except ValidationError as e:
+            errors.append({"line": number, "error": e.errors()[0]["msg"]})
+            continue
+        except ValueError:
+            errors.append({"line": number, "error": "review_date must be YYYY-MM-DD"})
+            continue
+        reviews.append((number, review.model_dump()))
+
+    result = {"created": 0, "replaced": 0, "duplicates": 0, "errors": []}
+    if reviews:
+        try:
+            result = run_transaction(
+                lambda cursor: review_store.import_reviews(cursor, reviews),
+                "review_import",
+                idempotent=True,
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        if result["created"] or result["replaced"]:
+            bump_version("ReviewRatings")
+
+    received = len(reviews) + len(errors)
+    errors = sorted(errors + result.pop("errors"), key=lambda error: error["line"])
+    return {
+        "received": received,
+        **result,
+        "rejected": len(errors),
+        "errors": errors[:MAX_REPORTED_ERRORS],
+    }
 
 
 @router.get("/rental/{rental_id}", response_model=ReviewOut)
@@ -101,90 +175,56 @@ async def get_rental_review(rental_id: int, current_user = Depends(get_current_a
     cursor = db.cursor()
     
     try:
-        cursor.execute(
-            """
-            SELECT 
-                rr.review_id,
-                rr.rental_id,
-                rr.rating_score,
-                rr.review_text,
-                rr.review_date,
-                CONCAT(v.brand, ' ', v.model, ' (', v.plate_number, ')') as vehicle_info,
-                CONCAT(c.first_name, ' ', c.last_name) as customer_name
-            FROM ReviewRatings rr
-            JOIN Rental r ON rr.rental_id = r.rental_id
-            JOIN Vehicle v ON r.vehicle_id = v.vehicle_id
-            JOIN Customer c ON r.customer_id = c.customer_id
-            WHERE rr.rental_id = %s
-            """,
-            (rental_id,)
-        )
-        review = cursor.fetchone()
+        review = review_store.get_review(cursor, "rental_id", rental_id)
         
         if not review:
             raise HTTPException(status_code=404, detail="Review not found for this rental")
             
-        return ReviewOut(
-            review_id=review[0],
-            rental_id=review[1],
-            rating_score=review[2],
-            review_text=review[3],
-            review_date=review[4].strftime('%Y-%m-%d'),
-            vehicle_info=review[5],
-            customer_name=review[6]
-        )
+        return ReviewOut(**review)
+
+    finally:
+        cursor.close()
+        db.close()
+
 
+def _review_page(by: str, owner_id: int, response: Response, limit: int, offset: int, page_cursor: Optional[str]):
+    """One feed page; the cursor for the next page goes in the X-Next-Cursor header."""
+    try:
+        after = review_store.decode_cursor(page_cursor) if page_cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    db = connect_db()
+    cursor = db.cursor()
+    try:
+        reviews, next_cursor = review_store.review_feed(cursor, by, owner_id, limit, after, offset)
     finally:
         cursor.close()
         db.close()
 
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [ReviewOut(**review) for review in reviews]
+
 
 @router.get("/vehicle/{vehicle_id}", response_model=List[ReviewOut])
 async def get_vehicle_reviews(
     vehicle_id: int,
+    response: Response,
     current_user = Depends(get_current_active_user),
     limit: int = Query(10, ge=1, le=100),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0, description="Deprecated: pass the X-Next-Cursor of the previous page as `cursor`"),
+    page_cursor: Optional[str] = Query(None, alias="cursor")
 ):
+    return _review_page("vehicle", vehicle_id, response, limit, offset, page_cursor)
+
+
+@router.get("/vehicle/{vehicle_id}/summary", response_model=VehicleRating)
+async def get_vehicle_rating(vehicle_id: int, current_user = Depends(get_current_active_user)):
     db = connect_db()
     cursor = db.cursor()
-    
     try:
-        cursor.execute(
-            """
-            SELECT 
-                rr.review_id,
-                rr.rental_id,
-                rr.rating_score,
-                rr.review_text,
-                rr.review_date,
-                CONCAT(v.brand, ' ', v.model, ' (', v.plate_number, ')') as vehicle_info,
-                CONCAT(c.first_name, ' ', c.last_name) as customer_name
-            FROM ReviewRatings rr
-            JOIN Rental r ON rr.rental_id = r.rental_id
-            JOIN Vehicle v ON r.vehicle_id = v.vehicle_id
-            JOIN Customer c ON r.customer_id = c.customer_id
-            WHERE v.vehicle_id = %s
-            ORDER BY rr.review_date DESC
-            LIMIT %s OFFSET %s
-            """,
-            (vehicle_id, limit, offset)
-        )
-        reviews = cursor.fetchall()
-        
-        return [
-            ReviewOut(
-                review_id=review[0],
-                rental_id=review[1],
-                rating_score=review[2],
-                review_text=review[3],
-                review_date=review[4].strftime('%Y-%m-%d'),
-                vehicle_info=review[5],
-                customer_name=review[6]
-            )
-            for review in reviews
-        ]
-
+        return review_store.vehicle_rating(cursor, vehicle_id)
     finally:
         cursor.close()
         db.close()
@@ -193,56 +233,17 @@ async def get_vehicle_reviews(
 @router.get("/customer/{customer_id}", response_model=List[ReviewOut])
 async def get_customer_reviews(
     customer_id: int,
+    response: Response,
     current_user = Depends(get_current_active_user),
     limit: int = Query(10, ge=1, le=100),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0, description="Deprecated: pass the X-Next-Cursor of the previous page as `cursor`"),
+    page_cursor: Optional[str] = Query(None, alias="cursor")
 ):
-    db = connect_db()
-    cursor = db.cursor()
-    
-    try:
-        cursor.execute(
-            """
-            SELECT 
-                rr.review_id,
-                rr.rental_id,
-                rr.rating_score,
-                rr.review_text,
-                rr.review_date,
-                CONCAT(v.brand, ' ', v.model, ' (', v.plate_number, ')') as vehicle_info,
-                CONCAT(c.first_name, ' ', c.last_name) as customer_name
-            FROM ReviewRatings rr
-            JOIN Rental r ON rr.rental_id = r.rental_id
-            JOIN Vehicle v ON r.vehicle_id = v.vehicle_id
-            JOIN Customer c ON r.customer_id = c.customer_id
-            WHERE r.customer_id = %s
-            ORDER BY rr.review_date DESC
-            LIMIT %s OFFSET %s
-            """,
-            (customer_id, limit, offset)
-        )
-        reviews = cursor.fetchall()
-        
-        return [
-            ReviewOut(
-                review_id=review[0],
-                rental_id=review[1],
-                rating_score=review[2],
-                review_text=review[3],
-                review_date=review[4].strftime('%Y-%m-%d'),
-                vehicle_info=review[5],
-                customer_name=review[6]
-            )
-            for review in reviews
-        ]
-
-    finally:
-        cursor.close()
-        db.close()
+    return _review_page("customer", customer_id, response, limit, offset, page_cursor)
 
 
 @router.put("/{review_id}", response_model=ReviewOut)
-async def update_review(
+def update_review(
     review_id: int,
     rating_score: Optional[Decimal] = Query(None, ge=1.0, le=5.0),
     review_text: Optional[str] = None,
@@ -251,24 +252,29 @@ async def update_review(
     if rating_score is None and review_text is None:
         raise HTTPException(status_code=400, detail="No updates provided")
 
-    db = connect_db()
-    cursor = db.cursor()
+    # Build update query based on provided fields
+    update_parts = []
+    params = []
     
-    try:
-        # Build update query based on provided fields
-        update_parts = []
-        params = []
+    if rating_score is not None:
+        update_parts.append("rating_score = %s")
+        params.append(float(rating_score))
         
-        if rating_score is not None:
-            update_parts.append("rating_score = %s")
-            params.append(float(rating_score))
-            
-        if review_text is not None:
-            update_parts.append("review_text = %s")
-            params.append(review_text)
-            
-        params.append(review_id)
+    if review_text is not None:
+        update_parts.append("review_text = %s")
+        params.append(review_text)
         
+    params.append(review_id)
+
+    def update(cursor):
+        cursor.execute(
+            "SELECT rating_score, vehicle_id FROM ReviewRatings WHERE review_id = %s FOR UPDATE",
+            (review_id,)
+        )
+        current = cursor.fetchone()
+        if not current:
+            raise HTTPException(status_code=404, detail="Review not found")
+
         cursor.execute(
             f"""
             UPDATE ReviewRatings
@@ -278,70 +284,49 @@ async def update_review(
             params
         )
         
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Review not found")
-            
+        if rating_score is not None:
+            old_score = current[0]
+            review_store.adjust_vehicle_ratings(
+                cursor, {current[1]: (int(old_score is None), rating_score - (old_score or 0))}
+            )
+
         # Fetch updated review
-        cursor.execute(
-            """
-            SELECT 
-                rr.review_id,
-                rr.rental_id,
-                rr.rating_score,
-                rr.review_text,
-                rr.review_date,
-                CONCAT(v.brand, ' ', v.model, ' (', v.plate_number, ')') as vehicle_info,
-                CONCAT(c.first_name, ' ', c.last_name) as customer_name
-            FROM ReviewRatings rr
-            JOIN Rental r ON rr.rental_id = r.rental_id
-            JOIN Vehicle v ON r.vehicle_id = v.vehicle_id
-            JOIN Customer c ON r.customer_id = c.customer_id
-            WHERE rr.review_id = %s
-            """,
-            (review_id,)
-        )
-        review = cursor.fetchone()
-        
-        db.commit()
-        
-        return ReviewOut(
-            review_id=review[0],
-            rental_id=review[1],
-            rating_score=review[2],
-            review_text=review[3],
-            review_date=review[4].strftime('%Y-%m-%d'),
-            vehicle_info=review[5],
-            customer_name=review[6]
-        )
+        return review_store.get_review(cursor, "review_id", review_id)
 
+    try:
+        # Re-running reads the score it already wrote, so the summary moves once
+        review = run_transaction(update, "update_review", idempotent=True)
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
-        db.close()
+    bump_version("ReviewRatings")
+    return ReviewOut(**review)
 
 
 @router.delete("/{review_id}")
-async def delete_review(review_id: int, current_user = Depends(get_current_active_user)):
-    db = connect_db()
-    cursor = db.cursor()
-    
-    try:
+def delete_review(review_id: int, current_user = Depends(get_current_active_user)):
+    def delete(cursor):
         cursor.execute(
-            "DELETE FROM ReviewRatings WHERE review_id = %s",
+            "SELECT rating_score, vehicle_id FROM ReviewRatings WHERE review_id = %s FOR UPDATE",
             (review_id,)
         )
-        
-        if cursor.rowcount == 0:
+        current = cursor.fetchone()
+        if not current:
             raise HTTPException(status_code=404, detail="Review not found")
-            
-        db.commit()
-        return {"message": "Review deleted successfully"}
 
+        cursor.execute(
+            "DELETE FROM ReviewRatings WHERE review_id = %s",
+            (review_id,)
+        )
+        if current[0] is not None:
+            review_store.adjust_vehicle_ratings(cursor, {current[1]: (-1, -current[0])})
+
+    try:
+        run_transaction(delete, "delete_review")
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
-        db.close()
\ No newline at end of file
+    bump_version("ReviewRatings")
+    return {"message": "Review deleted successfully"}
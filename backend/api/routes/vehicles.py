@@ -1,9 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from typing import List, Optional
 from pydantic import BaseModel, Field
 from datetime import datetime
 
 from database.connection import connect_db
+from api.core.cache import bump_version, check_not_modified
+from api.core.serialization import RowSerializer, as_float_or_zero, fast_json_enabled, json_response
 
 router = APIRouter()
 
@@ -39,8 +41,25 @@ class VehicleOut(VehicleBase):
     vehicle_code: str
 
 
+# Fast-path equivalent of VehicleOut over the standard vehicle select list
+VEHICLE_ROW = RowSerializer([
+    ("brand", 2, None),
+    ("model", 3, None),
+    ("type", 4, None),
+    ("fuel_type", 5, None),
+    ("transmission", 6, None),
+    ("status", 7, None),
+    ("daily_rate", 8, as_float_or_zero),
+    ("seating_capacity", 9, None),
+    ("vehicle_id", 0, None),
+    ("vehicle_code", 1, None),
+])
+
+
 @router.get("/", response_model=List[VehicleOut])
 def get_vehicles(
+    request: Request,
+    response: Response,
     status: Optional[str] = None,
     search: Optional[str] = None
 ):
@@ -48,6 +67,10 @@ def get_vehicles(
     Return all vehicles from the database as JSON.
     Optionally filter by status and search term.
     """
+    not_modified = check_not_modified(request, response, ("Vehicle",))
+    if not_modified:
+        return not_modified
+
     db = connect_db()
     cursor = db.cursor()
     
@@ -78,6 +101,9 @@ def get_vehicles(
     cursor.close()
     db.close()
 
+    if fast_json_enabled():
+        return json_response(VEHICLE_ROW.render(rows), response)
+
     return [
         VehicleOut(
             vehicle_id=row[0],
@@ -167,6 +193,7 @@ def create_vehicle(vehicle: VehicleCreate):
             )
         )
         db.commit()
+        bump_version("Vehicle")
         
         # Fetch the created vehicle
         cursor.execute(
@@ -234,6 +261,7 @@ def update_vehicle(vehicle_code: str, vehicle: VehicleUpdate):
     try:
         cursor.execute(query, values)
         db.commit()
+        bump_version("Vehicle")
         
         # Fetch the updated vehicle
         cursor.execute(
@@ -0,0 +1,301 @@
+"""
+Production server entry point.
+
+    python -m api.serve                       # one worker per CPU on :8000
+    python -m api.serve --workers 4 --port 9000
+
+Prefork model:
+
+1. The parent imports api.main (preload), binds the listening socket and
+   runs the startup tasks (schema/user seeding, demo date refresh) once.
+2. Version counters used for ETags move to shared memory and the parent's
+   DB pool is closed, so workers share no sockets or other mutable state.
+3. N workers are forked; each builds its own connection pool and serves the
+   inherited socket with uvicorn on uvloop + httptools.
+4. A worker exits after --max-requests (plus jitter) and is replaced, which
+   bounds memory growth; crashed workers are replaced too.
+
+Signals to the parent:
+    SIGTERM / SIGINT  stop accepting, let in-flight requests finish for up to
+                      --graceful-timeout seconds, then exit
+    SIGHUP            start a fresh set of workers, then retire the old ones
+                      (no new code is loaded; restart the process for deploys)
+
+Request metrics are kept per worker and shared through a temporary
+directory: each worker writes a snapshot of its counters there, /metrics on
+any worker merges them, and the parent folds exited workers' snapshots into
+one file so recycling a worker never makes a counter go backwards. The
+slow-query log stays per worker; its entries name the worker that recorded
+them.
+"""
+
+import argparse
+import logging
+import os
+import random
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict, Optional
+
+import uvicorn
+
+from api.core.config import settings
+
+logger = logging.getLogger("api.serve")
+
+# Parent-side period of the demo date refresh (matches api.main)
+DEMO_REFRESH_INTERVAL = 24 * 3600
+
+
+def default_workers() -> int:
+    try:
+        return len(os.sched_getaffinity(0))  # respects container CPU sets
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _event_loop() -> str:
+    try:
+        import uvloop  # noqa: F401
+        return "uvloop"
+    except ImportError:
+        return "asyncio"
+
+
+def _http_protocol() -> str:
+    try:
+        import httptools  # noqa: F401
+        return "httptools"
+    except ImportError:
+        return "h11"
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Arbiter:
+    """Parent process: forks, supervises and retires uvicorn workers."""
+
+    def __init__(
+        self,
+        app,
+        sock: socket.socket,
+        workers: int,
+        max_requests: int,
+        max_requests_jitter: int,
+        graceful_timeout: int,
+        log_level: str,
+        metrics_dir: Optional[str] = None,
+    ):
+        self.app = app
+        self.sock = sock
+        self.num_workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.log_level = log_level
+        self.metrics_dir = metrics_dir
+        self.workers: Dict[int, float] = {}  # pid -> spawn time
+        self.stopping = False
+        self.reload_requested = False
+
+    # ── worker side ───────────────────────────────────────────────────────────
+
+    def _run_worker(self) -> None:
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_DFL)
+        random.seed()  # forked children would otherwise share the parent's RNG state
+
+        from database import connection
+        connection.configure()  # fresh pool owned by this process
+        if self.metrics_dir:
+            from api.core import metrics
+            metrics.start_export(self.metrics_dir)
+
+        limit = None
+        if self.max_requests:
+            limit = self.max_requests + random.randint(0, self.max_requests_jitter)
+        config = uvicorn.Config(
+            self.app,
+            loop=_event_loop(),
+            http=_http_protocol(),
+            lifespan="on",
+            limit_max_requests=limit,
+            timeout_graceful_shutdown=self.graceful_timeout,
+            access_log=False,
+            log_level=self.log_level,
+        )
+        try:
+            uvicorn.Server(config).run(sockets=[self.sock])
+        finally:
+            if self.metrics_dir:
+                from api.core import metrics
+                metrics.export_snapshot()
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker()
+            except BaseException:
+                logger.exception("Worker %s crashed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+        logger.info("Booted worker %s", pid)
+
+    # ── parent side ───────────────────────────────────────────────────────────
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_reload(self, signum, frame):
+        self.reload_requested = True
+
+    def reap(self) -> None:
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                return
+            if pid == 0:
+                return
+            started = self.workers.pop(pid, None)
+            code = os.waitstatus_to_exitcode(status)
+            if self.metrics_dir:
+                from api.core import metrics
+                try:
+                    metrics.retire_worker(self.metrics_dir, pid)
+                except OSError:
+                    logger.exception("Could not merge the metrics of worker %s", pid)
+            if code in (0, -signal.SIGTERM):
+                logger.info("Worker %s exited", pid)
+            else:
+                logger.warning("Worker %s exited with status %s", pid, code)
+                if started is not None and time.monotonic() - started < 1.0:
+                    time.sleep(1.0)  # avoid a tight crash loop
+
+    def reload(self) -> None:
+        """Start a full set of new workers, then gracefully stop the old ones."""
+        self.reload_requested = False
+        old = list(self.workers)
+        for _ in range(self.num_workers):
+            self.spawn()
+        for pid in old:
+            self._signal(pid, signal.SIGTERM)
+        logger.info("Reload: retiring %d workers", len(old))
+
+    def _signal(self, pid: int, sig: int) -> None:
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            self.workers.pop(pid, None)
+
+    def shutdown(self) -> None:
+        logger.info("Shutting down: draining %d workers", len(self.workers))
+        for pid in list(self.workers):
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            logger.warning("Worker %s did not stop in time; killing", pid)
+            self._signal(pid, signal.SIGKILL)
+        while self.workers:
+            self.reap()
+            time.sleep(0.05)
+        self.sock.close()
+
+    def run(self, on_tick=None) -> None:
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+
+        for _ in range(self.num_workers):
+            self.spawn()
+        while not self.stopping:
+            self.reap()
+            if self.reload_requested:
+                self.reload()
+            while len(self.workers) < self.num_workers and not self.stopping:
+                self.spawn()
+            if on_tick is not None:
+                on_tick()
+            time.sleep(0.5)
+        self.shutdown()
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the API with prefork uvicorn workers")
+    parser.add_argument("--host", default=settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", settings.SERVER_PORT)))
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS or default_workers())
+    parser.add_argument("--max-requests", type=int, default=settings.SERVER_MAX_REQUESTS,
+                        help="Recycle a worker after this many requests (0 disables)")
+    parser.add_argument("--max-requests-jitter", type=int, default=settings.SERVER_MAX_REQUESTS_JITTER)
+    parser.add_argument("--graceful-timeout", type=int, default=settings.SERVER_GRACEFUL_TIMEOUT,
+                        help="Seconds in-flight requests get to finish on shutdown")
+    parser.add_argument("--backlog", type=int, default=settings.SERVER_BACKLOG)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s: [%(process)d] %(message)s")
+
+    # Preload: import the app (and everything it pulls in) once, before forking
+    import api.main as main_module
+    from api.core.cache import share_versions
+    from api.core.startup import startup_profile
+    from database import connection
+
+    sock = bind_socket(args.host, args.port, args.backlog)
+
+    main_module.run_startup_tasks()
+    main_module.STARTUP_TASKS_DONE = True
+    startup_profile.log_report()
+    share_versions()
+    connection.dispose_pool()
+
+    last_refresh = time.monotonic()
+
+    def refresh_demo_dates():
+        nonlocal last_refresh
+        if time.monotonic() - last_refresh >= DEMO_REFRESH_INTERVAL:
+            last_refresh = time.monotonic()
+            main_module._refresh_demo_dates()
+            connection.dispose_pool()
+
+    logger.info(
+        "Serving on %s:%s with %d workers (%s, %s)",
+        args.host, args.port, args.workers, _event_loop(), _http_protocol(),
+    )
+    metrics_dir = tempfile.mkdtemp(prefix="car-rental-metrics-") if settings.METRICS_ENABLED else None
+    arbiter = Arbiter(
+        main_module.app, sock, args.workers,
+        args.max_requests, args.max_requests_jitter, args.graceful_timeout, args.log_level,
+        metrics_dir,
+    )
+    try:
+        arbiter.run(on_tick=refresh_demo_dates)
+    finally:
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
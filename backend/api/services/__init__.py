@@ -0,0 +1,11 @@
+"""
+API Services Package
+
+Data-access helpers shared by the route modules: the SQL for a resource lives
+here once, and routes call these functions with a cursor they own.
+
+Modules:
+- rentals.py: Canonical rental/customer/vehicle query and rental writes
+- loyalty.py: Points ledger, tier rule and the batch accrual job
+- reviews.py: Keyset-paginated review feeds and cached display names
+"""
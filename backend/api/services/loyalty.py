@@ -0,0 +1,416 @@
+"""
+Loyalty points ledger and batch accrual.
+
+Every points change is appended to LoyaltyLedger; LoyaltyProgram.points_balance
+is the running sum of a customer's entries, kept up to date by whoever appends
+(and rebuildable from the ledger with rebuild_balances()).
+
+Points for completed rentals are not awarded one request at a time. The
+accrual job picks up every rental completed since its watermark and, in one
+transaction, inserts all of their ledger entries with a single INSERT ... SELECT
+and moves tiers, then balances, with two joined UPDATEs, so the cost is a few
+statements per batch rather than a locked round-trip per rental.
+
+Tier thresholds come from settings.LOYALTY_TIER_THRESHOLDS. recompute_tiers()
+re-derives every member's tier after they change (or for the annual reset) in
+chunked set-based UPDATEs, with a dry-run mode that only reports the diff.
+
+Members per tier are kept in LoyaltyTierCount: every write that moves a member
+between tiers applies the same move to the counts in its transaction, so the
+distribution is a four-row read however large the membership grows. The
+leaderboard reads the (membership_tier, points_balance DESC) index top-down.
+
+The accrual, tier recompute and balance rebuild usually run from the CLI, so
+each records its runs in JobWatermark (RANKING_JOBS); the ranking routes
+build their ETags from those rows as well as from the API's own writes.
+"""
+
+import json
+import logging
+import time
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+from api.core.config import settings
+from database.retry import run_transaction
+
+logger = logging.getLogger(__name__)
+
+# Tiers above Bronze, lowest first
+TIERS = ("Silver", "Gold", "Platinum")
+BASE_TIER = "Bronze"
+ALL_TIERS = (BASE_TIER,) + TIERS
+
+ACCRUAL_JOB = "loyalty_accrual"
+TIERS_JOB = "loyalty_tiers"
+REBUILD_JOB = "loyalty_rebuild"
+# Jobs that rewrite balances or tiers outside the API process
+RANKING_JOBS = (ACCRUAL_JOB, TIERS_JOB, REBUILD_JOB)
+
+Thresholds = Tuple[Tuple[str, int], ...]
+
+
+def tier_thresholds(mapping: Mapping[str, int]) -> Thresholds:
+    """
+    Validate {tier: minimum balance} and return it highest tier first.
+    Every tier above Bronze needs a threshold, strictly rising with the tier.
+    """
+    if set(mapping) != set(TIERS):
+        raise ValueError(f"Tier thresholds must cover exactly {', '.join(TIERS)}")
+    values = [int(mapping[tier]) for tier in TIERS]
+    if values[0] < 1 or any(lo >= hi for lo, hi in zip(values, values[1:])):
+        raise ValueError("Tier thresholds must be positive and increase from Silver to Platinum")
+    return tuple(reversed(tuple(zip(TIERS, values))))
+
+
+TIER_THRESHOLDS: Thresholds = tier_thresholds(settings.LOYALTY_TIER_THRESHOLDS)
+
+
+def tier_for(balance: int, current_tier: str, thresholds: Thresholds = TIER_THRESHOLDS) -> str:
+    """Tier for `balance`; below the lowest threshold the current tier is kept."""
+    for tier, threshold in thresholds:
+        if balance >= threshold:
+            return tier
+    return current_tier
+
+
+def tier_case_sql(balance: str, current_tier: str, thresholds: Thresholds = TIER_THRESHOLDS) -> str:
+    """
+    tier_for() as a SQL expression over the given column expressions
+    (`current_tier` may also be a quoted literal such as 'Bronze').
+    """
+    whens = " ".join(f"WHEN {balance} >= {threshold} THEN '{tier}'" for tier, threshold in thresholds)
+    return f"CASE {whens} ELSE {current_tier} END"
+
+
+def record_entry(cursor, customer_id: int, points: int, reason: str, rental_id: Optional[int] = None) -> None:
+    """Append one ledger entry; the caller updates the balance in the same transaction."""
+    if points:
+        cursor.execute(
+            "INSERT INTO LoyaltyLedger (customer_id, rental_id, points, reason) VALUES (%s, %s, %s, %s)",
+            (customer_id, rental_id, points, reason),
+        )
+
+
+def move_members(cursor, moves: Mapping[Tuple[Optional[str], Optional[str]], int]) -> None:
+    """
+    Apply {(from_tier, to_tier): members} to LoyaltyTierCount; None stands for
+    "no membership" (joins and leaves). Call in the transaction that moved them.
+    """
+    deltas: Dict[str, int] = {}
+    for (old, new), count in moves.items():
+        if old == new:
+            continue
+        if old is not None:
+            deltas[old] = deltas.get(old, 0) - count
+        if new is not None:
+            deltas[new] = deltas.get(new, 0) + count
+    rows = [(tier, delta) for tier, delta in sorted(deltas.items()) if delta]  # fixed lock order
+    if rows:
+        cursor.execute(
+            "INSERT INTO LoyaltyTierCount (tier, members) VALUES "
+            + ", ".join(["(%s, %s)"] * len(rows))
+            + " ON DUPLICATE KEY UPDATE members = members + VALUES(members)",
+            [value for row in rows for value in row],
+        )
+
+
+def refresh_tier_counts(cursor) -> None:
+    """Recount LoyaltyTierCount from LoyaltyProgram (after bulk edits outside this module)."""
+    cursor.execute("DELETE FROM LoyaltyTierCount")
+    cursor.execute("""
+        INSERT INTO LoyaltyTierCount (tier, members)
+        SELECT membership_tier, COUNT(*)
+        FROM LoyaltyProgram
+        WHERE membership_tier IS NOT NULL
+        GROUP BY membership_tier
+    """)
+
+
+def tier_distribution(cursor) -> dict:
+    cursor.execute("SELECT tier, members FROM LoyaltyTierCount")
+    counts = dict(cursor.fetchall())
+    tiers = [{"tier": tier, "members": int(counts.pop(tier, 0))} for tier in ALL_TIERS]
+    tiers.extend({"tier": tier, "members": int(n)} for tier, n in sorted(counts.items()) if n)
+    return {"total_members": sum(t["members"] for t in tiers), "tiers": tiers}
+
+
+_LEADERBOARD_COLUMNS = """
+        SELECT lp.customer_id, CONCAT(c.first_name, ' ', c.last_name) AS customer_name,
+               lp.membership_tier, lp.points_balance, lp.program_id
+        FROM LoyaltyProgram lp
+        JOIN Customer c ON c.customer_id = lp.customer_id"""
+
+
+def leaderboard(cursor, tier: Optional[str], limit: int) -> list:
+    """
+    Top `limit` members by balance, optionally within one tier.
+
+    Each tier is a range of the (membership_tier, points_balance DESC) index,
+    read from the top; across tiers, the top `limit` of each are merged, so
+    no more than 4 * limit index entries are touched.
+    """
+    per_tier = f"""
+        ({_LEADERBOARD_COLUMNS}
+        WHERE lp.membership_tier = %s
+        ORDER BY lp.points_balance DESC, lp.program_id
+        LIMIT %s)"""
+    tiers = (tier,) if tier else ALL_TIERS
+    sql = " UNION ALL ".join([per_tier] * len(tiers))
+    if len(tiers) > 1:
+        sql += " ORDER BY points_balance DESC, program_id LIMIT %s"
+    params = [value for t in tiers for value in (t, limit)]
+    if len(tiers) > 1:
+        params.append(limit)
+    cursor.execute(sql, params)
+    return [
+        {
+            "rank": rank,
+            "customer_id": row[0],
+            "customer_name": row[1],
+            "membership_tier": row[2],
+            "points_balance": row[3],
+        }
+        for rank, row in enumerate(cursor.fetchall(), start=1)
+    ]
+
+
+# Per-customer totals of one accrual batch
+_BATCH_TOTALS = """
+    SELECT customer_id, SUM(points) AS points
+    FROM LoyaltyLedger
+    WHERE batch_id = %s
+    GROUP BY customer_id"""
+
+
+def accrue_completed_rentals(cursor, points_per_unit: float, lookback_days: int) -> dict:
+    """
+    Credit points for rentals completed since the last run and advance the
+    watermark. Run inside a transaction; the watermark row lock keeps two runs
+    from overlapping, and a rental already in the ledger is never credited
+    again, so re-running after a failure is safe.
+    """
+    cursor.execute("INSERT IGNORE INTO JobWatermark (job, watermark) VALUES (%s, NOW())", (ACCRUAL_JOB,))
+    cursor.execute("SELECT watermark, runs, NOW() FROM JobWatermark WHERE job = %s FOR UPDATE", (ACCRUAL_JOB,))
+    since, runs, until = cursor.fetchone()
+    batch_id = runs + 1
+
+    # Returns can be recorded with an earlier actual_return_datetime than the
+    # watermark, so each batch re-checks a lookback window; the anti-join
+    # skips rentals that were credited before
+    cursor.execute("""
+        INSERT INTO LoyaltyLedger (customer_id, rental_id, points, reason, batch_id)
+        SELECT r.customer_id, r.rental_id, FLOOR(r.total_cost * %s), 'rental', %s
+        FROM Rental r
+        JOIN LoyaltyProgram lp ON lp.customer_id = r.customer_id
+        LEFT JOIN LoyaltyLedger l ON l.rental_id = r.rental_id
+        WHERE r.actual_return_datetime > %s - INTERVAL %s DAY
+          AND r.actual_return_datetime <= %s
+          AND r.status = 'Completed'
+          AND r.actual_return_datetime >= lp.date_joined
+          AND FLOOR(r.total_cost * %s) > 0
+          AND l.entry_id IS NULL
+    """, (points_per_unit, batch_id, since, lookback_days, until, points_per_unit))
+    entries = max(cursor.rowcount, 0)
+
+    tier_changes = []
+    customers = points = 0
+    if entries:
+        new_tier = tier_case_sql("lp.points_balance + b.points", "lp.membership_tier")
+        cursor.execute(f"""
+            SELECT lp.membership_tier, {new_tier} AS new_tier, COUNT(*), SUM(b.points)
+            FROM LoyaltyProgram lp
+            JOIN ({_BATCH_TOTALS}) b ON b.customer_id = lp.customer_id
+            GROUP BY lp.membership_tier, new_tier
+            FOR UPDATE
+        """, (batch_id,))
+        moves = {}
+        for old, new, count, total in cursor.fetchall():
+            customers += count
+            points += int(total)
+            if old != new:
+                tier_changes.append({"from": old, "to": new, "customers": count})
+                moves[(old, new)] = count
+        move_members(cursor, moves)
+
+        # MySQL does not guarantee the order of SET assignments in a
+        # multi-table UPDATE, so the tier (computed from the old balance plus
+        # the batch) is written before the balance moves, in its own statement
+        cursor.execute(f"""
+            UPDATE LoyaltyProgram lp
+            JOIN ({_BATCH_TOTALS}) b ON b.customer_id = lp.customer_id
+            SET lp.membership_tier = {new_tier}
+        """, (batch_id,))
+        cursor.execute(f"""
+            UPDATE LoyaltyProgram lp
+            JOIN ({_BATCH_TOTALS}) b ON b.customer_id = lp.customer_id
+            SET lp.points_balance = lp.points_balance + b.points
+        """, (batch_id,))
+
+    result = {
+        "batch_id": batch_id,
+        "since": str(since),
+        "until": str(until),
+        "rentals_credited": entries,
+        "customers": customers,
+        "points": points,
+        "tier_changes": tier_changes,
+    }
+    cursor.execute("""
+        UPDATE JobWatermark
+        SET watermark = %s, runs = %s, last_run_at = %s, last_result = %s
+        WHERE job = %s
+    """, (until, batch_id, until, json.dumps(result), ACCRUAL_JOB))
+    return result
+
+
+def rebuild_balances(cursor) -> int:
+    """
+    Recompute every balance (and tier) from the ledger; returns how many
+    programs had drifted. For repairs after manual edits to either table.
+    """
+    # Tier and balance both come from the ledger sum, never from the other
+    # assignment, so the result does not depend on SET order
+    new_tier = tier_case_sql("COALESCE(s.points, 0)", "lp.membership_tier")
+    cursor.execute(f"""
+        UPDATE LoyaltyProgram lp
+        LEFT JOIN (
+            SELECT customer_id, SUM(points) AS points
+            FROM LoyaltyLedger
+            GROUP BY customer_id
+        ) s ON s.customer_id = lp.customer_id
+        SET lp.membership_tier = {new_tier},
+            lp.points_balance = COALESCE(s.points, 0)
+        WHERE lp.points_balance <> COALESCE(s.points, 0)
+    """)
+    drifted = max(cursor.rowcount, 0)
+    refresh_tier_counts(cursor)
+    if drifted:
+        record_run(cursor, REBUILD_JOB, {"drifted": drifted})
+    return drifted
+
+
+def record_run(cursor, job: str, result: dict) -> None:
+    """Count a run of `job` that changed LoyaltyProgram in JobWatermark."""
+    cursor.execute("INSERT IGNORE INTO JobWatermark (job, watermark) VALUES (%s, NOW())", (job,))
+    cursor.execute("""
+        UPDATE JobWatermark
+        SET watermark = NOW(), runs = runs + 1, last_run_at = NOW(), last_result = %s
+        WHERE job = %s
+    """, (json.dumps(result), job))
+
+
+# ── Bulk tier recompute ───────────────────────────────────────────────────────
+
+def recompute_tiers(
+    thresholds: Thresholds = TIER_THRESHOLDS,
+    reset: bool = False,
+    dry_run: bool = False,
+    chunk_size: int = 50000,
+    sample: int = 20,
+    progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Re-derive every member's tier from their balance.
+
+    Works through LoyaltyProgram in program_id ranges of `chunk_size`: one
+    grouped SELECT per chunk collects the old -> new transitions and, unless
+    `dry_run`, one UPDATE with the tier CASE rewrites only the rows that
+    change. Each chunk is its own short transaction (retried on deadlocks),
+    so live points updates are never blocked for long.
+
+    By default a balance below the lowest threshold keeps its tier, as on
+    every points change; `reset` (e.g. the annual reset) drops those members
+    to Bronze instead.
+    """
+    started = time.perf_counter()
+    new_tier = tier_case_sql("points_balance", f"'{BASE_TIER}'" if reset else "membership_tier", thresholds)
+    transitions: Dict[Tuple[str, str], int] = {}
+    report = {
+        "dry_run": dry_run,
+        "reset": reset,
+        "thresholds": {tier: threshold for tier, threshold in reversed(thresholds)},
+        "members": 0,
+        "scanned": 0,
+        "changed": 0,
+        "chunks": 0,
+    }
+    samples = []
+
+    def bounds(cursor):
+        cursor.execute("SELECT MIN(program_id), MAX(program_id), COUNT(*) FROM LoyaltyProgram")
+        return cursor.fetchone()
+
+    low, high, report["members"] = run_transaction(bounds, "loyalty_tiers")
+    if low is None:
+        return _finish(report, transitions, samples, started)
+
+    def chunk(first: int, last: int):
+        def work(cursor):
+            cursor.execute(f"""
+                SELECT membership_tier, {new_tier} AS new_tier, COUNT(*)
+                FROM LoyaltyProgram
+                WHERE program_id BETWEEN %s AND %s
+                GROUP BY membership_tier, new_tier
+                {"" if dry_run else "FOR UPDATE"}
+            """, (first, last))
+            counts = cursor.fetchall()
+            found = []
+            if sample and len(samples) < sample:
+                cursor.execute(f"""
+                    SELECT customer_id, points_balance, membership_tier, {new_tier}
+                    FROM LoyaltyProgram
+                    WHERE program_id BETWEEN %s AND %s
+                      AND NOT membership_tier <=> {new_tier}
+                    ORDER BY program_id
+                    LIMIT %s
+                """, (first, last, sample - len(samples)))
+                found = cursor.fetchall()
+            if not dry_run:
+                cursor.execute(f"""
+                    UPDATE LoyaltyProgram
+                    SET membership_tier = {new_tier}
+                    WHERE program_id BETWEEN %s AND %s
+                      AND NOT membership_tier <=> {new_tier}
+                """, (first, last))
+                move_members(cursor, {(old, new): count for old, new, count in counts})
+            return counts, found
+        return work
+
+    for first in range(low, high + 1, chunk_size):
+        last = min(first + chunk_size - 1, high)
+        counts, found = run_transaction(chunk(first, last), "loyalty_tiers", idempotent=True)
+        for old, new, count in counts:
+            report["scanned"] += count
+            if old != new:
+                transitions[(old, new)] = transitions.get((old, new), 0) + count
+                report["changed"] += count
+        samples.extend(
+            {"customer_id": c, "points_balance": b, "from": old, "to": new} for c, b, old, new in found
+        )
+        report["chunks"] += 1
+        if progress is not None:
+            progress({
+                "scanned": report["scanned"],
+                "members": report["members"],
+                "changed": report["changed"],
+                "through_program_id": last,
+            })
+
+    if report["changed"] and not dry_run:
+        summary = {key: report[key] for key in ("reset", "thresholds", "members", "changed")}
+        run_transaction(lambda cursor: record_run(cursor, TIERS_JOB, summary), "loyalty_tiers", idempotent=True)
+    return _finish(report, transitions, samples, started)
+
+
+def _finish(report: dict, transitions: Dict[Tuple[str, str], int], samples: list, started: float) -> dict:
+    report["transitions"] = [
+        {"from": old, "to": new, "customers": count}
+        for (old, new), count in sorted(transitions.items(), key=lambda kv: -kv[1])
+    ]
+    report["sample"] = samples
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(
+        "Tier recompute%s: %d of %d members changed in %.0f ms",
+        " (dry run)" if report["dry_run"] else "", report["changed"], report["members"], report["elapsed_ms"],
+    )
+    return report
@@ -0,0 +1,408 @@
+"""
+Maintenance reporting: service forecasts and the monthly cost rollup.
+
+A vehicle is due when the rental-days driven since its last service reach its
+usual service interval (the median rental-days between its past services, or
+the fleet median when it has too little history), projected forward at its
+recent daily usage, or when MAINTENANCE_MAX_INTERVAL_DAYS have passed on the
+calendar, whichever comes first.
+
+FleetForecast computes the whole fleet in one pass: one read of the service
+dates and one of the rental intervals, bucketed per vehicle between service
+dates. The result is kept per worker and refreshed incrementally; after a
+maintenance write or a return only the affected vehicles are recomputed, and
+the fleet is recomputed in full once a day (usage is counted up to midnight).
+
+MaintenanceCostMonthly (migration 0005) holds records and cost per vehicle and
+calendar month. The maintenance write routes recompute the buckets they touch
+in the same transaction, and the cost reports read the rollup with month
+ranges, so their cost grows with vehicles x months rather than with history.
+"""
+
+import math
+import threading
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from statistics import median
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from api.core.cache import table_versions
+from api.core.config import settings
+
+FORECAST_TABLES = ("Vehicle", "VehicleMaintenance", "Rental")
+
+# Forecasts due within this many days are reported as "due_soon"
+DUE_SOON_DAYS = 14
+
+# Returns recorded up to this long before midnight still mark their vehicle
+# for recomputation, so backdated returns are picked up
+RETURN_LOOKBACK = timedelta(days=7)
+
+_SECONDS_PER_DAY = 86400.0
+
+
+@dataclass
+class VehicleUsage:
+    """Usage of one vehicle in rental-days, as of the start of the day."""
+    services: List[date] = field(default_factory=list)
+    intervals: List[float] = field(default_factory=list)   # between consecutive services
+    since_service: float = 0.0    # since the last service (since first use if never serviced)
+    recent: float = 0.0           # within the usage window
+    first_use: Optional[date] = None
+
+
+def measure_usage(
+    services: List[date],
+    rentals: Iterable[Tuple[datetime, datetime]],
+    cutoff: datetime,
+    window_start: datetime,
+) -> VehicleUsage:
+    """Bucket one vehicle's rental intervals between its (sorted) service dates."""
+    bounds = [datetime.combine(day, time.min) for day in services]
+    totals = [0.0] * (len(bounds) + 1)
+    usage = VehicleUsage(services=services)
+    for start, end in rentals:
+        end = min(end, cutoff)
+        if end <= start:
+            continue
+        if usage.first_use is None or start.date() < usage.first_use:
+            usage.first_use = start.date()
+        if end > window_start:
+            usage.recent += (end - max(start, window_start)).total_seconds() / _SECONDS_PER_DAY
+        # Split the rental at every service date it spans
+        i = bisect_right(bounds, start)
+        t = start
+        while t < end:
+            segment_end = min(bounds[i], end) if i < len(bounds) else end
+            totals[i] += (segment_end - t).total_seconds() / _SECONDS_PER_DAY
+            t = segment_end
+            i += 1
+    usage.intervals = totals[1:-1]
+    usage.since_service = totals[-1] if bounds else totals[0]
+    return usage
+
+
+def project(usage: VehicleUsage, interval: float, basis: str, today: date) -> dict:
+    """Next service date of one vehicle from its usage and service interval."""
+    last_service = usage.services[-1] if usage.services else None
+    daily_usage = usage.recent / settings.MAINTENANCE_USAGE_WINDOW_DAYS
+    remaining = interval - usage.since_service
+
+    due_by = "usage"
+    if remaining <= 0:
+        # Already past the interval; date the crossing back at the recent pace
+        overdue_days = int(-remaining / daily_usage) if daily_usage else 0
+        next_service = today - timedelta(days=overdue_days)
+    elif daily_usage:
+        next_service = today + timedelta(days=math.ceil(remaining / daily_usage))
+    else:
+        next_service = None
+
+    anchor = last_service or usage.first_use
+    if anchor is not None:
+        calendar_due = anchor + timedelta(days=settings.MAINTENANCE_MAX_INTERVAL_DAYS)
+        if next_service is None or calendar_due < next_service:
+            next_service, due_by = calendar_due, "calendar"
+
+    days_until_due = (next_service - today).days if next_service else None
+    if days_until_due is None:
+        status = "unused"
+    elif days_until_due <= 0:
+        status = "overdue"
+    elif days_until_due <= DUE_SOON_DAYS:
+        status = "due_soon"
+    else:
+        status = "ok"
+    return {
+        "last_service_date": last_service.isoformat() if last_service else None,
+        "services": len(usage.services),
+        "service_interval_rental_days": round(interval, 1),
+        "interval_basis": basis,
+        "rental_days_since_service": round(usage.since_service, 1),
+        "daily_usage": round(daily_usage, 3),
+        "next_service_date": next_service.isoformat() if next_service else None,
+        "due_by": due_by if next_service else None,
+        "days_until_due": days_until_due,
+        "status": status,
+    }
+
+
+def _sort_key(forecast: dict):
+    # Soonest first; vehicles without any usage last
+    return (forecast["next_service_date"] is None, forecast["next_service_date"] or "", forecast["vehicle_id"])
+
+
+class FleetForecast:
+    """Per-worker forecast of every vehicle, refreshed on demand."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._day: Optional[date] = None
+        self._versions = None
+        self._vehicles: Dict[int, tuple] = {}       # vehicle_id -> (code, brand, model, plate)
+        self._usage: Dict[int, VehicleUsage] = {}
+        self._fleet_interval: Tuple[float, str] = (0.0, "default")
+        self._forecasts: Dict[int, dict] = {}
+        self._sorted: List[dict] = []
+
+    def forecasts(self, cursor, today: Optional[date] = None) -> List[dict]:
+        """Every vehicle's forecast, soonest due first."""
+        today = today or date.today()
+        versions = table_versions(*FORECAST_TABLES)
+        with self._lock:
+            if self._day != today or not self._vehicles:
+                self._recompute(cursor, today, None)
+            elif versions != self._versions:
+                self._refresh(cursor, today, versions)
+            self._versions = versions
+            return self._sorted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._day = None
+            self._vehicles.clear()
+
+    # ── internals (called with the lock held) ────────────────────────────────
+
+    def _recompute(self, cursor, today: date, vehicle_ids: Optional[List[int]]) -> None:
+        """Measure `vehicle_ids` (None: the whole fleet) and re-project them."""
+        cutoff = datetime.combine(today, time.min)
+        window_start = cutoff - timedelta(days=settings.MAINTENANCE_USAGE_WINDOW_DAYS)
+        where, params = "", []
+        if vehicle_ids is not None:
+            where = " AND vehicle_id IN (" + ", ".join(["%s"] * len(vehicle_ids)) + ")"
+            params = list(vehicle_ids)
+
+        if vehicle_ids is None:
+            cursor.execute("SELECT vehicle_id, vehicle_code, brand, model, plate_number FROM Vehicle")
+            self._vehicles = {row[0]: row[1:] for row in cursor.fetchall()}
+            self._usage = {}
+            self._forecasts = {}
+
+        services: Dict[int, List[date]] = {}
+        # Future-dated records are scheduled services, not history
+        cursor.execute(
+            "SELECT vehicle_id, maintenance_date FROM VehicleMaintenance WHERE maintenance_date <= %s" + where,
+            [today] + params,
+        )
+        for vehicle_id, day in cursor.fetchall():
+            services.setdefault(vehicle_id, []).append(day)
+
+        rentals: Dict[int, List[Tuple[datetime, datetime]]] = {}
+        cursor.execute(
+            "SELECT vehicle_id, pickup_datetime, COALESCE(actual_return_datetime, %s) FROM Rental "
+            "WHERE pickup_datetime < %s AND status <> 'Cancelled'" + where,
+            [cutoff, cutoff] + params,
+        )
+        for vehicle_id, start, end in cursor.fetchall():
+            rentals.setdefault(vehicle_id, []).append((start, end))
+
+        for vehicle_id in (self._vehicles if vehicle_ids is None else vehicle_ids):
+            if vehicle_id not in self._vehicles:
+                continue
+            self._usage[vehicle_id] = measure_usage(
+                sorted(set(services.get(vehicle_id, ()))),
+                rentals.get(vehicle_id, ()),
+                cutoff,
+                window_start,
+            )
+
+        if vehicle_ids is None:
+            # Fleet-wide typical interval, for vehicles with fewer than two services
+            intervals = [i for usage in self._usage.values() for i in usage.intervals if i > 0]
+            self._fleet_interval = (
+                (median(intervals), "fleet") if intervals
+                else (float(settings.MAINTENANCE_SERVICE_INTERVAL_DAYS), "default")
+            )
+            self._day = today
+        self._project(today, self._usage if vehicle_ids is None else vehicle_ids)
+
+    def _refresh(self, cursor, today: date, versions) -> None:
+        """Recompute only the vehicles whose history or usage changed."""
+        vehicle_v, maintenance_v, rental_v = versions
+        old = self._versions or (None, None, None)
+        dirty = set()
+
+        if vehicle_v != old[0]:
+            cursor.execute("SELECT vehicle_id, vehicle_code, brand, model, plate_number FROM Vehicle")
+            vehicles = {row[0]: row[1:] for row in cursor.fetchall()}
+            dirty.update(vehicles.keys() - self._vehicles.keys())
+            for vehicle_id in self._vehicles.keys() - vehicles.keys():
+                self._usage.pop(vehicle_id, None)
+                self._forecasts.pop(vehicle_id, None)
+            changed = [v for v in vehicles if v in self._vehicles and vehicles[v] != self._vehicles[v]]
+            self._vehicles = vehicles
+            self._project(today, changed)
+
+        if maintenance_v != old[1]:
+            # Service dates are small next to rentals; compare them to find
+            # the vehicles whose history changed
+            services: Dict[int, set] = {}
+            cursor.execute(
+                "SELECT vehicle_id, maintenance_date FROM VehicleMaintenance WHERE maintenance_date <= %s",
+                (today,),
+            )
+            for vehicle_id, day in cursor.fetchall():
+                services.setdefault(vehicle_id, set()).add(day)
+            dirty.update(
+                vehicle_id for vehicle_id, usage in self._usage.items()
+                if set(usage.services) != services.get(vehicle_id, set())
+            )
+
+        if rental_v != old[2]:
+            cursor.execute(
+                "SELECT DISTINCT vehicle_id FROM Rental WHERE actual_return_datetime >= %s",
+                (datetime.combine(today, time.min) - RETURN_LOOKBACK,),
+            )
+            dirty.update(row[0] for row in cursor.fetchall())
+
+        if dirty:
+            self._recompute(cursor, today, sorted(dirty))
+        else:
+            self._resort()
+
+    def _project(self, today: date, vehicle_ids: Iterable[int]) -> None:
+        fleet_interval, fleet_basis = self._fleet_interval
+        for vehicle_id in vehicle_ids:
+            usage = self._usage.get(vehicle_id)
+            if usage is None:
+                continue
+            intervals = [i for i in usage.intervals if i > 0]
+            interval, basis = (median(intervals), "history") if intervals else (fleet_interval, fleet_basis)
+            code, brand, model, plate = self._vehicles[vehicle_id]
+            self._forecasts[vehicle_id] = {
+                "vehicle_id": vehicle_id,
+                "vehicle_code": code,
+                "vehicle_info": f"{brand} {model} ({plate})",
+                **project(usage, interval, basis, today),
+            }
+        self._resort()
+
+    def _resort(self) -> None:
+        self._sorted = sorted(self._forecasts.values(), key=_sort_key)
+
+
+fleet_forecast = FleetForecast()
+
+
+# ── Cost rollup ───────────────────────────────────────────────────────────────
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(day: date) -> date:
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def refresh_cost_buckets(cursor, records: Iterable[Tuple[int, date]]) -> None:
+    """
+    Recompute the MaintenanceCostMonthly rows for the months of `records`
+    ((vehicle_id, maintenance_date) pairs, before and after a write) from
+    VehicleMaintenance. Call in the transaction that wrote them; months are
+    upserted in key order, so concurrent writers to the same month serialize
+    on the row instead of racing to insert it.
+    """
+    for vehicle_id, month in sorted({(vehicle_id, month_start(day)) for vehicle_id, day in records}):
+        cursor.execute(
+            """
+            INSERT INTO MaintenanceCostMonthly (vehicle_id, month_start, records, total_cost, first_date, last_date)
+            SELECT vehicle_id, %s, COUNT(*), COALESCE(SUM(cost), 0), MIN(maintenance_date), MAX(maintenance_date)
+            FROM VehicleMaintenance
+            WHERE vehicle_id = %s AND maintenance_date >= %s AND maintenance_date < %s
+            GROUP BY vehicle_id
+            ON DUPLICATE KEY UPDATE
+                records = VALUES(records), total_cost = VALUES(total_cost),
+                first_date = VALUES(first_date), last_date = VALUES(last_date)
+            """,
+            (month, vehicle_id, month, next_month(month)),
+        )
+        # A month whose last record went away has nothing left to upsert
+        cursor.execute(
+            """
+            DELETE FROM MaintenanceCostMonthly
+            WHERE vehicle_id = %s AND month_start = %s
+              AND NOT EXISTS (
+                  SELECT 1 FROM VehicleMaintenance
+                  WHERE vehicle_id = %s AND maintenance_date >= %s AND maintenance_date < %s
+              )
+            """,
+            (vehicle_id, month, vehicle_id, month, next_month(month)),
+        )
+
+
+def _year_range(year: Optional[int]) -> Tuple[str, list]:
+    """Sargable month_start predicate for `year` (empty when None)."""
+    if year is None:
+        return "", []
+    return " AND c.month_start >= %s AND c.month_start < %s", [date(year, 1, 1), date(year + 1, 1, 1)]
+
+
+def cost_stats(cursor, vehicle_id: Optional[int] = None, year: Optional[int] = None) -> List[dict]:
+    """Records and cost per vehicle, most expensive first; vehicles without any are listed with zeros."""
+    # The year range sits in the join condition so vehicles with no
+    # maintenance that year are kept by the LEFT JOIN
+    year_sql, params = _year_range(year)
+    query = f"""
+        SELECT
+            v.vehicle_id,
+            CONCAT(v.brand, ' ', v.model, ' (', v.plate_number, ')') as vehicle_info,
+            COALESCE(SUM(c.records), 0) as maintenance_count,
+            COALESCE(SUM(c.total_cost), 0) as total_cost,
+            MIN(c.first_date) as first_maintenance,
+            MAX(c.last_date) as last_maintenance
+        FROM Vehicle v
+        LEFT JOIN MaintenanceCostMonthly c ON c.vehicle_id = v.vehicle_id{year_sql}
+    """
+    if vehicle_id:
+        query += " WHERE v.vehicle_id = %s"
+        params.append(vehicle_id)
+    query += """
+        GROUP BY v.vehicle_id
+        ORDER BY total_cost DESC
+    """
+    cursor.execute(query, params)
+    return [
+        {
+            "vehicle_id": s[0],
+            "vehicle_info": s[1],
+            "maintenance_count": int(s[2]),
+            "total_cost": float(s[3]),
+            "first_maintenance": s[4].strftime('%Y-%m-%d') if s[4] else None,
+            "last_maintenance": s[5].strftime('%Y-%m-%d') if s[5] else None,
+            "average_cost": float(s[3] / s[2]) if s[2] > 0 else 0
+        }
+        for s in cursor.fetchall()
+    ]
+
+
+def cost_breakdown(
+    cursor,
+    period: str = "year",
+    vehicle_id: Optional[int] = None,
+    year: Optional[int] = None,
+) -> List[dict]:
+    """Records and cost per year or month (`period`), oldest first."""
+    bucket = "YEAR(c.month_start)" if period == "year" else "c.month_start"
+    year_sql, params = _year_range(year)
+    query = f"""
+        SELECT {bucket}, SUM(c.records), SUM(c.total_cost), COUNT(DISTINCT c.vehicle_id)
+        FROM MaintenanceCostMonthly c
+        WHERE 1=1{year_sql}
+    """
+    if vehicle_id:
+        query += " AND c.vehicle_id = %s"
+        params.append(vehicle_id)
+    query += " GROUP BY 1 ORDER BY 1"
+    cursor.execute(query, params)
+    return [
+        {
+            "period": str(b[0]) if period == "year" else b[0].strftime('%Y-%m'),
+            "maintenance_count": int(b[1]),
+            "total_cost": float(b[2]),
+            "average_cost": float(b[2] / b[1]) if b[1] else 0,
+            "vehicles": int(b[3]),
+        }
+        for b in cursor.fetchall()
+    ]
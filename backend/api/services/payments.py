@@ -0,0 +1,288 @@
+"""
+Payment reconciliation.
+
+Checks that what each rental should have collected matches its successful
+Payment rows, and records the rentals that do not in PaymentException (one
+row per rental, replaced or cleared on every run that covers it):
+
+  * Completed rentals must have been paid total_cost exactly
+    (`underpaid` / `overpaid`).
+  * Active rentals must have at least their online deposit paid
+    (`deposit_missing`), and no rental still open may have been paid more than
+    total_cost (`overpaid`).
+  * While a rental is open, deposit_paid_online + payment_due_at_pickup must
+    add up to total_cost (`split_mismatch`). Bookings without a split (both
+    zero) are not checked; completed rentals are repriced on return, so their
+    split no longer applies.
+  * Cancelled rentals must have no successful payments (`paid_on_cancelled`).
+
+reconcile_payments() walks the rentals picked up in a date window in
+(pickup_datetime, rental_id) keyset chunks. For each chunk it reads the
+chunk's payments in rental_id order from the Payment(rental_id, ...) index and
+merge-joins them against the chunk's rentals sorted the same way, so memory
+is bounded by the chunk size however long the window is. Each chunk is its
+own short transaction, like the loyalty tier recompute.
+"""
+
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from database.retry import run_transaction
+
+logger = logging.getLogger(__name__)
+
+RECONCILIATION_JOB = "payment_reconciliation"
+
+EXCEPTION_KINDS = ("underpaid", "overpaid", "deposit_missing", "split_mismatch", "paid_on_cancelled")
+
+ZERO = Decimal("0.00")
+
+
+def _money(value) -> Decimal:
+    return Decimal(value) if value is not None else ZERO
+
+
+def classify(status: str, total_cost, deposit, due_at_pickup, paid: Decimal) -> Optional[Tuple[str, Decimal]]:
+    """(kind, expected amount) when a rental's payments do not add up, else None."""
+    status = (status or "").lower()
+    total, deposit = _money(total_cost), _money(deposit)
+    split = deposit + _money(due_at_pickup)
+    if status == "cancelled":
+        return ("paid_on_cancelled", ZERO) if paid > 0 else None
+    if status == "completed":
+        if paid < total:
+            return "underpaid", total
+        if paid > total:
+            return "overpaid", total
+        return None
+    if status not in ("active", "reserved"):
+        return None
+    if status == "active" and paid < deposit:
+        return "deposit_missing", deposit
+    if paid > total:
+        return "overpaid", total
+    if split and split != total:
+        return "split_mismatch", total
+    return None
+
+
+def merge_payments(rentals: Sequence[tuple], payments: Sequence[tuple]) -> Iterator[tuple]:
+    """
+    Merge-join rentals (rental_id first) with payment rows
+    (rental_id, amount, is_successful, payment_date), both sorted by
+    rental_id. Yields (rental, paid, failed, last_payment_date, payments).
+    """
+    i = 0
+    for rental in rentals:
+        rental_id = rental[0]
+        while i < len(payments) and payments[i][0] < rental_id:
+            i += 1
+        paid, failed, count, last_date = ZERO, 0, 0, None
+        while i < len(payments) and payments[i][0] == rental_id:
+            _, amount, ok, payment_date = payments[i]
+            if ok:
+                paid += _money(amount)
+            else:
+                failed += 1
+            count += 1
+            if last_date is None or payment_date > last_date:
+                last_date = payment_date
+            i += 1
+        yield rental, paid, failed, last_date, count
+
+
+def _reconcile_chunk(cursor, after: Tuple[datetime, int], until: datetime, chunk_size: int) -> dict:
+    """Check the next `chunk_size` rentals picked up after `after`, up to `until`."""
+    cursor.execute("""
+        SELECT rental_id, pickup_datetime, status, total_cost, deposit_paid_online, payment_due_at_pickup
+        FROM Rental
+        WHERE pickup_datetime < %s
+          AND (pickup_datetime > %s OR (pickup_datetime = %s AND rental_id > %s))
+        ORDER BY pickup_datetime, rental_id
+        LIMIT %s
+    """, (until, after[0], after[0], after[1], chunk_size))
+    rentals = cursor.fetchall()
+    if not rentals:
+        return {"rentals": 0}
+    last = rentals[-1]
+
+    rentals = sorted(rentals)
+    ids = [row[0] for row in rentals]
+    placeholders = ", ".join(["%s"] * len(ids))
+    cursor.execute(f"""
+        SELECT rental_id, amount, is_successful, payment_date
+        FROM Payment
+        WHERE rental_id IN ({placeholders})
+        ORDER BY rental_id
+    """, ids)
+    payments = cursor.fetchall()
+
+    flagged, clean = [], []
+    kinds: Dict[str, int] = {}
+    for rental, paid, failed, last_date, _ in merge_payments(rentals, payments):
+        rental_id, pickup, status, total_cost, deposit, due = rental
+        found = classify(status, total_cost, deposit, due, paid)
+        if found is None:
+            clean.append(rental_id)
+            continue
+        kind, expected = found
+        kinds[kind] = kinds.get(kind, 0) + 1
+        flagged.append((rental_id, kind, status, pickup.date(), expected, paid, paid - expected, failed, last_date))
+
+    cleared = 0
+    if clean:
+        cursor.execute(
+            f"DELETE FROM PaymentException WHERE rental_id IN ({', '.join(['%s'] * len(clean))})", clean
+        )
+        cleared = max(cursor.rowcount, 0)
+    if flagged:
+        cursor.execute(
+            """
+            INSERT INTO PaymentException (
+                rental_id, kind, rental_status, pickup_date, expected, paid, difference,
+                failed_payments, last_payment_date
+            ) VALUES """
+            + ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(flagged))
+            + """
+            ON DUPLICATE KEY UPDATE
+                kind = VALUES(kind), rental_status = VALUES(rental_status),
+                pickup_date = VALUES(pickup_date), expected = VALUES(expected), paid = VALUES(paid),
+                difference = VALUES(difference), failed_payments = VALUES(failed_payments),
+                last_payment_date = VALUES(last_payment_date), detected_at = CURRENT_TIMESTAMP
+            """,
+            [value for row in flagged for value in row],
+        )
+    return {
+        "rentals": len(rentals),
+        "payments": len(payments),
+        "kinds": kinds,
+        "cleared": cleared,
+        "position": (last[1], last[0]),
+    }
+
+
+def reconcile_payments(
+    days: int,
+    chunk_size: int = 5000,
+    until: Optional[datetime] = None,
+    progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Reconcile the rentals picked up in the `days` before `until` (default now)
+    and record the run in JobWatermark. Safe to re-run: every rental covered
+    gets its exception replaced or cleared.
+    """
+    started = time.perf_counter()
+    until = until or datetime.now().replace(microsecond=0)
+    since = until - timedelta(days=days)
+    report = {
+        "since": str(since),
+        "until": str(until),
+        "rentals": 0,
+        "payments": 0,
+        "exceptions": {kind: 0 for kind in EXCEPTION_KINDS},
+        "cleared": 0,
+        "chunks": 0,
+    }
+
+    # Keyset position: just before the first rental picked up at `since`
+    position = (since, 0)
+    while True:
+        chunk = run_transaction(
+            lambda cursor: _reconcile_chunk(cursor, position, until, chunk_size),
+            RECONCILIATION_JOB,
+            idempotent=True,
+        )
+        if not chunk["rentals"]:
+            break
+        report["rentals"] += chunk["rentals"]
+        report["payments"] += chunk["payments"]
+        report["cleared"] += chunk["cleared"]
+        for kind, count in chunk["kinds"].items():
+            report["exceptions"][kind] += count
+        report["chunks"] += 1
+        position = chunk["position"]
+        if progress is not None:
+            progress({
+                "rentals": report["rentals"],
+                "payments": report["payments"],
+                "flagged": sum(report["exceptions"].values()),
+                "through": str(position[0]),
+            })
+        if chunk["rentals"] < chunk_size:
+            break
+
+    report["flagged"] = sum(report["exceptions"].values())
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    run_transaction(lambda cursor: _record_run(cursor, until, report), RECONCILIATION_JOB, idempotent=True)
+    logger.info(
+        "Payment reconciliation %s -> %s: %d rentals, %d payments, %d flagged in %.0f ms",
+        since, until, report["rentals"], report["payments"], report["flagged"], report["elapsed_ms"],
+    )
+    return report
+
+
+def _record_run(cursor, until: datetime, report: dict) -> None:
+    cursor.execute("INSERT IGNORE INTO JobWatermark (job, watermark) VALUES (%s, %s)", (RECONCILIATION_JOB, until))
+    cursor.execute("""
+        UPDATE JobWatermark
+        SET watermark = %s, runs = runs + 1, last_run_at = NOW(), last_result = %s
+        WHERE job = %s
+    """, (until, json.dumps(report), RECONCILIATION_JOB))
+
+
+def exception_summary(cursor) -> dict:
+    """Open exceptions per kind, with the last run's report."""
+    cursor.execute("""
+        SELECT kind, COUNT(*), COALESCE(SUM(expected), 0), COALESCE(SUM(paid), 0), COALESCE(SUM(difference), 0)
+        FROM PaymentException
+        GROUP BY kind
+    """)
+    by_kind = {row[0]: row[1:] for row in cursor.fetchall()}
+    kinds = [
+        {
+            "kind": kind,
+            "rentals": int(by_kind[kind][0]),
+            "expected": float(by_kind[kind][1]),
+            "paid": float(by_kind[kind][2]),
+            "difference": float(by_kind[kind][3]),
+        }
+        for kind in EXCEPTION_KINDS + tuple(sorted(set(by_kind) - set(EXCEPTION_KINDS)))
+        if kind in by_kind
+    ]
+    cursor.execute(
+        "SELECT last_run_at, runs, last_result FROM JobWatermark WHERE job = %s", (RECONCILIATION_JOB,)
+    )
+    run = cursor.fetchone()
+    return {
+        "open_exceptions": sum(k["rentals"] for k in kinds),
+        "kinds": kinds,
+        "last_run_at": run[0] if run else None,
+        "runs": run[1] if run else 0,
+        "last_run": json.loads(run[2]) if run and run[2] else None,
+    }
+
+
+def list_exceptions(cursor, kind: Optional[str], before: Optional[int], limit: int) -> List[tuple]:
+    """Open exceptions, newest rental first; `before` is the last rental_id of the previous page."""
+    sql = """
+        SELECT rental_id, kind, rental_status, pickup_date, expected, paid, difference,
+               failed_payments, last_payment_date, detected_at
+        FROM PaymentException
+        WHERE 1=1
+    """
+    params: list = []
+    if kind:
+        sql += " AND kind = %s"
+        params.append(kind)
+    if before is not None:
+        sql += " AND rental_id < %s"
+        params.append(before)
+    sql += " ORDER BY rental_id DESC LIMIT %s"
+    params.append(limit)
+    cursor.execute(sql, params)
+    return cursor.fetchall()
@@ -0,0 +1,224 @@
+"""
+Rental pricing: the daily rate times the rental length, less the best
+promotion that applies.
+
+A PromoOffer applies to rentals picked up between its valid_from and valid_to
+dates, from min_days long and for vehicle_type vehicles when those are set
+(migration 0006). Promos whose other conditions depend on the customer or
+branch are stored with auto_apply off and only price a quote that asks for
+them by promo_id.
+
+PromoIndex keeps the promotions in memory as an interval index: the validity
+boundaries split the calendar into segments, each holding the promos live
+throughout it, best discount first. Finding the best promo for a quote is a
+bisect plus a scan of the few promos live that day, with no query. The index
+is reloaded after a write to PromoOffer, and every
+PRICING_PROMO_REFRESH_SECONDS to pick up edits made outside the API.
+"""
+
+import threading
+import time as clock
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from api.core.cache import table_versions
+from api.core.config import settings
+
+PROMO_COLUMNS = "promo_id, name, discount_percent, valid_from, valid_to, min_days, vehicle_type, auto_apply"
+
+# Promos that ended longer ago than this are not loaded
+PROMO_LOOKBACK = timedelta(days=31)
+
+
+def rental_days(pickup: datetime, planned_return: datetime) -> int:
+    """Days charged at booking: whole days between pickup and planned return (min 1)."""
+    return max(1, (planned_return - pickup).days)
+
+
+def final_rental_cost(
+    pickup_date: date,
+    actual_return: datetime,
+    daily_rate,
+    additional_charges: float = 0,
+    discount_percent: int = 0,
+) -> float:
+    """
+    Cost charged on return: calendar days rented, inclusive (min 1), less the
+    booking's promo discount, plus extras (which are not discounted).
+    """
+    days_rented = max(1, (actual_return.date() - pickup_date).days + 1)
+    rental = days_rented * float(daily_rate)
+    if discount_percent:
+        rental -= round(rental * discount_percent / 100, 2)
+    return rental + additional_charges
+
+
+@dataclass(frozen=True)
+class Promo:
+    promo_id: int
+    name: str
+    discount_percent: int
+    valid_from: date
+    valid_to: date
+    min_days: Optional[int] = None
+    vehicle_type: Optional[str] = None
+    auto_apply: bool = True
+
+    def applies(self, pickup: date, days: int, vehicle_type: Optional[str]) -> bool:
+        if not self.valid_from <= pickup <= self.valid_to:
+            return False
+        if self.min_days and days < self.min_days:
+            return False
+        if self.vehicle_type and (vehicle_type or "").lower() != self.vehicle_type.lower():
+            return False
+        return True
+
+    def as_dict(self) -> dict:
+        return {"promo_id": self.promo_id, "name": self.name, "discount_percent": self.discount_percent}
+
+
+def promo_from_row(row) -> Promo:
+    """Promo from a PROMO_COLUMNS row."""
+    return Promo(row[0], row[1], int(row[2] or 0), row[3], row[4], row[5], row[6], bool(row[7]))
+
+
+class PromoIndex:
+    """Per-worker interval index of PromoOffer, reloaded when the table changes."""
+
+    def __init__(self, refresh_seconds: Optional[float] = None):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._bounds: List[date] = []
+        self._segments: List[Tuple[Promo, ...]] = []
+        self._promos: Dict[int, Promo] = {}
+        self._version = None
+        self._loaded_at = 0.0
+
+    def load(self, promos: Iterable[Promo]) -> None:
+        """Rebuild the index from `promos`."""
+        promos = [p for p in promos if p.discount_percent > 0 and p.valid_from <= p.valid_to]
+        # Sweep the validity boundaries in date order, tracking the live set
+        starts: Dict[date, List[Promo]] = {}
+        ends: Dict[date, List[Promo]] = {}
+        for promo in promos:
+            starts.setdefault(promo.valid_from, []).append(promo)
+            ends.setdefault(promo.valid_to + timedelta(days=1), []).append(promo)
+        bounds, segments, live = [], [], {}
+        for day in sorted(starts.keys() | ends.keys()):
+            for promo in ends.get(day, ()):
+                live.pop(promo.promo_id, None)
+            for promo in starts.get(day, ()):
+                live[promo.promo_id] = promo
+            bounds.append(day)
+            segments.append(tuple(sorted(live.values(), key=lambda p: (-p.discount_percent, p.promo_id))))
+        with self._lock:
+            self._bounds, self._segments = bounds, segments
+            self._promos = {p.promo_id: p for p in promos}
+
+    def ensure_loaded(self, cursor) -> None:
+        """Reload from PromoOffer if it changed since the last load (one query, else none)."""
+        version = table_versions("PromoOffer")
+        refresh = self.refresh_seconds if self.refresh_seconds is not None else settings.PRICING_PROMO_REFRESH_SECONDS
+        if version == self._version and clock.monotonic() - self._loaded_at < refresh:
+            return
+        cursor.execute(f"SELECT {PROMO_COLUMNS} FROM PromoOffer WHERE valid_to >= %s",
+                       (date.today() - PROMO_LOOKBACK,))
+        self.load(promo_from_row(row) for row in cursor.fetchall())
+        self._version = version
+        self._loaded_at = clock.monotonic()
+
+    def live(self, day: date) -> Tuple[Promo, ...]:
+        """Promos valid on `day`, best discount first."""
+        with self._lock:
+            i = bisect_right(self._bounds, day) - 1
+            return self._segments[i] if i >= 0 else ()
+
+    def get(self, promo_id: int) -> Optional[Promo]:
+        with self._lock:
+            return self._promos.get(promo_id)
+
+    def best(self, pickup: date, days: int, vehicle_type: Optional[str]) -> Optional[Promo]:
+        """The applicable auto-applied promo with the largest discount, if any."""
+        for promo in self.live(pickup):
+            if promo.auto_apply and promo.applies(pickup, days, vehicle_type):
+                return promo
+        return None
+
+
+promo_index = PromoIndex()
+
+
+class PromoNotApplicable(ValueError):
+    """A quote asked for a promo that is unknown or does not cover the rental."""
+
+
+def _price(days: int, daily_rate, promo: Optional[Promo]) -> dict:
+    base = round(days * float(daily_rate), 2)
+    discount = round(base * promo.discount_percent / 100, 2) if promo else 0.0
+    return {
+        "days": days,
+        "daily_rate": float(daily_rate),
+        "base_price": base,
+        "promo": promo.as_dict() if promo else None,
+        "discount": discount,
+        "total": round(base - discount, 2),
+    }
+
+
+def quote(
+    promos: PromoIndex,
+    daily_rate,
+    vehicle_type: Optional[str],
+    pickup: datetime,
+    planned_return: datetime,
+    promo_id: Optional[int] = None,
+) -> dict:
+    """
+    Price one rental. Uses `promo_id` when given (raising PromoNotApplicable
+    if it does not apply), else the best auto-applied promo. The index must
+    be loaded; no query is made.
+    """
+    days = rental_days(pickup, planned_return)
+    if promo_id is not None:
+        promo = promos.get(promo_id)
+        if promo is None or not promo.applies(pickup.date(), days, vehicle_type):
+            raise PromoNotApplicable(f"Promo {promo_id} does not apply to this rental")
+    else:
+        promo = promos.best(pickup.date(), days, vehicle_type)
+    return _price(days, daily_rate, promo)
+
+
+def quote_window(
+    promos: PromoIndex,
+    vehicles: Iterable[Tuple[float, Optional[str]]],
+    pickup: datetime,
+    planned_return: datetime,
+    promo_id: Optional[int] = None,
+) -> List[dict]:
+    """
+    Price (daily_rate, vehicle_type) candidates for one rental window.
+
+    The duration and the promos live at pickup are worked out once, and the
+    promo by vehicle type, so each candidate is only arithmetic. A `promo_id`
+    prices the candidates it applies to; the rest get no discount.
+    """
+    days = rental_days(pickup, planned_return)
+    pickup_day = pickup.date()
+    if promo_id is not None:
+        chosen = promos.get(promo_id)
+        if chosen is None or not chosen.valid_from <= pickup_day <= chosen.valid_to:
+            raise PromoNotApplicable(f"Promo {promo_id} does not apply to this rental")
+        pick = lambda vehicle_type: chosen if chosen.applies(pickup_day, days, vehicle_type) else None
+    else:
+        pick = lambda vehicle_type: promos.best(pickup_day, days, vehicle_type)
+
+    by_type: Dict[Optional[str], Optional[Promo]] = {}
+    quotes = []
+    for daily_rate, vehicle_type in vehicles:
+        key = vehicle_type.lower() if vehicle_type else None
+        if key not in by_type:
+            by_type[key] = pick(vehicle_type)
+        quotes.append(_price(days, daily_rate, by_type[key]))
+    return quotes
@@ -0,0 +1,177 @@
+"""
+Rental data access.
+
+Every rental response has the same shape: a row of the Rental/Customer/Vehicle
+join in RENTAL_COLUMNS order (what RentalOut and RENTAL_ROW in
+api/routes/rentals.py read). All reads go through rental_query(), so the join
+and the Overdue rule exist once. Writes don't re-select the join afterwards:
+booking and return already fetch the customer and vehicle while validating,
+so their response rows are assembled from those values.
+"""
+
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+
+# Effective status: an active rental past its planned return is reported as Overdue
+EFFECTIVE_STATUS = """
+    CASE
+        WHEN r.status = 'Active'
+             AND r.actual_return_datetime IS NULL
+             AND r.return_datetime < NOW()
+        THEN 'Overdue'
+        ELSE r.status
+    END"""
+
+RENTAL_COLUMNS = (
+    "rental_id", "customer_id", "customer_name", "vehicle_id", "vehicle_info", "daily_rate",
+    "pickup_date", "expected_return_date", "actual_return_date", "status", "total_cost",
+)
+
+_SELECT = f"""
+    SELECT
+        r.rental_id,
+        r.customer_id,
+        CONCAT(c.first_name, ' ', c.last_name) as customer_name,
+        r.vehicle_id,
+        CONCAT(v.brand, ' ', v.model) as vehicle_info,
+        v.daily_rate,
+        DATE(r.pickup_datetime) as pickup_date,
+        DATE(r.return_datetime) as expected_return_date,
+        DATE(r.actual_return_datetime) as actual_return_date,
+        {EFFECTIVE_STATUS} as effective_status,
+        r.total_cost
+    FROM Rental r
+    JOIN Customer c ON r.customer_id = c.customer_id
+    JOIN Vehicle v ON r.vehicle_id = v.vehicle_id"""
+
+# Filters rental_query() understands; values are bound as parameters
+_FILTERS = {
+    "rental_id": "r.rental_id = %s",
+    "customer_id": "r.customer_id = %s",
+    "vehicle_id": "r.vehicle_id = %s",
+    "ongoing": "r.actual_return_datetime IS NULL",
+    "completed": "r.actual_return_datetime IS NOT NULL",
+}
+_FLAG_FILTERS = ("ongoing", "completed")
+
+
+@lru_cache(maxsize=64)
+def _build(filters: Tuple[str, ...], order_by: Optional[str]) -> str:
+    sql = _SELECT
+    if filters:
+        sql += "\n    WHERE " + "\n      AND ".join(_FILTERS[f] for f in filters)
+    if order_by:
+        sql += f"\n    ORDER BY {order_by}"
+    return sql
+
+
+def rental_query(order_by: Optional[str] = None, **filters) -> Tuple[str, list]:
+    """
+    SQL and parameters for rentals matching `filters` (keys of _FILTERS; flag
+    filters take a truthy value, the others the value to match; None skips).
+
+    The same filter set always yields the same string object, which keeps
+    the prepared-statement cache keyed on a handful of statements.
+    """
+    names, params = [], []
+    for name in _FILTERS:
+        value = filters.pop(name, None)
+        if value is None or value is False:
+            continue
+        names.append(name)
+        if name not in _FLAG_FILTERS:
+            params.append(value)
+    if filters:
+        raise TypeError(f"Unknown rental filters: {', '.join(filters)}")
+    return _build(tuple(names), order_by), params
+
+
+def list_rentals(cursor, status: Optional[str] = None, customer_id=None, vehicle_id=None) -> list:
+    """Rentals newest first; `status` is 'ongoing' or 'completed' (others list all)."""
+    sql, params = rental_query(
+        order_by="r.pickup_datetime DESC",
+        ongoing=status == "ongoing",
+        completed=status == "completed",
+        customer_id=customer_id or None,
+        vehicle_id=vehicle_id or None,
+    )
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+def get_rental(cursor, rental_id: int, ongoing: bool = False) -> Optional[tuple]:
+    sql, params = rental_query(rental_id=rental_id, ongoing=ongoing)
+    cursor.execute(sql, params)
+    return cursor.fetchone()
+
+
+# ── Writes ────────────────────────────────────────────────────────────────────
+
+def _money(value) -> Decimal:
+    """Round like the DECIMAL(10,2) total_cost column does."""
+    return Decimal(str(value)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def insert_rental(
+    cursor,
+    customer_id: int,
+    vehicle_id: int,
+    branch_id: int,
+    pickup_datetime: str,
+    return_datetime: str,
+    total_cost: float,
+    status: str = "Active",
+) -> int:
+    """Insert a booking and mark its vehicle rented; returns the new rental_id."""
+    cursor.execute("""
+        INSERT INTO Rental (
+            customer_id, vehicle_id, pickup_branch_id, return_branch_id,
+            pickup_datetime, return_datetime, status, total_cost
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, (
+        customer_id, vehicle_id, branch_id, branch_id,
+        pickup_datetime, return_datetime, status, total_cost,
+    ))
+    rental_id = cursor.lastrowid
+    cursor.execute("UPDATE Vehicle SET status = 'Rented' WHERE vehicle_id = %s", (vehicle_id,))
+    return rental_id
+
+
+def complete_rental(cursor, rental_id: int, vehicle_id: int, actual_return_datetime: str, total_cost: float) -> None:
+    """Close a rental and make its vehicle available again."""
+    cursor.execute("""
+        UPDATE Rental
+        SET actual_return_datetime = %s, total_cost = %s, status = 'Completed'
+        WHERE rental_id = %s
+    """, (actual_return_datetime, total_cost, rental_id))
+    cursor.execute("UPDATE Vehicle SET status = 'Available' WHERE vehicle_id = %s", (vehicle_id,))
+
+
+def booked_row(
+    rental_id: int,
+    customer_id: int,
+    customer_name: str,
+    vehicle_id: int,
+    vehicle_info: str,
+    daily_rate,
+    pickup: datetime,
+    planned_return: datetime,
+    total_cost: float,
+    status: str = "Active",
+) -> tuple:
+    """The row get_rental() would now return for a fresh booking (raw status)."""
+    return (
+        rental_id, customer_id, customer_name, vehicle_id, vehicle_info, daily_rate,
+        pickup.date(), planned_return.date(), None, status, _money(total_cost),
+    )
+
+
+def returned_row(open_row: Sequence, actual_return: date, total_cost: float) -> tuple:
+    """`open_row` (from get_rental(..., ongoing=True)) after complete_rental()."""
+    row = list(open_row)
+    row[8] = actual_return
+    row[9] = "Completed"
+    row[10] = _money(total_cost)
+    return tuple(row)
@@ -0,0 +1,273 @@
+"""
+Review data access.
+
+Reviews carry their rental's vehicle_id and customer_id (migration
+0003_review_feeds), so the per-vehicle and per-customer feeds are range reads
+of (vehicle_id | customer_id, review_date, review_id) indexes on ReviewRatings
+alone. The indexes are not covering: they find and order a page's rows, and
+each of those rows is then read from the table for rating_score and
+review_text, so a page costs one lookup per returned review and nothing per
+skipped one. Pages are keyset-paginated on (review_date, review_id): the next
+page seeks to the last row seen instead of skipping OFFSET rows, so a deep
+page costs the same as the first.
+
+The display strings (vehicle_info, customer_name) are not joined per row; they
+come from NameLookup, a per-worker cache filled with one IN query for the ids
+a page is missing and dropped whenever its table is written.
+
+VehicleRatingSummary (migration 0004) keeps each vehicle's review count and
+score total; every write here adjusts it in the same transaction, a bulk
+import with one multi-row upsert for the whole batch.
+"""
+
+import threading
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from api.core.cache import table_versions
+
+REVIEW_COLUMNS = "review_id, rental_id, rating_score, review_text, review_date, vehicle_id, customer_id"
+
+# Rows per statement in bulk imports; keeps each packet well under max_allowed_packet
+IMPORT_CHUNK_SIZE = 1000
+
+
+def _in_list(ids: Sequence[int]) -> Tuple[str, list]:
+    """
+    "(%s, ...)" and its parameters for `ids`, padded to a power of two so only
+    a handful of distinct statements reach the prepared-statement cache.
+    """
+    padded = list(ids) + list(ids[-1:]) * ((1 << (len(ids) - 1).bit_length()) - len(ids))
+    return "(" + ", ".join(["%s"] * len(padded)) + ")", padded
+
+
+def _chunks(items: Sequence, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class NameLookup:
+    """id -> display name for one table, valid until that table's next write."""
+
+    def __init__(self, table: str, key: str, expression: str, maxsize: int = 50000):
+        self.table = table
+        self.maxsize = maxsize
+        self._sql = f"SELECT {key}, {expression} FROM {table} WHERE {key} IN "
+        self._names: Dict[int, str] = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get_many(self, cursor, ids: Iterable[int]) -> Dict[int, str]:
+        ids = {i for i in ids if i is not None}
+        version = table_versions(self.table)
+        with self._lock:
+            if version != self._version or len(self._names) > self.maxsize:
+                self._names.clear()
+                self._version = version
+            found = {i: self._names[i] for i in ids if i in self._names}
+        missing = sorted(ids - found.keys())
+        if missing:
+            placeholders, params = _in_list(missing)
+            cursor.execute(self._sql + placeholders, params)
+            fetched = dict(cursor.fetchall())
+            found.update(fetched)
+            with self._lock:
+                if self._version == version:
+                    self._names.update(fetched)
+        return found
+
+    def clear(self) -> None:
+        with self._lock:
+            self._names.clear()
+
+
+vehicle_names = NameLookup("Vehicle", "vehicle_id", "CONCAT(brand, ' ', model, ' (', plate_number, ')')")
+customer_names = NameLookup("Customer", "customer_id", "CONCAT(first_name, ' ', last_name)")
+
+
+# ── Keyset cursors ────────────────────────────────────────────────────────────
+
+def encode_cursor(review_date: date, review_id: int) -> str:
+    return f"{review_date.isoformat()}.{review_id}"
+
+
+def decode_cursor(token: str) -> Tuple[date, int]:
+    """Inverse of encode_cursor(); raises ValueError for a malformed token."""
+    day, _, review_id = token.partition(".")
+    return date.fromisoformat(day), int(review_id)
+
+
+# ── Reads ─────────────────────────────────────────────────────────────────────
+
+_FEED_KEYS = {"vehicle": "vehicle_id", "customer": "customer_id"}
+
+
+def review_feed(
+    cursor,
+    by: str,
+    owner_id: int,
+    limit: int,
+    after: Optional[Tuple[date, int]] = None,
+    offset: int = 0,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Newest-first reviews of one vehicle or customer (`by`), starting after the
+    (review_date, review_id) keyset `after`. Returns the page and the cursor
+    for the next one (None on the last page). `offset` is only honoured for
+    the first page, for clients that still page by offset.
+    """
+    column = _FEED_KEYS[by]
+    sql = f"SELECT {REVIEW_COLUMNS} FROM ReviewRatings WHERE {column} = %s"
+    params: list = [owner_id]
+    if after is not None:
+        # Expanded form of (review_date, review_id) < (%s, %s), which MySQL
+        # turns into an index range; the row-constructor form it does not
+        sql += " AND (review_date < %s OR (review_date = %s AND review_id < %s))"
+        params += [after[0], after[0], after[1]]
+    sql += " ORDER BY review_date DESC, review_id DESC LIMIT %s"
+    params.append(limit)
+    if offset and after is None:
+        sql += " OFFSET %s"
+        params.append(offset)
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    next_cursor = encode_cursor(rows[-1][4], rows[-1][0]) if len(rows) == limit else None
+    return with_names(cursor, rows), next_cursor
+
+
+def get_review(cursor, column: str, value: int) -> Optional[dict]:
+    """The review with `column` (review_id or rental_id) equal to `value`."""
+    cursor.execute(f"SELECT {REVIEW_COLUMNS} FROM ReviewRatings WHERE {column} = %s", (value,))
+    row = cursor.fetchone()
+    return with_names(cursor, [row])[0] if row else None
+
+
+def with_names(cursor, rows) -> List[dict]:
+    """ReviewOut-shaped dicts for REVIEW_COLUMNS rows, names filled from the lookups."""
+    vehicles = vehicle_names.get_many(cursor, (row[5] for row in rows))
+    customers = customer_names.get_many(cursor, (row[6] for row in rows))
+    return [
+        {
+            "review_id": row[0],
+            "rental_id": row[1],
+            "rating_score": row[2],
+            "review_text": row[3],
+            "review_date": row[4].strftime('%Y-%m-%d'),
+            "vehicle_info": vehicles.get(row[5], ""),
+            "customer_name": customers.get(row[6], ""),
+        }
+        for row in rows
+    ]
+
+
+# ── Rating summary ────────────────────────────────────────────────────────────
+
+def adjust_vehicle_ratings(cursor, deltas: Dict[int, Tuple[int, Decimal]]) -> None:
+    """
+    Apply {vehicle_id: (review count delta, score total delta)} to
+    VehicleRatingSummary. Call in the transaction that wrote the reviews.
+    """
+    rows = [
+        (vehicle_id, count, total)
+        for vehicle_id, (count, total) in sorted(deltas.items())  # fixed lock order
+        if vehicle_id is not None and (count or total)
+    ]
+    for chunk in _chunks(rows, IMPORT_CHUNK_SIZE):
+        cursor.execute(
+            "INSERT INTO VehicleRatingSummary (vehicle_id, reviews, rating_total) VALUES "
+            + ", ".join(["(%s, %s, %s)"] * len(chunk))
+            + " ON DUPLICATE KEY UPDATE reviews = reviews + VALUES(reviews),"
+              " rating_total = rating_total + VALUES(rating_total)",
+            [value for row in chunk for value in row],
+        )
+
+
+def vehicle_rating(cursor, vehicle_id: int) -> dict:
+    cursor.execute(
+        "SELECT reviews, rating_total FROM VehicleRatingSummary WHERE vehicle_id = %s",
+        (vehicle_id,),
+    )
+    row = cursor.fetchone()
+    reviews, total = (int(row[0]), Decimal(row[1])) if row else (0, Decimal(0))
+    return {
+        "vehicle_id": vehicle_id,
+        "reviews": reviews,
+        "average_rating": round(float(total) / reviews, 2) if reviews else None,
+    }
+
+
+# ── Bulk import ───────────────────────────────────────────────────────────────
+
+def import_reviews(cursor, reviews: Sequence[Tuple[int, dict]]) -> dict:
+    """
+    Upsert (line number, review) pairs keyed on rental_id: new rentals get a
+    review, already-reviewed ones have it replaced. A rental listed twice keeps
+    its last line. Rentals are checked with one IN query per chunk instead of
+    one lookup per review, rows go in as multi-row INSERT ... ON DUPLICATE KEY
+    UPDATE, and the rating summary is adjusted once at the end. Lines naming
+    an unknown rental are returned as errors; the rest are written.
+    """
+    latest: Dict[int, Tuple[int, dict]] = {}
+    for line, review in reviews:
+        latest[review["rental_id"]] = (line, review)
+    rental_ids = sorted(latest)
+
+    # rental_id -> (vehicle_id, customer_id, existing review's score or None)
+    rentals: Dict[int, Tuple[int, int, Optional[Decimal]]] = {}
+    existing = set()
+    for chunk in _chunks(rental_ids, IMPORT_CHUNK_SIZE):
+        placeholders, params = _in_list(chunk)
+        # Locks the reviews being replaced, so their old scores stay valid
+        cursor.execute(
+            "SELECT r.rental_id, r.vehicle_id, r.customer_id, rr.review_id, rr.rating_score "
+            "FROM Rental r LEFT JOIN ReviewRatings rr ON rr.rental_id = r.rental_id "
+            f"WHERE r.rental_id IN {placeholders} FOR UPDATE",
+            params,
+        )
+        for rental_id, vehicle_id, customer_id, review_id, old_score in cursor.fetchall():
+            rentals[rental_id] = (vehicle_id, customer_id, old_score)
+            if review_id is not None:
+                existing.add(rental_id)
+
+    errors = [
+        {"line": latest[rental_id][0], "rental_id": rental_id, "error": "Rental not found"}
+        for rental_id in rental_ids
+        if rental_id not in rentals
+    ]
+    rows = []
+    deltas: Dict[int, Tuple[int, Decimal]] = {}
+    for rental_id in rental_ids:
+        if rental_id not in rentals:
+            continue
+        review = latest[rental_id][1]
+        vehicle_id, customer_id, old_score = rentals[rental_id]
+        score = Decimal(review["rating_score"])
+        rows.append((
+            rental_id, score, review.get("review_text"), review["review_date"], vehicle_id, customer_id,
+        ))
+        count, total = deltas.get(vehicle_id, (0, Decimal(0)))
+        if rental_id in existing:
+            total -= old_score or 0
+            count -= old_score is not None
+        deltas[vehicle_id] = (count + 1, total + score)
+
+    for chunk in _chunks(rows, IMPORT_CHUNK_SIZE):
+        cursor.execute(
+            "INSERT INTO ReviewRatings "
+            "(rental_id, rating_score, review_text, review_date, vehicle_id, customer_id) VALUES "
+            + ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(chunk))
+            + " ON DUPLICATE KEY UPDATE rating_score = VALUES(rating_score),"
+              " review_text = VALUES(review_text), review_date = VALUES(review_date),"
+              " vehicle_id = VALUES(vehicle_id), customer_id = VALUES(customer_id)",
+            [value for row in chunk for value in row],
+        )
+    adjust_vehicle_ratings(cursor, deltas)
+
+    replaced = sum(1 for row in rows if row[0] in existing)
+    return {
+        "created": len(rows) - replaced,
+        "replaced": replaced,
+        "duplicates": len(reviews) - len(latest),
+        "errors": errors,
+    }
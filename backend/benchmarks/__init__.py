@@ -0,0 +1,6 @@
+"""
+Benchmarks
+
+Performance measurements for the API and its hot paths. Run modules from the
+backend directory, e.g. `python -m benchmarks.bench_serialization`.
+"""
@@ -0,0 +1,164 @@
+"""
+Serialization benchmark: per-row Pydantic models vs. the RowSerializer fast path.
+
+Usage (from backend directory):
+    python -m benchmarks.bench_serialization            # 10k rows
+    python -m benchmarks.bench_serialization --rows 50000 --repeat 7
+
+The "models" column reproduces what a list handler did before the fast path:
+build one model per cursor row, then let FastAPI validate the list against
+`response_model` and JSON-encode it. The "fast" column renders the same rows
+with RowSerializer. Both outputs are compared before timing.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import List
+
+# Importing the routes pulls in settings, which refuses to load without a key
+os.environ.setdefault("SECRET_KEY", "benchmark-only-secret-key-000000000000")
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from api.routes.maintenance import MAINTENANCE_ROW, MaintenanceOut
+from api.routes.rentals import RENTAL_ROW, RentalOut, rental_from_row
+from api.routes.vehicles import VEHICLE_ROW, VehicleOut
+
+
+def vehicle_rows(n: int) -> list:
+    rng = random.Random(1)
+    return [
+        (i, f"V{i:05d}", rng.choice(["BMW", "Porsche", "Ferrari"]), f"Model {i % 40}",
+         "Sedan", "Petrol", "Automatic", rng.choice(["Available", "Rented"]),
+         Decimal(f"{rng.randint(100, 3000)}.00"), 4)
+        for i in range(1, n + 1)
+    ]
+
+
+def vehicle_models(rows: list) -> list:
+    return [
+        VehicleOut(
+            vehicle_id=row[0], vehicle_code=row[1], brand=row[2], model=row[3],
+            type=row[4], fuel_type=row[5], transmission=row[6], status=row[7],
+            daily_rate=float(row[8]) if row[8] is not None else 0.0,
+            seating_capacity=row[9],
+        )
+        for row in rows
+    ]
+
+
+def rental_rows(n: int) -> list:
+    rng = random.Random(2)
+    start = date(2025, 1, 1)
+    rows = []
+    for i in range(1, n + 1):
+        pickup = start + timedelta(days=rng.randint(0, 365))
+        ret = pickup + timedelta(days=rng.randint(1, 14))
+        done = rng.random() < 0.7
+        rows.append((
+            i, rng.randint(1, 500), f"Customer {i % 500}", rng.randint(1, 80),
+            f"Brand Model {i % 80}", Decimal("450.00"), pickup, ret,
+            ret if done else None, "Completed" if done else "Active",
+            Decimal(f"{rng.randint(500, 9000)}.00") if done else None,
+        ))
+    return rows
+
+
+def rental_models(rows: list) -> list:
+    return [rental_from_row(r) for r in rows]
+
+
+def maintenance_rows(n: int) -> list:
+    rng = random.Random(3)
+    return [
+        (i, rng.randint(1, 80), "Scheduled service and inspection",
+         date(2025, 1, 1) + timedelta(days=i % 365), Decimal(f"{rng.randint(50, 5000)}.00"),
+         "Prestige Motors Workshop", f"Brand Model {i % 80} (AB-{i % 80:03d})")
+        for i in range(1, n + 1)
+    ]
+
+
+def maintenance_models(rows: list) -> list:
+    return [
+        MaintenanceOut(
+            maintenance_id=r[0], vehicle_id=r[1], description=r[2],
+            maintenance_date=r[3].strftime('%Y-%m-%d'), cost=r[4],
+            performed_by=r[5], vehicle_info=r[6],
+        )
+        for r in rows
+    ]
+
+
+CASES = [
+    ("vehicles", VehicleOut, vehicle_rows, vehicle_models, VEHICLE_ROW),
+    ("rentals", RentalOut, rental_rows, rental_models, RENTAL_ROW),
+    ("maintenance", MaintenanceOut, maintenance_rows, maintenance_models, MAINTENANCE_ROW),
+]
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(n_rows: int, repeat: int) -> list:
+    results = []
+    for name, model, make_rows, make_models, serializer in CASES:
+        rows = make_rows(n_rows)
+        field = create_model_field(name=f"Response_{name}", type_=List[model], mode="serialization")
+
+        def models_path():
+            content = asyncio.run(serialize_response(field=field, response_content=make_models(rows)))
+            return JSONResponse(content).body
+
+        def fast_path():
+            return serializer.render(rows)
+
+        if json.loads(models_path()) != json.loads(fast_path()):
+            raise SystemExit(f"{name}: fast path output differs from response_model output")
+
+        before = _best_of(models_path, repeat)
+        after = _best_of(fast_path, repeat)
+        results.append({
+            "case": name,
+            "rows": n_rows,
+            "models_ms": round(before * 1000, 2),
+            "fast_ms": round(after * 1000, 2),
+            "speedup": round(before / after, 1),
+        })
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark list endpoint serialization")
+    parser.add_argument("--rows", type=int, default=10_000, help="Rows per list (default 10000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions; best is reported")
+    parser.add_argument("--json", dest="json_out", help="Also write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run(args.rows, args.repeat)
+    print(f"{'Case':<12} | {'Rows':>7} | {'Models (ms)':>11} | {'Fast (ms)':>9} | {'Speedup':>7}")
+    print("-" * 58)
+    for r in results:
+        print(f"{r['case']:<12} | {r['rows']:7d} | {r['models_ms']:11.2f} | {r['fast_ms']:9.2f} | {r['speedup']:6.1f}x")
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
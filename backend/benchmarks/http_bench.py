@@ -0,0 +1,406 @@
+"""
+End-to-end HTTP benchmark: the real app under uvicorn, driven over sockets.
+
+By default a throwaway MySQL is started (database.sandbox), loaded with the
+generated dataset (database.dataset) and `api.main:app` is booted against it
+with uvicorn. A thread-per-client load generator then runs a weighted mix of
+user flows at increasing concurrency:
+
+    dashboard        GET /api/analytics/summary + GET /api/analytics/revenue
+    rentals          GET /api/rentals/
+    customer_search  GET /api/customers/?search=<name>
+    booking          POST /api/rentals/            (books a vehicle the client owns)
+    return           POST /api/rentals/{id}/return (returns the client's oldest booking)
+
+Throughput and p50/p95/p99 latency are reported per endpoint and level and
+written as JSON to benchmarks/results/ so runs can be compared between
+commits (--compare).
+
+Usage (from backend directory):
+    python -m benchmarks.http_bench                           # mysqld on PATH
+    python -m benchmarks.http_bench --concurrency 1,8,32 --duration 20 --workers 4
+    python -m benchmarks.http_bench --external --scale 0.2    # use the DB_* server
+    python -m benchmarks.http_bench --url http://localhost:8000   # already running API
+    python -m benchmarks.http_bench --compare benchmarks/results/http-<old>.json
+
+Clients are threads, so the generator itself tops out at a few thousand
+requests per second; compare runs made on the same machine.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import secrets
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+RESULTS_DIR = Path(__file__).parent / "results"
+BACKEND_DIR = Path(__file__).parent.parent
+
+DEFAULT_MIX = {"dashboard": 2, "rentals": 2, "customer_search": 3, "booking": 1, "return": 1}
+SEARCH_TERMS = ["smith", "rossi", "muller", "garcia", "novak", "silva", "berg", "emma", "leon", "mia"]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Client:
+    """One simulated user: a keep-alive connection plus the bookings it owns."""
+
+    def __init__(self, url: str, token: str, vehicles: List[int], customers: List[int], compress: bool):
+        parsed = urllib.parse.urlsplit(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
+        if compress:
+            self.headers["Accept-Encoding"] = "gzip, br, zstd"
+        self.free_vehicles = list(vehicles)
+        self.bookings: List[Tuple[int, int, str]] = []  # (rental_id, vehicle_id, planned return)
+        self.customers = customers
+        self.rng = random.Random()
+        self.conn: Optional[http.client.HTTPConnection] = None
+
+    def request(self, method: str, path: str, body: Optional[dict] = None) -> Tuple[int, bytes]:
+        headers = dict(self.headers)
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body=payload, headers=headers)
+                response = self.conn.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, OSError):
+                # Server closed the keep-alive connection; retry once on a new one
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    raise
+        raise RuntimeError("unreachable")
+
+    # ── flows: each yields (endpoint label, method, path, body) steps ─────────
+
+    def flow(self, name: str):
+        if name == "dashboard":
+            return [
+                ("GET /api/analytics/summary", "GET", "/api/analytics/summary", None),
+                ("GET /api/analytics/revenue", "GET", "/api/analytics/revenue?period=month", None),
+            ]
+        if name == "rentals":
+            return [("GET /api/rentals/", "GET", "/api/rentals/", None)]
+        if name == "customer_search":
+            term = self.rng.choice(SEARCH_TERMS)
+            return [("GET /api/customers/?search", "GET", f"/api/customers/?search={term}", None)]
+        if name == "return" and self.bookings:
+            rental_id, _, planned_return = self.bookings[0]
+            body = {"actual_return_datetime": planned_return}
+            return [("POST /api/rentals/{id}/return", "POST", f"/api/rentals/{rental_id}/return", body)]
+        if name in ("booking", "return") and self.free_vehicles and self.customers:
+            pickup = datetime.now().replace(microsecond=0)
+            body = {
+                "customer_id": self.rng.choice(self.customers),
+                "vehicle_id": self.free_vehicles[0],
+                "pickup_datetime": pickup.isoformat(),
+                "return_datetime": (pickup + timedelta(days=self.rng.randint(1, 7))).isoformat(),
+            }
+            return [("POST /api/rentals/", "POST", "/api/rentals/", body)]
+        return self.flow("rentals")
+
+    def after(self, label: str, status: int, body: bytes, request_body: Optional[dict]) -> None:
+        """Track which vehicles this client has booked so returns stay valid."""
+        if label == "POST /api/rentals/" and status == 201:
+            vehicle_id = request_body["vehicle_id"]
+            self.free_vehicles.remove(vehicle_id)
+            self.bookings.append((json.loads(body)["rental_id"], vehicle_id, request_body["return_datetime"]))
+        elif label == "POST /api/rentals/{id}/return" and status == 200:
+            _, vehicle_id, _ = self.bookings.pop(0)
+            self.free_vehicles.append(vehicle_id)
+
+
+def run_level(
+    url: str,
+    token: str,
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    mix: Dict[str, int],
+    vehicles: List[int],
+    customers: List[int],
+    compress: bool,
+) -> dict:
+    """Drive `concurrency` clients for warmup + duration seconds."""
+    names, weights = zip(*mix.items())
+    samples: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    lock = threading.Lock()
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    def worker(index: int):
+        # Each client books only from its own slice of the fleet
+        client = Client(url, token, vehicles[index::concurrency], customers, compress)
+        local_samples, local_errors = defaultdict(list), defaultdict(int)
+        while time.perf_counter() < stop_at:
+            for label, method, path, body in client.flow(client.rng.choices(names, weights)[0]):
+                began = time.perf_counter()
+                try:
+                    status, payload = client.request(method, path, body)
+                except Exception:
+                    status, payload = 599, b""
+                elapsed = time.perf_counter() - began
+                client.after(label, status, payload, body)
+                if began >= measure_from and began < stop_at:
+                    local_samples[label].append(elapsed)
+                    if status >= 400:
+                        local_errors[label] += 1
+        with lock:
+            for label, values in local_samples.items():
+                samples[label].extend(values)
+            for label, count in local_errors.items():
+                errors[label] += count
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    endpoints = {}
+    total = 0
+    for label, values in sorted(samples.items()):
+        values.sort()
+        total += len(values)
+        endpoints[label] = {
+            "requests": len(values),
+            "errors": errors.get(label, 0),
+            "throughput_rps": round(len(values) / duration, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 2),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2),
+        }
+    return {
+        "concurrency": concurrency,
+        "duration_s": duration,
+        "requests": total,
+        "errors": sum(errors.values()),
+        "throughput_rps": round(total / duration, 2),
+        "endpoints": endpoints,
+    }
+
+
+# ── Setup ─────────────────────────────────────────────────────────────────────
+
+def login(url: str, username: str, password: str) -> str:
+    parsed = urllib.parse.urlsplit(url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+    body = urllib.parse.urlencode({"username": username, "password": password})
+    conn.request("POST", "/api/auth/login", body=body,
+                 headers={"Content-Type": "application/x-www-form-urlencoded"})
+    response = conn.getresponse()
+    payload = response.read()
+    conn.close()
+    if response.status != 200:
+        raise SystemExit(f"Login failed ({response.status}): {payload[:200]!r}")
+    return json.loads(payload)["access_token"]
+
+
+def discover_ids(url: str, token: str) -> Tuple[List[int], List[int]]:
+    """Available vehicles to book and customers to book them for."""
+    client = Client(url, token, [], [], compress=False)
+    status, body = client.request("GET", "/api/vehicles/?status=Available")
+    vehicles = [v["vehicle_id"] for v in json.loads(body)] if status == 200 else []
+    customers = []
+    for term in SEARCH_TERMS[:4]:
+        status, body = client.request("GET", f"/api/customers/?search={term}")
+        if status == 200:
+            customers.extend(c["customer_id"] for c in json.loads(body)[:250])
+    return vehicles, customers
+
+
+def boot_server(env: Dict[str, str], port: int, workers: int) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "uvicorn", "api.main:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--no-access-log", "--log-level", "warning",
+    ]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env={**os.environ, **env})
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("uvicorn exited during startup")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return process
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise SystemExit("uvicorn did not become ready within 60s")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ── Reporting ─────────────────────────────────────────────────────────────────
+
+def print_level(level: dict) -> None:
+    print(f"\nconcurrency {level['concurrency']}: {level['throughput_rps']} req/s, "
+          f"{level['requests']} requests, {level['errors']} errors")
+    print(f"  {'endpoint':<34} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for label, e in level["endpoints"].items():
+        print(f"  {label:<34} {e['throughput_rps']:>8} {e['p50_ms']:>9} {e['p95_ms']:>9} "
+              f"{e['p99_ms']:>9} {e['errors']:>7}")
+
+
+def compare(current: dict, baseline: dict) -> None:
+    """Print throughput and p95 changes against an earlier result file."""
+    old_levels = {lvl["concurrency"]: lvl for lvl in baseline["levels"]}
+    print(f"\nCompared with {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}):")
+    for level in current["levels"]:
+        old = old_levels.get(level["concurrency"])
+        if old is None:
+            continue
+        print(f"  concurrency {level['concurrency']}")
+        for label, e in level["endpoints"].items():
+            o = old["endpoints"].get(label)
+            if not o:
+                continue
+            rps = (e["throughput_rps"] / o["throughput_rps"] - 1) * 100 if o["throughput_rps"] else 0.0
+            p95 = (e["p95_ms"] / o["p95_ms"] - 1) * 100 if o["p95_ms"] else 0.0
+            print(f"    {label:<34} req/s {rps:+6.1f}%   p95 {p95:+6.1f}%")
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown flow {name!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end HTTP benchmark of the API")
+    parser.add_argument("--url", help="Benchmark an already running API instead of booting one")
+    parser.add_argument("--external", action="store_true",
+                        help="Load the dataset into the DB_* server instead of starting mysqld")
+    parser.add_argument("--mysqld", help="mysqld binary (defaults to $MYSQLD or PATH)")
+    parser.add_argument("--scale", type=float, default=0.1, help="Dataset scale (1.0 = 100k rentals)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", default="1,4,16,32", help="Comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=15.0, help="Measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds before each level")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="Flow weights, e.g. dashboard=2,rentals=1,customer_search=3,booking=1,return=1")
+    parser.add_argument("--no-compression", action="store_true", help="Do not send Accept-Encoding")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--output", help="Result file (defaults to benchmarks/results/http-<time>-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    args = parser.parse_args(argv)
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+    sandbox = server = None
+    url = args.url
+    try:
+        if url is None:
+            from database import dataset
+            from database.sandbox import LocalMySQL
+
+            external = None
+            if args.external:
+                external = {
+                    "host": os.getenv("DB_HOST", "localhost"),
+                    "port": int(os.getenv("DB_PORT", "3306")),
+                    "user": os.getenv("DB_USER", "root"),
+                    "password": os.getenv("DB_PASSWORD", ""),
+                }
+            sandbox = LocalMySQL(mysqld=args.mysqld, database="car_rental_bench", external=external).start()
+            sandbox.load_schema()
+            conn = sandbox.connect()
+            try:
+                counts = dataset.generate(conn, scale=args.scale)
+            finally:
+                conn.close()
+            sandbox.analyze()
+            print("Dataset: " + ", ".join(f"{t}={n}" for t, n in counts.items()))
+
+            port = sandbox.port + 1 if sandbox.port else 8765
+            env = {**sandbox.environ(), "SECRET_KEY": os.getenv("SECRET_KEY") or secrets.token_hex(32)}
+            server = boot_server(env, port, args.workers)
+            url = f"http://127.0.0.1:{port}"
+
+        token = login(url, args.username, args.password)
+        vehicles, customers = discover_ids(url, token)
+        print(f"Benchmarking {url}: {len(vehicles)} bookable vehicles, mix {args.mix}")
+
+        results = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "url": args.url,
+                "scale": None if args.url else args.scale,
+                "workers": None if args.url else args.workers,
+                "mix": args.mix,
+                "compression": not args.no_compression,
+                "warmup_s": args.warmup,
+            },
+            "levels": [],
+        }
+        for concurrency in levels:
+            level = run_level(url, token, concurrency, args.duration, args.warmup, args.mix,
+                              vehicles, customers, compress=not args.no_compression)
+            results["levels"].append(level)
+            print_level(level)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if sandbox is not None:
+            sandbox.stop()
+
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f"http-{datetime.now():%Y%m%d-%H%M%S}-{results['meta']['commit'] or 'nogit'}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(results, json.loads(Path(args.compare).read_text()))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
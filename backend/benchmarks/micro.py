@@ -0,0 +1,317 @@
+"""
+Micro-benchmarks for pure-Python hot paths.
+
+Each case times one function over synthetic inputs of increasing size with
+timeit (best of several repeats) and records peak allocation for a single
+call with tracemalloc. Times are recorded as ratios to a fixed
+interpreter-bound calibration loop timed in the same run, so a baseline
+tracks the code rather than the machine's speed or load at the time.
+Results are compared against the stored baseline in
+benchmarks/baselines/micro.json:
+
+  * a case fails when its time ratio or peak memory exceeds the baseline by
+    more than --threshold (default 30%), and
+  * a sized case fails when its per-item time grows more than
+    --scaling-limit times from the smallest to the largest input, which is
+    how accidental O(n^2) behaviour shows up before any baseline exists.
+
+Usage (from backend directory):
+    python -m benchmarks.micro                      # compare against baseline
+    python -m benchmarks.micro --only split_sql     # subset by name prefix
+    python -m benchmarks.micro --save-baseline      # record a new baseline
+
+The baseline file is local to a checkout (it is not committed): record it
+on the machine that runs the comparison, e.g. from the main branch before
+benchmarking a change.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import timeit
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Importing the routes pulls in settings, which refuses to load without a key
+os.environ.setdefault("SECRET_KEY", "benchmark-only-secret-key-000000000000")
+
+from api.routes.auth import get_password_hash, verify_password
+from api.routes.rentals import RENTAL_ROW, parse_api_datetime, rental_from_row
+from api.services.pricing import Promo, PromoIndex, final_rental_cost, quote
+from benchmarks.bench_serialization import rental_rows
+from database.setup import read_sql_file, split_sql_statements
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "micro.json"
+SQL_DIR = Path(__file__).parent.parent / "sql"
+
+
+@dataclass
+class Case:
+    """
+    A benchmark: `setup(size)` builds the input and returns the callable to
+    time. Sized cases are checked for super-linear per-item growth.
+    """
+    name: str
+    setup: Callable[[int], Callable[[], object]]
+    sizes: Sequence[int] = (1,)
+    sized: bool = True
+
+
+# ── Inputs ────────────────────────────────────────────────────────────────────
+
+def sql_script(statements: int) -> str:
+    """A script shaped like schema.sql: tables, indexes and trigger blocks."""
+    parts = []
+    for i in range(statements):
+        kind = i % 10
+        if kind == 9:
+            parts.append(
+                "DELIMITER $$\n"
+                f"CREATE TRIGGER trg_{i} BEFORE INSERT ON T{i}\nFOR EACH ROW\nBEGIN\n"
+                "    IF NEW.a > NEW.b THEN\n        SET NEW.c = NEW.a - NEW.b;\n    END IF;\n"
+                "END$$\nDELIMITER ;"
+            )
+        elif kind in (7, 8):
+            parts.append(f"-- index {i}\nCREATE INDEX idx_{i} ON T{i}(col_{i});")
+        else:
+            parts.append(
+                f"CREATE TABLE IF NOT EXISTS T{i} (\n    id INT AUTO_INCREMENT PRIMARY KEY,\n"
+                f"    name VARCHAR(100) NOT NULL,\n    amount DECIMAL(10,2),\n    created DATE\n);"
+            )
+    return "\n\n".join(parts)
+
+
+def cost_inputs(n: int) -> List[tuple]:
+    rng = random.Random(3)
+    start = datetime(2025, 1, 1, 9, 0)
+    rows = []
+    for _ in range(n):
+        pickup = start + timedelta(days=rng.randint(0, 365), hours=rng.randint(0, 12))
+        planned = pickup + timedelta(days=rng.randint(1, 14))
+        actual = planned + timedelta(hours=rng.choice([0, 2, 26]))
+        rows.append((pickup.isoformat() + "Z", planned.isoformat() + "Z", actual.isoformat(),
+                     Decimal(rng.choice(["450.00", "900.00", "2500.00"]))))
+    return rows
+
+
+# ── Cases ─────────────────────────────────────────────────────────────────────
+
+def _split_synthetic(size):
+    script = sql_script(size)
+    return lambda: split_sql_statements(script)
+
+
+def _split_schema(_):
+    script = read_sql_file(SQL_DIR / "schema.sql")
+    return lambda: split_sql_statements(script)
+
+
+def _rental_models(size):
+    rows = rental_rows(size)
+    return lambda: [rental_from_row(r) for r in rows]
+
+
+def _rental_fast(size):
+    rows = rental_rows(size)
+    return lambda: [RENTAL_ROW.to_dict(r) for r in rows]
+
+
+def _verify_legacy(size):
+    import hashlib
+    password = "p" * size
+    hashed = hashlib.sha256(password.encode()).hexdigest()
+    return lambda: verify_password(password, hashed)
+
+
+def _verify_bcrypt(size):
+    password = "p" * size
+    hashed = get_password_hash(password)
+    return lambda: verify_password(password, hashed)
+
+
+def promo_index(n: int = 40) -> PromoIndex:
+    """An index shaped like the PromoOffer table: overlapping windows, a few restricted."""
+    rng = random.Random(5)
+    index = PromoIndex()
+    promos = []
+    for i in range(n):
+        start = datetime(2025, 1, 1).date() + timedelta(days=rng.randint(-30, 365))
+        promos.append(Promo(
+            i, f"Promo {i}", rng.choice([5, 10, 12, 15, 20]), start, start + timedelta(days=rng.randint(3, 120)),
+            rng.choice([None, None, 4, 7]), rng.choice([None, None, "Sports"]), rng.random() > 0.2,
+        ))
+    index.load(promos)
+    return index
+
+
+def _quote(size):
+    inputs = cost_inputs(size)
+    index = promo_index()
+
+    def run():
+        return [
+            quote(index, rate, "Sports", parse_api_datetime(p), parse_api_datetime(r))
+            for p, r, _, rate in inputs
+        ]
+    return run
+
+
+def _final_cost(size):
+    inputs = [(parse_api_datetime(p).date(), a, rate) for p, _, a, rate in cost_inputs(size)]
+
+    def run():
+        return [final_rental_cost(d, parse_api_datetime(a), rate, 50.0, 10) for d, a, rate in inputs]
+    return run
+
+
+CASES: List[Case] = [
+    Case("split_sql.synthetic", _split_synthetic, sizes=(100, 1000, 10000)),
+    Case("split_sql.schema", _split_schema, sized=False),
+    Case("rental_rows.models", _rental_models, sizes=(100, 1000, 10000)),
+    Case("rental_rows.fast", _rental_fast, sizes=(100, 1000, 10000)),
+    # Password length, not input count: per-call time should not depend on it
+    Case("verify_password.legacy_sha256", _verify_legacy, sizes=(8, 32, 72), sized=False),
+    Case("verify_password.bcrypt", _verify_bcrypt, sizes=(8, 72), sized=False),
+    Case("rental_cost.quote", _quote, sizes=(100, 1000, 10000)),
+    Case("rental_cost.final", _final_cost, sizes=(100, 1000, 10000)),
+]
+
+
+# ── Harness ───────────────────────────────────────────────────────────────────
+
+def measure(fn: Callable[[], object], repeat: int, min_time: float) -> Dict[str, float]:
+    """Best per-call seconds over `repeat` rounds, plus one call's peak allocation."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    # autorange aims for 0.2s per round; scale to the requested round length
+    number = max(1, int(number * min_time / 0.2))
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "peak_bytes": peak, "number": number}
+
+
+def _calibration_loop() -> int:
+    """Fixed dict, string and integer work: the yardstick case times are divided by."""
+    counts: Dict[str, int] = {}
+    total = 0
+    for i in range(2000):
+        key = f"k{i % 97}"
+        counts[key] = counts.get(key, 0) + i
+        total += len(key)
+    return total
+
+
+def calibrate(repeat: int, min_time: float) -> float:
+    """Best per-call seconds of the calibration loop."""
+    return measure(_calibration_loop, repeat, min_time)["seconds"]
+
+
+def run_cases(cases: Sequence[Case], repeat: int, min_time: float) -> Dict[str, dict]:
+    # Calibrate on both sides of the run and keep the faster, so a burst of
+    # load during one calibration does not skew every ratio
+    before = calibrate(repeat, min_time)
+    results = {}
+    for case in cases:
+        for size in case.sizes:
+            key = f"{case.name}[{size}]"
+            results[key] = {"case": case.name, "size": size, **measure(case.setup(size), repeat, min_time)}
+    calibration = min(before, calibrate(repeat, min_time))
+    print(f"  {'calibration':<42} {calibration * 1e6:>12.2f} us")
+    for key, r in results.items():
+        r["ratio"] = r["seconds"] / calibration
+        print(f"  {key:<42} {r['seconds'] * 1e6:>12.2f} us  x{r['ratio']:>10.2f}   "
+              f"peak {r['peak_bytes'] / 1024:>9.1f} KiB")
+    return results
+
+
+def scaling_failures(cases: Sequence[Case], results: Dict[str, dict], limit: float) -> List[str]:
+    failures = []
+    for case in cases:
+        if not case.sized or len(case.sizes) < 2:
+            continue
+        small, large = min(case.sizes), max(case.sizes)
+        per_item_small = results[f"{case.name}[{small}]"]["seconds"] / small
+        per_item_large = results[f"{case.name}[{large}]"]["seconds"] / large
+        growth = per_item_large / per_item_small
+        if growth > limit:
+            failures.append(
+                f"{case.name}: per-item time grew {growth:.1f}x from n={small} to n={large} (limit {limit}x)"
+            )
+    return failures
+
+
+def baseline_failures(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    failures = []
+    for key, current in results.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        for metric, label in (("ratio", "time"), ("peak_bytes", "peak memory")):
+            if old.get(metric) and current[metric] > old[metric] * (1 + threshold):
+                change = (current[metric] / old[metric] - 1) * 100
+                failures.append(f"{key}: {label} +{change:.0f}% over baseline (threshold {threshold:.0%})")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for pure-Python hot paths")
+    parser.add_argument("--only", help="Run cases whose name starts with this prefix")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing rounds per case (best is kept)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Approximate seconds per round")
+    parser.add_argument("--threshold", type=float, default=0.30,
+                        help="Allowed growth of time ratio or peak memory vs. baseline")
+    parser.add_argument("--scaling-limit", type=float, default=3.0,
+                        help="Allowed per-item time growth from the smallest to the largest size")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="Baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write results as the new baseline")
+    args = parser.parse_args(argv)
+
+    cases = [c for c in CASES if not args.only or c.name.startswith(args.only)]
+    print(f"Running {len(cases)} cases (best of {args.repeat})")
+    results = run_cases(cases, args.repeat, args.min_time)
+
+    failures = scaling_failures(cases, results, args.scaling_limit)
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        stored = json.loads(baseline_path.read_text())["results"] if baseline_path.exists() else {}
+        # Entries from before times were stored as ratios cannot be compared
+        stored = {key: value for key, value in stored.items() if "ratio" in value}
+        stored.update(results)
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": stored,
+        }, indent=2, sort_keys=True))
+        print(f"Baseline written to {baseline_path}")
+    elif baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text())
+        if baseline.get("python") != platform.python_version():
+            print(f"note: baseline recorded on Python {baseline.get('python')}")
+        if any("ratio" not in value for value in baseline["results"].values()):
+            print("note: baseline has absolute times only; re-record it with --save-baseline to compare times")
+        failures += baseline_failures(results, baseline["results"], args.threshold)
+    else:
+        print(f"No baseline at {baseline_path}; run with --save-baseline to create one")
+
+    if failures:
+        print("\nRegressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
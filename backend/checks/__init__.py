@@ -0,0 +1,6 @@
+"""
+Checks
+
+Contract checks that need a real MySQL server rather than mocks. Run modules
+from the backend directory, e.g. `python -m checks.query_plans`.
+"""
@@ -0,0 +1,108 @@
+"""
+Migration data check.
+
+Starts a throwaway MySQL (database.sandbox), loads the schema and the demo
+data from insert_data.sql, applies the migrations on top (as the API does on
+a seeded database) and compares what the data backfills produced with what
+they are meant to produce for that data.
+
+Usage (from backend directory):
+    python -m checks.migrations                       # mysqld on PATH
+    python -m checks.migrations --external            # use the DB_* server
+    python -m cli.manage check-migrations
+
+Exit status: 0 when every backfill matches, 1 on mismatches, 2 if the
+sandbox could not be prepared.
+"""
+
+import argparse
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from database.sandbox import LocalMySQL
+
+# Migration 0006 on the insert_data.sql promos: name -> (min_days,
+# vehicle_type, auto_apply). Only the member, first-rental and branch promos
+# are left for manual application.
+EXPECTED_PROMOS: Dict[str, Tuple[Optional[int], Optional[str], bool]] = {
+    "Diamond Member Exclusive": (7, None, False),
+    "Monaco Grand Prix Weekend": (4, None, False),
+    "Summer Collection 2026": (5, None, True),
+    "New Client Welcome": (None, None, False),
+    "Extended Tour": (14, None, True),
+}
+
+
+def check_promo_backfill(connection) -> List[str]:
+    """Differences between the backfilled PromoOffer columns and EXPECTED_PROMOS."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT name, min_days, vehicle_type, auto_apply FROM PromoOffer")
+        found = {name: (min_days, vehicle_type, bool(auto)) for name, min_days, vehicle_type, auto in cursor.fetchall()}
+    finally:
+        cursor.close()
+    problems = []
+    for name in sorted(EXPECTED_PROMOS.keys() | found.keys()):
+        expected, actual = EXPECTED_PROMOS.get(name), found.get(name)
+        if expected != actual:
+            problems.append(f"PromoOffer {name!r}: expected (min_days, vehicle_type, auto_apply) = "
+                            f"{expected}, got {actual}")
+    return problems
+
+
+CHECKS = (
+    ("0006_promo_pricing", check_promo_backfill),
+)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Check the migrations' data backfills against the demo data")
+    parser.add_argument("--mysqld", help="mysqld binary (defaults to $MYSQLD or PATH)")
+    parser.add_argument("--external", action="store_true",
+                        help="Use the server from DB_HOST/DB_PORT/DB_USER/DB_PASSWORD instead of starting mysqld")
+    parser.add_argument("--database", default="car_rental_migration_check", help="Scratch schema to create")
+    parser.add_argument("--keep", action="store_true", help="Keep the sandbox data directory")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+
+    external = None
+    if args.external:
+        external = {
+            "host": os.getenv("DB_HOST", "localhost"),
+            "port": int(os.getenv("DB_PORT", "3306")),
+            "user": os.getenv("DB_USER", "root"),
+            "password": os.getenv("DB_PASSWORD", ""),
+        }
+    sandbox = LocalMySQL(mysqld=args.mysqld, database=args.database, external=external, keep=args.keep)
+
+    try:
+        sandbox.start()
+        sandbox.load_schema(scripts=("schema.sql", "auth.sql", "views.sql", "insert_data.sql"))
+    except Exception as e:
+        sandbox.stop()
+        print(f"Could not prepare sandbox: {e}", file=sys.stderr)
+        return 2
+
+    failed = 0
+    try:
+        conn = sandbox.connect()
+        try:
+            for migration, check in CHECKS:
+                problems = check(conn)
+                print(f"{migration}: {'ok' if not problems else f'{len(problems)} mismatches'}")
+                for problem in problems:
+                    print(f"  {problem}")
+                failed += bool(problems)
+        finally:
+            conn.close()
+    finally:
+        sandbox.stop()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
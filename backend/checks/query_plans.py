@@ -0,0 +1,500 @@
+"""
+Query-plan regression check.
+
+Starts a throwaway MySQL (database.sandbox), loads the schema and a generated
+dataset (database.dataset), then drives every API route in-process while
+recording each SQL statement the route executes. Every SELECT/UPDATE/DELETE
+is EXPLAINed and the check fails when a plan
+
+  * reads a large table with a full scan (access_type ALL), or
+  * sorts a large intermediate result with filesort,
+
+unless the route case below declares that table as an accepted scan/sort.
+Declaring an allowance is a deliberate decision visible in review; a new
+scan or sort anywhere else is a regression.
+
+Usage (from backend directory):
+    python -m checks.query_plans                      # mysqld on PATH
+    python -m checks.query_plans --mysqld /usr/sbin/mysqld --scale 0.5
+    python -m checks.query_plans --external           # use the DB_* server
+    python -m cli.manage check-plans --json plan-report.json
+
+Exit status: 0 when all plans conform, 1 on violations, 2 if the sandbox
+could not be prepared.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Importing the app pulls in settings, which refuses to load without a key
+os.environ.setdefault("SECRET_KEY", "plan-check-only-secret-key-00000000000000")
+
+from database import dataset
+from database.instrumentation import add_statement_listener, normalize_sql, remove_statement_listener
+from database.sandbox import LocalMySQL
+
+# Tables with at least this many rows count as "large"
+DEFAULT_LARGE_ROWS = 1000
+
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+
+@dataclass
+class RouteCase:
+    """
+    One request to issue and the plan shapes it is allowed to produce.
+
+    `path` and `body` values are formatted with the fixture ids resolved from
+    the dataset (e.g. "{customer_id}"). `full_scans` / `filesorts` list base
+    tables a statement of this request may scan or sort in full.
+    """
+    method: str
+    path: str
+    body: Optional[dict] = None
+    full_scans: Tuple[str, ...] = ()
+    filesorts: Tuple[str, ...] = ()
+    writes: bool = False
+    reason: str = ""
+
+
+# Whole-table reports and unanchored LIKE searches are expected to scan; every
+# other request must be answered through an index.
+ROUTE_CASES: List[RouteCase] = [
+    # vehicles
+    RouteCase("GET", "/api/vehicles/", full_scans=("Vehicle",), reason="lists the whole fleet"),
+    RouteCase("GET", "/api/vehicles/?status=Maintenance"),
+    RouteCase("GET", "/api/vehicles/?search=porsche", full_scans=("Vehicle",), reason="substring search"),
+    RouteCase("GET", "/api/vehicles/{vehicle_code}"),
+    RouteCase("POST", "/api/vehicles/", writes=True, body={
+        "vehicle_code": "VPLAN1", "brand": "Porsche", "model": "911", "type": "Supercar",
+        "fuel_type": "Petrol", "transmission": "Automatic", "status": "Available",
+        "daily_rate": 1200, "seating_capacity": 2,
+    }),
+    RouteCase("PUT", "/api/vehicles/{vehicle_code}", writes=True, body={"status": "Available"}),
+    # customers
+    RouteCase("GET", "/api/customers/", full_scans=("Customer",), reason="lists every customer"),
+    RouteCase("GET", "/api/customers/?search=rossi", full_scans=("Customer",), reason="substring search"),
+    RouteCase("GET", "/api/customers/{customer_id}"),
+    RouteCase("POST", "/api/customers/", writes=True, body={
+        "first_name": "Plan", "last_name": "Check", "email": "plan.check@example.com",
+        "phone": "+377 600000000", "license_number": "PLANCHECK1", "date_of_birth": "1990-01-01",
+        "country_of_residence": "Monaco",
+    }),
+    RouteCase("PUT", "/api/customers/{customer_id}", writes=True, body={"phone": "+377 611111111"}),
+    # rentals
+    RouteCase("GET", "/api/rentals/", full_scans=("Rental",), filesorts=("Rental",),
+              reason="unbounded list of every rental"),
+    RouteCase("GET", "/api/rentals/?status=ongoing", full_scans=("Rental",), filesorts=("Rental",),
+              reason="actual_return_datetime IS NULL is not indexed"),
+    RouteCase("GET", "/api/rentals/?customer_id={customer_id}"),
+    RouteCase("GET", "/api/rentals/?vehicle_code={vehicle_id}"),
+    RouteCase("GET", "/api/rentals/{rental_id}"),
+    RouteCase("POST", "/api/rentals/", writes=True, body={
+        "customer_id": "{customer_id}", "vehicle_id": "{available_vehicle_id}",
+        "pickup_datetime": "{pickup}", "return_datetime": "{dropoff}",
+    }),
+    RouteCase("POST", "/api/rentals/{active_rental_id}/return", writes=True,
+              body={"actual_return_datetime": "{dropoff}", "additional_charges": 0}),
+    # maintenance
+    RouteCase("GET", "/api/maintenance/"),
+    RouteCase("GET", "/api/maintenance/?vehicle_id={vehicle_id}"),
+    RouteCase("GET", "/api/maintenance/?start_date={month_ago}&end_date={today}"),
+    RouteCase("GET", "/api/maintenance/stats", full_scans=("Vehicle",),
+              filesorts=("Vehicle",), reason="per-vehicle cost report over the fleet"),
+    RouteCase("GET", "/api/maintenance/stats?year={year}", full_scans=("Vehicle",),
+              filesorts=("Vehicle",), reason="per-vehicle cost report over the fleet"),
+    RouteCase("GET", "/api/maintenance/stats?vehicle_id={vehicle_id}"),
+    RouteCase("GET", "/api/maintenance/stats/breakdown?period=year", full_scans=("MaintenanceCostMonthly",),
+              reason="fleet cost per year from the monthly rollup"),
+    RouteCase("GET", "/api/maintenance/stats/breakdown?period=month&year={year}"),
+    RouteCase("GET", "/api/maintenance/stats/breakdown?vehicle_id={vehicle_id}"),
+    RouteCase("GET", "/api/maintenance/forecast", full_scans=("Vehicle", "VehicleMaintenance", "Rental"),
+              reason="fleet-wide forecast pass, cached per worker"),
+    RouteCase("GET", "/api/maintenance/{maintenance_id}"),
+    RouteCase("GET", "/api/maintenance/vehicle/{vehicle_id}/history"),
+    RouteCase("POST", "/api/maintenance/", writes=True, body={
+        "vehicle_id": "{vehicle_id}", "description": "Plan check", "maintenance_date": "{today}",
+        "cost": 100, "performed_by": "Plan Check",
+    }),
+    RouteCase("PUT", "/api/maintenance/{maintenance_id}", writes=True, body={"cost": 120}),
+    # loyalty
+    RouteCase("GET", "/api/loyalty/{member_id}"),
+    RouteCase("PUT", "/api/loyalty/{member_id}/points?points_change=10", writes=True),
+    RouteCase("POST", "/api/loyalty/accrual", writes=True),
+    RouteCase("POST", "/api/loyalty/tiers/recompute"),
+    RouteCase("GET", "/api/loyalty/leaderboard?limit=20"),
+    RouteCase("GET", "/api/loyalty/leaderboard?tier=Gold&limit=20"),
+    RouteCase("GET", "/api/loyalty/distribution"),
+    # reviews
+    RouteCase("GET", "/api/reviews/rental/{reviewed_rental_id}"),
+    RouteCase("GET", "/api/reviews/vehicle/{vehicle_id}"),
+    RouteCase("GET", "/api/reviews/vehicle/{vehicle_id}/summary"),
+    RouteCase("GET", "/api/reviews/customer/{customer_id}"),
+    RouteCase("GET", "/api/reviews/vehicle/{vehicle_id}?cursor={review_cursor}"),
+    RouteCase("GET", "/api/reviews/customer/{customer_id}?cursor={review_cursor}"),
+    # pricing
+    RouteCase("POST", "/api/pricing/quote", body={
+        "vehicle_id": "{available_vehicle_id}", "pickup_datetime": "{pickup}", "return_datetime": "{dropoff}",
+    }),
+    RouteCase("POST", "/api/pricing/quotes", body={
+        "pickup_datetime": "{pickup}", "return_datetime": "{dropoff}", "status": "Available",
+    }, filesorts=("Vehicle",), reason="candidates ordered by daily rate"),
+    RouteCase("GET", "/api/pricing/promos?active_on={today}"),
+    # payments
+    RouteCase("POST", "/api/payments/reconciliation?days=30", writes=True),
+    RouteCase("GET", "/api/payments/reconciliation", full_scans=("PaymentException",),
+              reason="totals per exception kind"),
+    RouteCase("GET", "/api/payments/reconciliation/exceptions?kind=underpaid&limit=50"),
+    # analytics
+    RouteCase("GET", "/api/analytics/summary", full_scans=("Vehicle", "Rental"),
+              reason="fleet and rental aggregates"),
+    RouteCase("GET", "/api/analytics/dashboard", full_scans=("Vehicle", "VehicleMaintenance"),
+              filesorts=("Vehicle",), reason="fleet-wide aggregates"),
+    RouteCase("GET", "/api/analytics/revenue?period=month"),
+    RouteCase("GET", "/api/analytics/revenue?period=week"),
+    RouteCase("GET", "/api/analytics/fleet-status", full_scans=("Vehicle",), reason="fleet-wide aggregates"),
+]
+
+# Ids the cases are formatted with, looked up once the dataset is loaded
+FIXTURE_QUERIES = {
+    "vehicle_id": "SELECT vehicle_id FROM Rental GROUP BY vehicle_id ORDER BY COUNT(*) DESC LIMIT 1",
+    "customer_id": "SELECT customer_id FROM Rental GROUP BY customer_id ORDER BY COUNT(*) DESC LIMIT 1",
+    "rental_id": "SELECT MAX(rental_id) FROM Rental",
+    "active_rental_id": "SELECT MIN(rental_id) FROM Rental WHERE status = 'Active' AND actual_return_datetime IS NULL",
+    "available_vehicle_id": "SELECT MIN(vehicle_id) FROM Vehicle WHERE status = 'Available'",
+    "maintenance_id": "SELECT MAX(maintenance_id) FROM VehicleMaintenance",
+    "member_id": "SELECT MIN(customer_id) FROM LoyaltyProgram",
+    "reviewed_rental_id": "SELECT MIN(rental_id) FROM ReviewRatings",
+    # A keyset cursor part-way through the feeds
+    "review_cursor": "SELECT CONCAT(MAX(review_date) - INTERVAL 90 DAY, '.', MAX(review_id)) FROM ReviewRatings",
+}
+
+
+# ── Plan analysis ─────────────────────────────────────────────────────────────
+
+@dataclass
+class Finding:
+    kind: str                 # "full_scan" or "filesort"
+    tables: Tuple[str, ...]
+    rows: int
+    allowed: bool
+    sql: str
+
+
+_TABLE_REF = re.compile(r"\b(?:FROM|JOIN|UPDATE)\s+`?(\w+)`?(?:\s+(?:AS\s+)?`?(\w+)`?)?", re.IGNORECASE)
+_NOT_ALIAS = {
+    "WHERE", "ON", "JOIN", "LEFT", "RIGHT", "INNER", "OUTER", "CROSS", "GROUP", "ORDER", "LIMIT",
+    "SET", "USING", "HAVING", "UNION", "AND", "OR",
+}
+
+
+def table_aliases(sql: str) -> Dict[str, str]:
+    """Map the aliases used in `sql` (and bare names) to base table names."""
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        aliases[table] = table
+        if alias and alias.upper() not in _NOT_ALIAS:
+            aliases[alias] = table
+    return aliases
+
+
+def _rows(node: dict) -> int:
+    return int(node.get("rows_produced_per_join") or node.get("rows_examined_per_scan") or 0)
+
+
+def _tables_under(node) -> List[dict]:
+    found = []
+    if isinstance(node, dict):
+        if "table_name" in node and "access_type" in node:
+            found.append(node)
+        for value in node.values():
+            found.extend(_tables_under(value))
+    elif isinstance(node, list):
+        for value in node:
+            found.extend(_tables_under(value))
+    return found
+
+
+def _sorts_under(node) -> List[dict]:
+    found = []
+    if isinstance(node, dict):
+        if node.get("using_filesort"):
+            found.append(node)
+        for value in node.values():
+            found.extend(_sorts_under(value))
+    elif isinstance(node, list):
+        for value in node:
+            found.extend(_sorts_under(value))
+    return found
+
+
+def analyze_plan(
+    plan: dict,
+    sql: str,
+    table_rows: Dict[str, int],
+    large_rows: int,
+    case: RouteCase,
+) -> List[Finding]:
+    """Full scans and filesorts of large inputs in one EXPLAIN FORMAT=JSON plan."""
+    aliases = table_aliases(sql)
+    normalized = normalize_sql(sql)
+    findings = []
+
+    for node in _tables_under(plan):
+        if node.get("access_type") != "ALL" or node.get("insert"):
+            continue
+        table = aliases.get(node["table_name"], node["table_name"])
+        if table.startswith("<"):
+            continue  # derived/temporary tables are judged by their own blocks
+        rows = table_rows.get(table, int(node.get("rows_examined_per_scan") or 0))
+        if rows >= large_rows:
+            findings.append(Finding("full_scan", (table,), rows, table in case.full_scans, normalized))
+
+    for node in _sorts_under(plan):
+        sorted_tables = _tables_under(node)
+        rows = max((_rows(t) for t in sorted_tables), default=0)
+        if rows < large_rows:
+            continue
+        tables = tuple(dict.fromkeys(aliases.get(t["table_name"], t["table_name"]) for t in sorted_tables))
+        allowed = any(t in case.filesorts for t in tables)
+        findings.append(Finding("filesort", tables, rows, allowed, normalized))
+
+    return findings
+
+
+def explain(connection, sql: str, params) -> dict:
+    cursor = connection.cursor()
+    try:
+        cursor.execute("EXPLAIN FORMAT=JSON " + sql, params or None)
+        row = cursor.fetchone()
+        cursor.fetchall()
+    finally:
+        cursor.close()
+    return json.loads(row[0])
+
+
+# ── Driver ────────────────────────────────────────────────────────────────────
+
+def _format(value, fixtures: Dict[str, object]):
+    if isinstance(value, str):
+        # Whole-value placeholders keep the fixture's type (ids stay ints)
+        if re.fullmatch(r"\{\w+\}", value):
+            return fixtures[value[1:-1]]
+        return value.format(**fixtures)
+    if isinstance(value, dict):
+        return {k: _format(v, fixtures) for k, v in value.items()}
+    return value
+
+
+def resolve_fixtures(connection) -> Dict[str, object]:
+    fixtures: Dict[str, object] = {}
+    cursor = connection.cursor()
+    for name, query in FIXTURE_QUERIES.items():
+        cursor.execute(query)
+        row = cursor.fetchone()
+        cursor.fetchall()
+        fixtures[name] = row[0] if row else None
+    cursor.execute("SELECT vehicle_code FROM Vehicle WHERE vehicle_id = %s", (fixtures["vehicle_id"],))
+    fixtures["vehicle_code"] = cursor.fetchone()[0]
+    cursor.close()
+
+    now = datetime.now().replace(microsecond=0)
+    fixtures["today"] = now.date().isoformat()
+    fixtures["month_ago"] = (now.date() - timedelta(days=30)).isoformat()
+    fixtures["year"] = now.year
+    fixtures["pickup"] = (now + timedelta(days=30)).isoformat()
+    fixtures["dropoff"] = (now + timedelta(days=33)).isoformat()
+    return fixtures
+
+
+def table_row_counts(connection) -> Dict[str, int]:
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT table_name FROM information_schema.tables "
+        "WHERE table_schema = DATABASE() AND table_type = 'BASE TABLE'"
+    )
+    tables = [row[0] for row in cursor.fetchall()]
+    counts = {}
+    for table in tables:
+        cursor.execute(f"SELECT COUNT(*) FROM `{table}`")
+        counts[table] = cursor.fetchone()[0]
+    cursor.close()
+    return counts
+
+
+def run_cases(
+    sandbox: LocalMySQL,
+    cases: Sequence[RouteCase],
+    large_rows: int,
+    include_writes: bool = True,
+) -> List[dict]:
+    """Issue every case against the app and EXPLAIN what it executed."""
+    from fastapi.testclient import TestClient
+
+    from api.main import app
+
+    explain_conn = sandbox.connect()
+    try:
+        cursor = explain_conn.cursor()
+        try:
+            # 8.3+ defaults can switch to the iterator-based JSON layout
+            cursor.execute("SET explain_json_format_version = 1")
+        except Exception:
+            pass
+        cursor.close()
+
+        fixtures = resolve_fixtures(explain_conn)
+        table_rows = table_row_counts(explain_conn)
+
+        # No `with`: the lifespan would seed demo data into the sandbox
+        client = TestClient(app)
+        login = client.post("/api/auth/login", data={"username": "admin", "password": "admin123"})
+        login.raise_for_status()
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        captured: List[tuple] = []
+
+        def listener(sql, params, duration, row_count):
+            captured.append((sql, params))
+
+        results = []
+        add_statement_listener(listener)
+        try:
+            for case in cases:
+                if case.writes and not include_writes:
+                    continue
+                path = _format(case.path, fixtures)
+                body = _format(case.body, fixtures) if case.body is not None else None
+                captured.clear()
+                response = client.request(case.method, path, json=body, headers=headers)
+                statements = list(captured)
+
+                result = {
+                    "request": f"{case.method} {path}",
+                    "status": response.status_code,
+                    "statements": [],
+                }
+                seen = set()
+                for sql, params in statements:
+                    normalized = normalize_sql(sql)
+                    if normalized in seen or not normalized.upper().startswith(EXPLAINABLE):
+                        continue
+                    if params is None and "%s" in sql:
+                        continue  # executemany batches carry no single parameter set
+                    seen.add(normalized)
+                    entry = {"sql": normalized, "findings": []}
+                    try:
+                        plan = explain(explain_conn, sql, params)
+                    except Exception as e:
+                        entry["error"] = str(e)
+                    else:
+                        entry["findings"] = [
+                            f.__dict__ for f in analyze_plan(plan, sql, table_rows, large_rows, case)
+                        ]
+                    result["statements"].append(entry)
+                results.append(result)
+        finally:
+            remove_statement_listener(listener)
+    finally:
+        explain_conn.close()
+    return results
+
+
+def violations(results: List[dict]) -> List[Tuple[str, dict]]:
+    return [
+        (r["request"], f)
+        for r in results for s in r["statements"] for f in s["findings"]
+        if not f["allowed"]
+    ]
+
+
+def print_report(results: List[dict], verbose: bool = False) -> None:
+    for result in results:
+        flagged = [f for s in result["statements"] for f in s["findings"] if not f["allowed"]]
+        errors = [s for s in result["statements"] if s.get("error")]
+        mark = "FAIL" if flagged else "ok  "
+        print(f"{mark} {result['request']}  [{result['status']}, {len(result['statements'])} statements]")
+        for s in result["statements"]:
+            for f in s["findings"]:
+                if f["allowed"] and not verbose:
+                    continue
+                label = "accepted" if f["allowed"] else "VIOLATION"
+                print(f"    {label}: {f['kind']} on {', '.join(f['tables'])} (~{f['rows']} rows)")
+                print(f"      {s['sql'][:200]}")
+        for s in errors:
+            print(f"    explain error: {s['error']}")
+            print(f"      {s['sql'][:200]}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="EXPLAIN every route's SQL against a generated dataset")
+    parser.add_argument("--mysqld", help="mysqld binary (defaults to $MYSQLD or PATH)")
+    parser.add_argument("--external", action="store_true",
+                        help="Use the server from DB_HOST/DB_PORT/DB_USER/DB_PASSWORD instead of starting mysqld")
+    parser.add_argument("--database", default="car_rental_plan_check", help="Scratch schema to create")
+    parser.add_argument("--scale", type=float, default=1.0, help="Dataset scale (1.0 = 100k rentals)")
+    parser.add_argument("--large-rows", type=int, default=DEFAULT_LARGE_ROWS,
+                        help="Row count from which a table counts as large")
+    parser.add_argument("--read-only", action="store_true", help="Skip write routes")
+    parser.add_argument("--keep", action="store_true", help="Keep the sandbox data directory")
+    parser.add_argument("--json", dest="json_path", help="Write the full report to this file")
+    parser.add_argument("--verbose", action="store_true", help="Also list accepted scans/sorts")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+
+    external = None
+    if args.external:
+        external = {
+            "host": os.getenv("DB_HOST", "localhost"),
+            "port": int(os.getenv("DB_PORT", "3306")),
+            "user": os.getenv("DB_USER", "root"),
+            "password": os.getenv("DB_PASSWORD", ""),
+        }
+    sandbox = LocalMySQL(mysqld=args.mysqld, database=args.database, external=external, keep=args.keep)
+
+    try:
+        started = time.perf_counter()
+        sandbox.start()
+        sandbox.load_schema()
+        conn = sandbox.connect()
+        try:
+            counts = dataset.generate(conn, scale=args.scale)
+        finally:
+            conn.close()
+        sandbox.analyze()
+        print(f"Dataset loaded in {time.perf_counter() - started:.1f}s: "
+              + ", ".join(f"{t}={n}" for t, n in counts.items()))
+    except Exception as e:
+        sandbox.stop()
+        print(f"Could not prepare sandbox: {e}", file=sys.stderr)
+        return 2
+
+    try:
+        from database import connection
+        connection.configure(**sandbox.config())
+        results = run_cases(sandbox, ROUTE_CASES, args.large_rows, include_writes=not args.read_only)
+    finally:
+        sandbox.stop()
+
+    print_report(results, verbose=args.verbose)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"large_rows": args.large_rows, "results": results}, f, indent=2, default=str)
+
+    failed = violations(results)
+    print(f"\n{len(results)} requests checked, {len(failed)} plan violations")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -7,13 +7,35 @@ Usage examples (from backend directory):
     python -m cli.manage create-admin --username admin --password admin123 --email admin@example.com --full-name "System Admin"
     # Or env-driven (flags override env):
     ADMIN_USERNAME=admin ADMIN_PASSWORD=admin123 python -m cli.manage create-admin
+    # Dump the running API's slow-query log, with EXPLAIN plans:
+    python -m cli.manage slow-queries --url http://localhost:8000 --explain
+    # EXPLAIN every route's SQL against a throwaway MySQL with generated data:
+    python -m cli.manage check-plans --scale 0.5
+    # Check the migrations' data backfills against the demo data:
+    python -m cli.manage check-migrations
+    # Where a cold start spends its time (imports, then startup steps):
+    python -m cli.manage startup-profile --with-startup
+    # Credit loyalty points for rentals completed since the last run:
+    python -m cli.manage loyalty-accrual
+    # Preview, then apply, a recompute of every member's tier:
+    python -m cli.manage loyalty-tiers --silver 1500
+    python -m cli.manage loyalty-tiers --apply
+    # Check the last year of rentals against their payments:
+    python -m cli.manage payments-reconcile --days 365
 """
 
 
 import argparse
 import hashlib
+import json
 import os
+import re
+import subprocess
 import sys
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from pathlib import Path
 
 if __name__ == "__main__" and __package__ is None:
     # Allows running as a script: python cli/manage.py ...
@@ -21,8 +43,6 @@ if __name__ == "__main__" and __package__ is None:
     sys.path.append(str(pathlib.Path(__file__).parent.parent))
     __package__ = "cli"
 
-from ..database.connection import connect_db
-
 
 def _hash(password: str) -> str:
     # Simple dev hash to match api/routes/auth.py behavior; swap to bcrypt later
@@ -30,6 +50,8 @@ def _hash(password: str) -> str:
 
 
 def cmd_create_admin(args: argparse.Namespace) -> int:
+    from database.connection import connect_db
+
     username = args.username or os.getenv("ADMIN_USERNAME") or "admin"
     password = args.password or os.getenv("ADMIN_PASSWORD") or "admin123"
     email = args.email or os.getenv("ADMIN_EMAIL") or "admin@example.com"
@@ -78,6 +100,219 @@ def cmd_create_admin(args: argparse.Namespace) -> int:
     return 0
 
 
+def _api_token(base_url: str, username: str, password: str) -> str:
+    data = urllib.parse.urlencode({"username": username, "password": password}).encode()
+    with urllib.request.urlopen(f"{base_url}/api/auth/login", data=data, timeout=30) as resp:
+        return json.load(resp)["access_token"]
+
+
+def cmd_slow_queries(args: argparse.Namespace) -> int:
+    base_url = args.url.rstrip("/")
+    token = args.token or os.getenv("API_TOKEN")
+    if not token:
+        username = args.username or os.getenv("ADMIN_USERNAME") or "admin"
+        password = args.password or os.getenv("ADMIN_PASSWORD") or "admin123"
+        token = _api_token(base_url, username, password)
+
+    query = urllib.parse.urlencode({"limit": args.limit, "explain": str(args.explain).lower()})
+    request = urllib.request.Request(
+        f"{base_url}/api/admin/slow-queries?{query}",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    with urllib.request.urlopen(request, timeout=60) as resp:
+        payload = json.load(resp)
+
+    if args.json:
+        print(json.dumps(payload, indent=2))
+        return 0
+
+    entries = payload["entries"]
+    print(f"Slow queries (threshold {payload['threshold_ms']} ms): {len(entries)} entries")
+    for e in entries:
+        print(f"\n#{e['id']} {e['duration_ms']:.1f} ms  rows={e['row_count']}  route={e['route'] or '-'}  at {e['recorded_at']}")
+        print(f"  {e['sql']}")
+        print(f"  params: {e['params_shape']}")
+        if e.get("plan") is not None:
+            print("  plan:")
+            print("    " + json.dumps(e["plan"], indent=2).replace("\n", "\n    "))
+        elif e.get("plan_error"):
+            print(f"  plan error: {e['plan_error']}")
+    return 0
+
+
+def cmd_check_plans(args: argparse.Namespace) -> int:
+    from checks import query_plans
+
+    return query_plans.main(args.extra_args)
+
+
+def cmd_check_migrations(args: argparse.Namespace) -> int:
+    from checks import migrations
+
+    return migrations.main(args.extra_args)
+
+
+_PROFILE_SCRIPT = """
+import json
+import api.main
+if {run_startup}:
+    api.main.run_startup_tasks()
+from api.core.startup import startup_profile
+print(json.dumps(startup_profile.as_dict()))
+"""
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def parse_importtime(stderr: str) -> list[dict]:
+    """Parse `python -X importtime` output into {name, self_us, cumulative_us, depth}."""
+    modules = []
+    for line in stderr.splitlines():
+        m = _IMPORTTIME_LINE.match(line)
+        if m:
+            modules.append({
+                "name": m.group(4),
+                "self_us": int(m.group(1)),
+                "cumulative_us": int(m.group(2)),
+                "depth": len(m.group(3)) // 2,
+            })
+    return modules
+
+
+def cmd_startup_profile(args: argparse.Namespace) -> int:
+    # A fresh interpreter, so every import is cold
+    script = _PROFILE_SCRIPT.format(run_startup=bool(args.with_startup))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        cwd=Path(__file__).parent.parent, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        print(proc.stderr[-4000:], file=sys.stderr)
+        return 1
+
+    profile = json.loads(proc.stdout.strip().splitlines()[-1])
+    modules = parse_importtime(proc.stderr)
+    packages = defaultdict(int)
+    for m in modules:
+        packages[m["name"].split(".")[0]] += m["self_us"]
+
+    if args.json:
+        print(json.dumps({"app": profile, "packages": packages, "modules": modules}, indent=2))
+        return 0
+
+    total_ms = sum(packages.values()) / 1000
+    print(f"Cold import: {total_ms:.0f} ms across {len(modules)} modules")
+    print("\nBy top-level package (self time):")
+    for name, us in sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"  {name:<36} {us / 1000:>9.1f} ms  {us / 1000 / total_ms:>6.1%}")
+    print("\nSlowest modules (cumulative):")
+    for m in sorted(modules, key=lambda m: m["cumulative_us"], reverse=True)[:args.top]:
+        print(f"  {m['name']:<48} {m['cumulative_us'] / 1000:>9.1f} ms")
+    print("\nApp import phases:")
+    for i in profile["imports"]:
+        print(f"  {i['name']:<36} {i['ms']:>9.1f} ms")
+    if profile["steps"]:
+        print(f"\nStartup steps ({profile['startup_ms']:.0f} ms):")
+        for step in profile["steps"]:
+            status = "" if step["ok"] else "  FAILED"
+            print(f"  {step['name']:<36} {step['ms']:>9.1f} ms{status}")
+    return 0
+
+
+def cmd_loyalty_accrual(args: argparse.Namespace) -> int:
+    from api.core.config import settings
+    from api.services import loyalty
+    from database.retry import run_transaction
+
+    if args.rebuild_balances:
+        drifted = run_transaction(loyalty.rebuild_balances, "loyalty_rebuild", idempotent=True)
+        print(f"Rebuilt balances from the ledger: {drifted} programs corrected")
+        return 0
+
+    result = run_transaction(
+        lambda cursor: loyalty.accrue_completed_rentals(
+            cursor, settings.LOYALTY_POINTS_PER_UNIT, settings.LOYALTY_ACCRUAL_LOOKBACK_DAYS
+        ),
+        "loyalty_accrual",
+        idempotent=True,
+    )
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return 0
+    print(f"Batch {result['batch_id']}: {result['since']} -> {result['until']}")
+    print(f"  {result['rentals_credited']} rentals, {result['customers']} customers, {result['points']} points")
+    for change in result["tier_changes"]:
+        print(f"  {change['from']} -> {change['to']}: {change['customers']}")
+    return 0
+
+
+def cmd_loyalty_tiers(args: argparse.Namespace) -> int:
+    from api.core.config import settings
+    from api.services import loyalty
+
+    proposed = dict(settings.LOYALTY_TIER_THRESHOLDS)
+    for tier in loyalty.TIERS:
+        value = getattr(args, tier.lower())
+        if value is not None:
+            proposed[tier] = value
+    try:
+        thresholds = loyalty.tier_thresholds(proposed)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    if args.apply and thresholds != loyalty.TIER_THRESHOLDS:
+        print("Only the configured thresholds can be applied; set LOYALTY_TIER_THRESHOLDS first",
+              file=sys.stderr)
+        return 2
+
+    def progress(p):
+        print(f"  {p['scanned']:>10,} / {p['members']:,} members scanned, {p['changed']:,} changing",
+              file=sys.stderr)
+
+    result = loyalty.recompute_tiers(
+        thresholds, reset=args.reset, dry_run=not args.apply,
+        chunk_size=args.chunk_size, progress=None if args.json else progress,
+    )
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return 0
+    verb = "Changed" if args.apply else "Would change"
+    print(f"{verb} {result['changed']:,} of {result['members']:,} members in {result['elapsed_ms']:.0f} ms"
+          f" (thresholds {result['thresholds']})")
+    for t in result["transitions"]:
+        print(f"  {t['from']:>8} -> {t['to']:<8} {t['customers']:>10,}")
+    if result["sample"] and not args.apply:
+        print("Sample:")
+        for row in result["sample"]:
+            print(f"  customer {row['customer_id']}: {row['points_balance']} points, {row['from']} -> {row['to']}")
+    return 0
+
+
+def cmd_payments_reconcile(args: argparse.Namespace) -> int:
+    from api.core.config import settings
+    from api.services import payments
+
+    def progress(p):
+        print(f"  {p['rentals']:>10,} rentals, {p['payments']:,} payments, {p['flagged']:,} flagged"
+              f" (through {p['through']})", file=sys.stderr)
+
+    result = payments.reconcile_payments(
+        args.days or settings.PAYMENT_RECONCILIATION_DAYS,
+        args.chunk_size or settings.PAYMENT_RECONCILIATION_CHUNK_SIZE,
+        progress=None if args.json else progress,
+    )
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return 0
+    print(f"Reconciled {result['rentals']:,} rentals and {result['payments']:,} payments"
+          f" ({result['since']} -> {result['until']}) in {result['elapsed_ms']:.0f} ms")
+    print(f"  {result['flagged']:,} exceptions, {result['cleared']:,} cleared")
+    for kind, count in result["exceptions"].items():
+        if count:
+            print(f"  {kind:<18} {count:>10,}")
+    return 0
+
+
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(prog="manage", description="Car Rental management commands")
     sub = parser.add_subparsers(dest="command", required=True)
@@ -89,12 +324,70 @@ def build_parser() -> argparse.ArgumentParser:
     p_admin.add_argument("--full-name", dest="full_name", help="Full name")
     p_admin.set_defaults(func=cmd_create_admin)
 
+    p_slow = sub.add_parser("slow-queries", help="Dump the running API's slow-query log")
+    p_slow.add_argument("--url", default="http://localhost:8000", help="Base URL of the API")
+    p_slow.add_argument("--token", help="Bearer token (defaults to logging in as the admin user)")
+    p_slow.add_argument("--username", help="Username to log in with")
+    p_slow.add_argument("--password", help="Password to log in with")
+    p_slow.add_argument("--limit", type=int, default=50, help="Number of entries to show")
+    p_slow.add_argument("--explain", action="store_true", help="Capture EXPLAIN FORMAT=JSON plans")
+    p_slow.add_argument("--json", action="store_true", help="Print raw JSON")
+    p_slow.set_defaults(func=cmd_slow_queries)
+
+    p_plans = sub.add_parser(
+        "check-plans",
+        help="Fail on full scans / filesorts of large tables in route queries",
+        description="Options are passed to checks.query_plans.",
+        add_help=False,
+    )
+    p_plans.set_defaults(func=cmd_check_plans)
+
+    p_migrations = sub.add_parser(
+        "check-migrations",
+        help="Check the migrations' data backfills against the demo data",
+        description="Options are passed to checks.migrations.",
+        add_help=False,
+    )
+    p_migrations.set_defaults(func=cmd_check_migrations)
+
+    p_startup = sub.add_parser("startup-profile", help="Break down cold-start time of the API")
+    p_startup.add_argument("--with-startup", action="store_true",
+                           help="Also run and time the startup steps (needs the database)")
+    p_startup.add_argument("--top", type=int, default=15, help="Rows per table")
+    p_startup.add_argument("--json", action="store_true", help="Print raw JSON")
+    p_startup.set_defaults(func=cmd_startup_profile)
+
+    p_accrual = sub.add_parser("loyalty-accrual", help="Credit points for newly completed rentals")
+    p_accrual.add_argument("--rebuild-balances", action="store_true",
+                           help="Instead, recompute every balance from the points ledger")
+    p_accrual.add_argument("--json", action="store_true", help="Print raw JSON")
+    p_accrual.set_defaults(func=cmd_loyalty_accrual)
+
+    p_tiers = sub.add_parser("loyalty-tiers", help="Recompute every member's tier (dry run unless --apply)")
+    p_tiers.add_argument("--apply", action="store_true", help="Write the changes (default: report only)")
+    p_tiers.add_argument("--reset", action="store_true",
+                         help="Drop members below the lowest threshold to Bronze (annual reset)")
+    for tier in ("silver", "gold", "platinum"):
+        p_tiers.add_argument(f"--{tier}", type=int, help=f"Preview a different {tier.title()} threshold")
+    p_tiers.add_argument("--chunk-size", type=int, default=50000, help="Members per UPDATE")
+    p_tiers.add_argument("--json", action="store_true", help="Print raw JSON")
+    p_tiers.set_defaults(func=cmd_loyalty_tiers)
+
+    p_reconcile = sub.add_parser("payments-reconcile", help="Flag rentals whose payments do not add up")
+    p_reconcile.add_argument("--days", type=int, help="Days of pickups to check (default: configured)")
+    p_reconcile.add_argument("--chunk-size", type=int, help="Rentals per chunk")
+    p_reconcile.add_argument("--json", action="store_true", help="Print raw JSON")
+    p_reconcile.set_defaults(func=cmd_payments_reconcile)
+
     return parser
 
 
 def main(argv: list[str] | None = None) -> int:
     parser = build_parser()
-    args = parser.parse_args(argv)
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command not in ("check-plans", "check-migrations"):
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.extra_args = extra
     return args.func(args)
 
 
@@ -3,10 +3,16 @@ handles the database connection and creation
 '''
 
 import os
+import threading
+import time
 import mysql.connector
 from mysql.connector import pooling
 from dotenv import load_dotenv
 
+from .instrumentation import InstrumentedConnection, record_pool_wait
+from .replica import replica, replica_tables
+from . import statements
+
 # Load environment variables from .env if present
 load_dotenv()
 
@@ -23,16 +29,81 @@ DB_CONFIG = {
     "connection_timeout": 5,
 }
 
-# Create connection pool for better performance
-try:
-    connection_pool = pooling.MySQLConnectionPool(
-        pool_name="car_rental_pool",
-        pool_size=10,
-        pool_reset_session=True,
-        **DB_CONFIG
+
+def _create_pool():
+    try:
+        return pooling.MySQLConnectionPool(
+            pool_name="car_rental_pool",
+            pool_size=10,
+            **DB_CONFIG
+        )
+    except mysql.connector.Error:
+        return None
+
+
+# Connection pool for better performance. Created on first use rather than at
+# import: opening the pool's connections is the slowest part of a cold start,
+# and CLI commands that never touch the database should not pay for it.
+connection_pool = None
+_pool_ready = False
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the connection pool, creating it on first call (None if it could not be created)."""
+    global connection_pool, _pool_ready
+    if not _pool_ready:
+        with _pool_lock:
+            if not _pool_ready:
+                connection_pool = _create_pool()
+                _pool_ready = True
+    return connection_pool
+
+
+def configure(**overrides):
+    """
+    Point this process at a different server/database after import.
+
+    Updates DB_CONFIG and rebuilds the pool; used by tools that start their
+    own MySQL instance (plan checks, benchmarks).
+    """
+    global connection_pool, _pool_ready
+    DB_CONFIG.update(overrides)
+    with _pool_lock:
+        connection_pool = _create_pool()
+        _pool_ready = True
+
+
+def dispose_pool():
+    """
+    Close the pool's idle connections and drop it (the replica pool too).
+
+    The prefork server calls this in the parent before forking, since pooled
+    sockets must never be shared between processes; each worker then builds
+    its own pool with configure().
+    """
+    global connection_pool, _pool_ready
+    with _pool_lock:
+        if connection_pool is not None:
+            try:
+                connection_pool._remove_connections()
+            except Exception:
+                pass
+        connection_pool = None
+        _pool_ready = False
+    replica.dispose()
+
+def configure_replica(pool_size=10, max_lag=5.0, check_interval=5.0, **overrides):
+    """
+    Enable the read replica (see database/replica.py). Connection settings
+    not given in `overrides` (user, password, database, timeouts) are taken
+    from the primary's DB_CONFIG.
+    """
+    replica.configure(
+        {**DB_CONFIG, **overrides},
+        pool_size=pool_size, max_lag=max_lag, check_interval=check_interval,
     )
-except mysql.connector.Error:
-    connection_pool = None
+
 
 def create_database_if_not_exists():
     """Create the target database if it does not already exist."""
@@ -49,17 +120,30 @@ def create_database_if_not_exists():
         # Let caller handle connection/setup issues
         pass
 
-def connect_db():
-    """Get connection from pool or create new connection"""
+def _raw_connection():
     try:
-        if connection_pool:
-            return connection_pool.get_connection()
+        pool = get_pool()
+        if pool:
+            return pool.get_connection()
         else:
             return mysql.connector.connect(**DB_CONFIG)
     except mysql.connector.Error:
         # Fallback to direct connection
         return mysql.connector.connect(**DB_CONFIG)
 
+
+def connect_db():
+    """Get connection from pool or create new connection"""
+    start = time.perf_counter()
+    conn = None
+    tables = replica_tables()
+    if tables is not None:
+        conn = replica.connection_for(tables)   # None: stay on the primary
+    if conn is None:
+        conn = _raw_connection()
+    record_pool_wait(time.perf_counter() - start)
+    return InstrumentedConnection(conn, statements.statement_cache(conn))
+
 def get_db_connection():
     """Alias for connect_db for consistency"""
     return connect_db()
@@ -0,0 +1,199 @@
+'''
+Synthetic dataset generator for plan checks and benchmarks.
+
+Fills an empty schema (schema.sql + auth.sql + migrations) with deterministic,
+realistically shaped data at a configurable scale so index usage and query
+cost can be measured against tables far larger than the demo data in
+insert_data.sql.
+'''
+
+import random
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Sequence
+
+from .migrations import MAINTENANCE_COST_ROLLUP
+
+# Row counts per table at scale=1.0
+BASE_SIZES = {
+    "Branch": 12,
+    "Vehicle": 2_000,
+    "Customer": 20_000,
+    "Rental": 100_000,
+    "VehicleMaintenance": 10_000,
+    "PromoOffer": 40,
+}
+
+BRANDS = {
+    "Ferrari": ["Roma", "F8 Tributo", "296 GTB", "Purosangue"],
+    "Lamborghini": ["Huracan", "Urus", "Revuelto"],
+    "Porsche": ["911 Turbo S", "Taycan", "Cayenne"],
+    "Bentley": ["Continental GT", "Bentayga", "Flying Spur"],
+    "Rolls-Royce": ["Ghost", "Cullinan", "Spectre"],
+    "McLaren": ["750S", "Artura", "GT"],
+    "Aston Martin": ["DB12", "Vantage", "DBX"],
+    "Maserati": ["MC20", "Grecale", "GranTurismo"],
+    "BMW": ["M5", "i7", "XM"],
+    "Mercedes-Benz": ["S 580", "G 63", "AMG GT"],
+}
+TYPES = ["Supercar", "SUV", "Grand Tourer", "Sedan", "Convertible"]
+FIRST_NAMES = ["James", "Sofia", "Lucas", "Amelia", "Noah", "Olivia", "Liam", "Emma",
+               "Mateo", "Isabella", "Hugo", "Chloe", "Leon", "Mia", "Elias", "Zoe"]
+LAST_NAMES = ["Smith", "Rossi", "Muller", "Dubois", "Garcia", "Jensen", "Novak",
+              "Silva", "Kowalski", "Andersen", "Moreau", "Fischer", "Costa", "Berg"]
+COUNTRIES = ["Monaco", "France", "Italy", "Germany", "Switzerland", "UK", "UAE", "USA"]
+
+
+def _batched(rows: Sequence, size: int) -> Iterable[Sequence]:
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def _insert(cursor, table: str, columns: Sequence[str], rows: List[tuple], batch_size: int = 2000) -> None:
+    placeholders = ", ".join(["%s"] * len(columns))
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    for batch in _batched(rows, batch_size):
+        # mysql-connector rewrites executemany INSERTs into multi-row statements
+        cursor.executemany(sql, batch)
+
+
+def sizes_for(scale: float) -> Dict[str, int]:
+    return {table: max(1, int(count * scale)) for table, count in BASE_SIZES.items()}
+
+
+def generate(connection, scale: float = 1.0, seed: int = 42, today: date = None) -> Dict[str, int]:
+    """
+    Populate an empty schema through `connection` and return row counts.
+
+    Rentals span the two years before `today`, with a small share still active
+    or reserved; roughly a third of customers are loyalty members and a third
+    of completed rentals carry a review.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    sizes = sizes_for(scale)
+    counts: Dict[str, int] = {}
+    cursor = connection.cursor()
+
+    branches = [
+        (f"BR{i:03d}", f"Prestige Drive {COUNTRIES[i % len(COUNTRIES)]} {i}",
+         f"{i} Avenue Princesse Grace", COUNTRIES[i % len(COUNTRIES)], COUNTRIES[i % len(COUNTRIES)],
+         f"+377 {i:08d}")
+        for i in range(1, sizes["Branch"] + 1)
+    ]
+    _insert(cursor, "Branch", ["branch_code", "name", "address", "city", "country", "phone"], branches)
+    counts["Branch"] = len(branches)
+
+    vehicles = []
+    daily_rates = {}
+    brands = list(BRANDS)
+    for i in range(1, sizes["Vehicle"] + 1):
+        brand = brands[i % len(brands)]
+        model = BRANDS[brand][i % len(BRANDS[brand])]
+        rate = rng.choice([450, 650, 900, 1200, 1800, 2500, 3200])
+        daily_rates[i] = rate
+        vehicles.append((
+            f"V{i:05d}", brand, model, rng.choice(TYPES), rng.choice(["Petrol", "Hybrid", "Electric"]),
+            "Automatic", f"PD-{i:06d}", rng.choices(["Available", "Rented", "Maintenance"], [70, 25, 5])[0],
+            rng.randint(1, sizes["Branch"]), rate, rng.choice([2, 4, 5]), 2, 2, rng.choice([2, 4]), True,
+        ))
+    _insert(cursor, "Vehicle", [
+        "vehicle_code", "brand", "model", "type", "fuel_type", "transmission", "plate_number", "status",
+        "branch_id", "daily_rate", "seating_capacity", "large_luggage_capacity", "small_luggage_capacity",
+        "door_count", "has_air_conditioning",
+    ], vehicles)
+    counts["Vehicle"] = len(vehicles)
+
+    customers = []
+    loyalty_members = set()
+    for i in range(1, sizes["Customer"] + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        member = rng.random() < 0.35
+        if member:
+            loyalty_members.add(i)
+        customers.append((
+            f"CUST{i:06d}", first, last, f"{first.lower()}.{last.lower()}.{i}@example.com",
+            f"+33 6{i:08d}", date(1960, 1, 1) + timedelta(days=rng.randint(0, 16000)),
+            f"LIC{i:08d}", rng.choice(COUNTRIES), member,
+        ))
+    _insert(cursor, "Customer", [
+        "customer_code", "first_name", "last_name", "email", "phone", "date_of_birth",
+        "license_number", "country_of_residence", "is_loyalty_member",
+    ], customers)
+    counts["Customer"] = len(customers)
+
+    loyalty = []
+    for customer_id in sorted(loyalty_members):
+        points = int(rng.paretovariate(1.2) * 300)
+        tier = "Platinum" if points >= 10000 else "Gold" if points >= 5000 else "Silver" if points >= 1000 else "Bronze"
+        loyalty.append((customer_id, points, tier, today - timedelta(days=rng.randint(30, 1500))))
+    _insert(cursor, "LoyaltyProgram", ["customer_id", "points_balance", "membership_tier", "date_joined"], loyalty)
+    counts["LoyaltyProgram"] = len(loyalty)
+
+    now = datetime.combine(today, datetime.min.time()) + timedelta(hours=12)
+    rentals, payments, reviews = [], [], []
+    for rental_id in range(1, sizes["Rental"] + 1):
+        vehicle_id = rng.randint(1, sizes["Vehicle"])
+        customer_id = rng.randint(1, sizes["Customer"])
+        pickup = now - timedelta(days=rng.randint(-14, 730), hours=rng.randint(0, 23))
+        days = rng.randint(1, 14)
+        expected = pickup + timedelta(days=days)
+        if pickup > now:
+            status, actual = "Reserved", None
+        elif expected > now or rng.random() < 0.01:
+            status, actual = "Active", None
+        else:
+            status = "Cancelled" if rng.random() < 0.03 else "Completed"
+            actual = expected + timedelta(hours=rng.choice([0, 0, 0, 2, 26]))
+        total = round(days * daily_rates[vehicle_id] * rng.uniform(0.85, 1.0), 2)
+        deposit = round(total * 0.3, 2)
+        branch = rng.randint(1, sizes["Branch"])
+        rentals.append((
+            vehicle_id, customer_id, branch, branch, pickup, expected, actual, status,
+            rng.choice(["Website", "Phone", "Agent", "API"]), total, deposit, round(total - deposit, 2),
+        ))
+        if status in ("Completed", "Active"):
+            payments.append((rental_id, deposit, (pickup - timedelta(days=3)).date(), "Credit Card", True))
+            if status == "Completed":
+                ok = rng.random() > 0.02
+                payments.append((rental_id, round(total - deposit, 2), actual.date(), "Credit Card", ok))
+                if rng.random() < 0.33:
+                    reviews.append((
+                        rental_id, rng.choice([3.0, 3.5, 4.0, 4.5, 4.5, 5.0, 5.0]),
+                        "Impeccable car and service.", (actual + timedelta(days=rng.randint(0, 10))).date(),
+                        vehicle_id, customer_id,
+                    ))
+    _insert(cursor, "Rental", [
+        "vehicle_id", "customer_id", "pickup_branch_id", "return_branch_id", "pickup_datetime",
+        "return_datetime", "actual_return_datetime", "status", "booked_via", "total_cost",
+        "deposit_paid_online", "payment_due_at_pickup",
+    ], rentals)
+    counts["Rental"] = len(rentals)
+    _insert(cursor, "Payment", ["rental_id", "amount", "payment_date", "payment_method", "is_successful"], payments)
+    counts["Payment"] = len(payments)
+    _insert(cursor, "ReviewRatings", ["rental_id", "rating_score", "review_text", "review_date",
+                                      "vehicle_id", "customer_id"], reviews)
+    counts["ReviewRatings"] = len(reviews)
+
+    maintenance = [
+        (rng.randint(1, sizes["Vehicle"]), rng.choice(["Annual service", "Tyre replacement", "Brake inspection",
+                                                       "Detailing", "Software update"]),
+         today - timedelta(days=rng.randint(0, 1095)), round(rng.uniform(150, 9000), 2), "Prestige Workshop")
+        for _ in range(sizes["VehicleMaintenance"])
+    ]
+    _insert(cursor, "VehicleMaintenance", ["vehicle_id", "description", "maintenance_date", "cost", "performed_by"],
+            maintenance)
+    counts["VehicleMaintenance"] = len(maintenance)
+    cursor.execute("DELETE FROM MaintenanceCostMonthly")
+    cursor.execute(MAINTENANCE_COST_ROLLUP)
+
+    promos = []
+    for i in range(sizes["PromoOffer"]):
+        start = today - timedelta(days=rng.randint(-60, 400))
+        promos.append((f"Promo {i}", rng.choice([5, 10, 12, 15, 20]), start,
+                       start + timedelta(days=rng.randint(3, 120)), "All branches"))
+    _insert(cursor, "PromoOffer", ["name", "discount_percent", "valid_from", "valid_to", "conditions"], promos)
+    counts["PromoOffer"] = len(promos)
+
+    connection.commit()
+    cursor.close()
+    return counts
@@ -0,0 +1,358 @@
+'''
+Query instrumentation for connections handed out by database.connection.
+
+connect_db() wraps every connection in an InstrumentedConnection whose
+cursors time execute/fetch calls. Timings are added to the RequestStats of
+the request currently being served (tracked through a context variable), so
+the API layer can report per-route query counts, DB time and pool wait
+without the route modules changing how they use cursors.
+
+Statements slower than SLOW_QUERY_THRESHOLD_MS are also kept in a bounded
+in-memory slow-query log together with their route, normalized SQL, parameter
+shape and row count; their EXPLAIN plan is captured on demand.
+
+Tools can also subscribe to every finished statement with
+add_statement_listener() (the query-plan checks use this to collect the SQL
+each route issues).
+
+When the connection has a statement cache (database/statements.py), eligible
+statements are executed through cached server-side prepared cursors; the
+proxy then reads results from whichever cursor ran the last statement, and
+holds the lease on that cached cursor until its next statement or close().
+'''
+
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, List, Optional
+
+import mysql.connector
+
+from .statements import ER_UNSUPPORTED_PS, is_preparable, mark_unpreparable
+
+
+class RequestStats:
+    """Database work attributed to one HTTP request."""
+
+    __slots__ = ("query_count", "db_time", "pool_wait", "scope")
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.pool_wait = 0.0
+        self.scope = scope
+
+    @property
+    def route(self) -> Optional[str]:
+        """Path template of the matched route, once routing has happened."""
+        if self.scope is None:
+            return None
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or self.scope.get("path")
+
+
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar("db_request_stats", default=None)
+
+
+def begin_request(scope: Optional[dict] = None) -> RequestStats:
+    """Start collecting stats for the current context (one per request)."""
+    stats = RequestStats(scope)
+    _current_stats.set(stats)
+    return stats
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current_stats.get()
+
+
+def record_pool_wait(seconds: float) -> None:
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.pool_wait += seconds
+
+
+def _record_query(seconds: float, counted: bool) -> None:
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.db_time += seconds
+        if counted:
+            stats.query_count += 1
+
+
+# ── Slow-query log ────────────────────────────────────────────────────────────
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and replace literals/placeholders with `?`."""
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("(?+)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def params_shape(params) -> Optional[object]:
+    """Describe parameters by type only, so values never leave the process."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+
+class SlowQueryLog:
+    """Bounded ring buffer of statements slower than the threshold."""
+
+    def __init__(self, threshold_ms: float, size: int):
+        self.threshold_ms = threshold_ms
+        self._entries = deque(maxlen=size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def record(self, sql: str, params, duration: float, row_count: int, route: Optional[str]) -> None:
+        if duration * 1000 < self.threshold_ms:
+            return
+        if sql.lstrip()[:7].upper() == "EXPLAIN":
+            return
+        entry = {
+            "id": next(self._ids),
+            "worker": os.getpid(),
+            "recorded_at": datetime.now().isoformat(),
+            "route": route,
+            "duration_ms": round(duration * 1000, 2),
+            "sql": normalize_sql(sql),
+            "params_shape": params_shape(params),
+            "row_count": row_count,
+            "plan": None,
+            # Original text and values are kept only to run EXPLAIN on demand
+            "_statement": (sql, params),
+        }
+        with self._lock:
+            self._entries.append(entry)
+
+    def entries(self, limit: Optional[int] = None) -> List[dict]:
+        """Public view of the newest entries first (statement values omitted)."""
+        with self._lock:
+            items = list(self._entries)
+        items.reverse()
+        if limit is not None:
+            items = items[:limit]
+        return [{k: v for k, v in e.items() if not k.startswith("_")} for e in items]
+
+    def get(self, entry_id: int) -> Optional[dict]:
+        with self._lock:
+            for entry in self._entries:
+                if entry["id"] == entry_id:
+                    return entry
+        return None
+
+    def explain(self, entry_id: int, connection) -> Optional[object]:
+        """Run EXPLAIN FORMAT=JSON for an entry and cache the plan on it."""
+        entry = self.get(entry_id)
+        if entry is None:
+            return None
+        if entry["plan"] is None:
+            sql, params = entry["_statement"]
+            cursor = connection.cursor()
+            try:
+                cursor.execute("EXPLAIN FORMAT=JSON " + sql, params)
+                row = cursor.fetchone()
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            entry["plan"] = json.loads(row[0]) if row else None
+        return entry["plan"]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log = SlowQueryLog(SLOW_QUERY_THRESHOLD_MS, SLOW_QUERY_LOG_SIZE)
+
+# Callables invoked as listener(sql, params, duration, row_count) per statement
+_statement_listeners: List[Callable] = []
+
+
+def add_statement_listener(listener: Callable) -> None:
+    _statement_listeners.append(listener)
+
+
+def remove_statement_listener(listener: Callable) -> None:
+    if listener in _statement_listeners:
+        _statement_listeners.remove(listener)
+
+
+class InstrumentedCursor:
+    """
+    Cursor proxy that times round-trips to MySQL.
+
+    A statement's duration covers its execute call plus the fetches that
+    follow it; it is checked against the slow-query threshold once the
+    statement is finished (next execute, full fetch or close).
+    """
+
+    def __init__(self, cursor, statements=None, dictionary: bool = False):
+        self._cursor = cursor
+        self._active = cursor      # cursor holding the current result
+        self._statements = statements
+        self._dictionary = dictionary
+        self._statement = None
+        self._elapsed = 0.0
+        self._lease = None         # SQL of the cached cursor in _active
+
+    def _begin(self, operation, params):
+        self._finish()
+        self._release()
+        self._statement = (operation, params)
+        self._elapsed = 0.0
+
+    def _finish(self):
+        if self._statement is None:
+            return
+        sql, params = self._statement
+        self._statement = None
+        stats = _current_stats.get()
+        try:
+            row_count = self._active.rowcount
+        except Exception:
+            row_count = -1
+        slow_query_log.record(
+            sql, params, self._elapsed, row_count,
+            stats.route if stats is not None else None,
+        )
+        for listener in _statement_listeners:
+            listener(sql, params, self._elapsed, row_count)
+
+    def _timed(self, counted, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._elapsed += elapsed
+            _record_query(elapsed, counted=counted)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._begin(operation, params)
+        if self._statements is not None and not args and not kwargs and is_preparable(operation, params):
+            return self._timed(True, self._execute_prepared, operation, params)
+        self._active = self._cursor
+        return self._timed(True, self._cursor.execute, operation, params, *args, **kwargs)
+
+    def _release(self):
+        """Hand the cached prepared cursor back, draining what the caller left."""
+        if self._active is self._cursor:
+            return
+        try:
+            if self._active.with_rows:
+                self._active.fetchall()
+        except mysql.connector.Error:
+            pass
+        self._statements.release(self._lease, self._dictionary, self)
+        self._active = self._cursor
+
+    def _execute_prepared(self, operation, params):
+        entry = self._statements.acquire(operation, self._dictionary, self)
+        if entry is None:
+            # Another open cursor is still reading this statement's result
+            self._active = self._cursor
+            return self._cursor.execute(operation, params)
+        sql, cursor = entry
+        self._lease = operation
+        try:
+            cursor.execute(sql, params)
+        except mysql.connector.Error as e:
+            if e.errno != ER_UNSUPPORTED_PS:
+                raise
+            # Not preparable: run it as text from now on
+            self._statements.discard(operation, self._dictionary)
+            mark_unpreparable(operation)
+            self._active = self._cursor
+            return self._cursor.execute(operation, params)
+        self._active = cursor
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        self._begin(operation, None)
+        try:
+            return self._timed(True, self._cursor.executemany, operation, seq_params, *args, **kwargs)
+        finally:
+            self._finish()
+
+    # Cursors are unbuffered by default, so fetching still waits on the server
+    def fetchone(self):
+        row = self._timed(False, self._active.fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        return self._timed(False, self._active.fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        try:
+            return self._timed(False, self._active.fetchall)
+        finally:
+            self._finish()
+
+    def close(self):
+        self._finish()
+        # Cached prepared cursors stay open for the rest of the checkout
+        self._release()
+        return self._cursor.close()
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._active, name)
+
+
+class InstrumentedConnection:
+    """Connection proxy whose cursors are instrumented."""
+
+    def __init__(self, connection, statements=None):
+        self._connection = connection
+        self._statements = statements
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._connection.cursor(*args, **kwargs)
+        # Prepared cursors only come in tuple and dict flavours
+        if self._statements is None or args or not set(kwargs) <= {"dictionary"}:
+            return InstrumentedCursor(cursor)
+        return InstrumentedCursor(cursor, self._statements, bool(kwargs.get("dictionary")))
+
+    def close(self):
+        # Returning the connection resets the session, which deallocates the
+        # prepared statements; the next checkout starts a new cache
+        self._statements = None
+        return self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
@@ -0,0 +1,287 @@
+'''
+Incremental schema changes for databases created from an older schema.sql.
+
+schema.sql only runs when a database is first seeded, so tables and indexes
+added since then are created here instead. Each migration runs once and is
+recorded in SchemaMigration; the statements are written to be harmless if
+repeated anyway (IF NOT EXISTS, index existence checks), since a partially
+applied migration is re-run from the top.
+
+apply_migrations() runs at API startup after the seed step, and from
+LocalMySQL.load_schema() so the plan checks see the same schema. A reseed
+from schema.sql drops SchemaMigration along with the tables, so everything
+is re-applied afterwards.
+'''
+
+import logging
+from typing import Callable, List, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# A step is a SQL string or a callable taking the cursor
+Step = Union[str, Callable]
+
+
+def create_index(table: str, name: str, columns: str) -> Callable:
+    """Step creating index `name` unless the table already has it (MySQL lacks IF NOT EXISTS here)."""
+    def step(cursor):
+        cursor.execute(
+            "SELECT 1 FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1",
+            (table, name),
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+    return step
+
+
+def add_column(table: str, column: str, definition: str) -> Callable:
+    """Step adding `column` unless the table already has it."""
+    def step(cursor):
+        cursor.execute(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s LIMIT 1",
+            (table, column),
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return step
+
+
+# Fills MaintenanceCostMonthly from VehicleMaintenance (migration 0005, and
+# the plan-check dataset after it loads maintenance records)
+MAINTENANCE_COST_ROLLUP = """
+    INSERT INTO MaintenanceCostMonthly (vehicle_id, month_start, records, total_cost, first_date, last_date)
+    SELECT vehicle_id, maintenance_date - INTERVAL (DAYOFMONTH(maintenance_date) - 1) DAY,
+           COUNT(*), COALESCE(SUM(cost), 0), MIN(maintenance_date), MAX(maintenance_date)
+    FROM VehicleMaintenance
+    GROUP BY 1, 2
+"""
+
+
+MIGRATIONS: List[Tuple[str, Sequence[Step]]] = [
+    ("0001_loyalty_ledger", (
+        # Append-only record of every points change; LoyaltyProgram.points_balance
+        # is the running sum per customer
+        """
+        CREATE TABLE IF NOT EXISTS LoyaltyLedger (
+            entry_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            customer_id INT NOT NULL,
+            rental_id INT NULL,
+            points INT NOT NULL,
+            reason VARCHAR(20) NOT NULL,
+            batch_id INT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uq_loyalty_ledger_rental (rental_id),
+            KEY idx_loyalty_ledger_customer (customer_id),
+            KEY idx_loyalty_ledger_batch (batch_id),
+            FOREIGN KEY (customer_id) REFERENCES Customer(customer_id)
+        )
+        """,
+        # Progress of incremental batch jobs
+        """
+        CREATE TABLE IF NOT EXISTS JobWatermark (
+            job VARCHAR(50) PRIMARY KEY,
+            watermark DATETIME NOT NULL,
+            runs INT NOT NULL DEFAULT 0,
+            last_run_at DATETIME NULL,
+            last_result JSON NULL
+        )
+        """,
+        create_index("Rental", "idx_rental_actual_return", "actual_return_datetime"),
+        # Existing balances become the ledger's opening entries...
+        """
+        INSERT INTO LoyaltyLedger (customer_id, points, reason)
+        SELECT lp.customer_id, lp.points_balance, 'opening'
+        FROM LoyaltyProgram lp
+        WHERE lp.points_balance <> 0
+          AND NOT EXISTS (SELECT 1 FROM LoyaltyLedger l WHERE l.customer_id = lp.customer_id)
+        """,
+        # ...and accrual starts from now, so past rentals are not counted twice
+        "INSERT IGNORE INTO JobWatermark (job, watermark) VALUES ('loyalty_accrual', NOW())",
+    )),
+    ("0002_loyalty_rankings", (
+        # Leaderboard: each tier's members in balance order
+        create_index("LoyaltyProgram", "idx_loyalty_tier_points", "membership_tier, points_balance DESC"),
+        # Members per tier, moved along with every tier change
+        """
+        CREATE TABLE IF NOT EXISTS LoyaltyTierCount (
+            tier VARCHAR(20) PRIMARY KEY,
+            members INT NOT NULL DEFAULT 0
+        )
+        """,
+        "DELETE FROM LoyaltyTierCount",
+        """
+        INSERT INTO LoyaltyTierCount (tier, members)
+        SELECT membership_tier, COUNT(*)
+        FROM LoyaltyProgram
+        WHERE membership_tier IS NOT NULL
+        GROUP BY membership_tier
+        """,
+    )),
+    ("0003_review_feeds", (
+        # The rental's vehicle and customer, copied onto the review so the
+        # per-vehicle and per-customer feeds are single-table index range reads
+        # (the rows' scores and text are still read from the table)
+        add_column("ReviewRatings", "vehicle_id", "INT NULL"),
+        add_column("ReviewRatings", "customer_id", "INT NULL"),
+        """
+        UPDATE ReviewRatings rr
+        JOIN Rental r ON r.rental_id = rr.rental_id
+        SET rr.vehicle_id = r.vehicle_id, rr.customer_id = r.customer_id
+        WHERE rr.vehicle_id IS NULL OR rr.customer_id IS NULL
+        """,
+        create_index("ReviewRatings", "idx_review_vehicle_feed", "vehicle_id, review_date, review_id"),
+        create_index("ReviewRatings", "idx_review_customer_feed", "customer_id, review_date, review_id"),
+    )),
+    ("0004_vehicle_rating_summary", (
+        # Review count and score total per vehicle, adjusted by every review
+        # write so averages never aggregate ReviewRatings
+        """
+        CREATE TABLE IF NOT EXISTS VehicleRatingSummary (
+            vehicle_id INT PRIMARY KEY,
+            reviews INT NOT NULL DEFAULT 0,
+            rating_total DECIMAL(12,1) NOT NULL DEFAULT 0
+        )
+        """,
+        "DELETE FROM VehicleRatingSummary",
+        """
+        INSERT INTO VehicleRatingSummary (vehicle_id, reviews, rating_total)
+        SELECT vehicle_id, COUNT(rating_score), COALESCE(SUM(rating_score), 0)
+        FROM ReviewRatings
+        WHERE vehicle_id IS NOT NULL
+        GROUP BY vehicle_id
+        """,
+    )),
+    ("0005_maintenance_cost_rollup", (
+        # Per-vehicle history in date order, and the range each rollup bucket
+        # is recomputed from
+        create_index("VehicleMaintenance", "idx_maintenance_vehicle_date", "vehicle_id, maintenance_date"),
+        # Records and cost per vehicle and calendar month, kept current by the
+        # maintenance write routes; cost reports read this instead of history
+        """
+        CREATE TABLE IF NOT EXISTS MaintenanceCostMonthly (
+            vehicle_id INT NOT NULL,
+            month_start DATE NOT NULL,
+            records INT NOT NULL,
+            total_cost DECIMAL(14,2) NOT NULL,
+            first_date DATE NOT NULL,
+            last_date DATE NOT NULL,
+            PRIMARY KEY (vehicle_id, month_start),
+            KEY idx_maintenance_cost_month (month_start)
+        )
+        """,
+        "DELETE FROM MaintenanceCostMonthly",
+        MAINTENANCE_COST_ROLLUP,
+    )),
+    ("0006_promo_pricing", (
+        # Machine-checkable promo conditions; `conditions` stays the description
+        add_column("PromoOffer", "min_days", "INT NULL"),
+        add_column("PromoOffer", "vehicle_type", "VARCHAR(50) NULL"),
+        add_column("PromoOffer", "auto_apply", "BOOLEAN NOT NULL DEFAULT TRUE"),
+        # Read them out of the existing descriptions: "minimum 7-day rental",
+        # "14 days or more", a vehicle type named in the text...
+        """
+        UPDATE PromoOffer
+        SET min_days = CAST(REGEXP_SUBSTR(REGEXP_SUBSTR(conditions, '[0-9]+[- ]days?'), '[0-9]+') AS UNSIGNED)
+        WHERE min_days IS NULL AND conditions REGEXP '[0-9]+[- ]days?'
+        """,
+        """
+        UPDATE PromoOffer p
+        JOIN (SELECT DISTINCT type FROM Vehicle WHERE type IS NOT NULL) t
+          ON p.conditions LIKE CONCAT('%', t.type, '%')
+        SET p.vehicle_type = t.type
+        WHERE p.vehicle_type IS NULL
+        """,
+        # ...and leave promos tied to the customer or a branch to be applied by
+        # hand (the doubled backslash reaches MySQL's regex as a word boundary;
+        # a single one is read as a backspace in a string literal)
+        r"""
+        UPDATE PromoOffer
+        SET auto_apply = FALSE
+        WHERE conditions REGEXP '\\b(members?|first rental|branch)\\b'
+        """,
+        # Promo applied to each booking (schema.sql has it commented out)
+        """
+        CREATE TABLE IF NOT EXISTS RentalPromo (
+            rental_id INT NOT NULL,
+            promo_id INT NOT NULL,
+            discount DECIMAL(10,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (rental_id, promo_id),
+            KEY idx_rental_promo_promo (promo_id),
+            FOREIGN KEY (rental_id) REFERENCES Rental(rental_id) ON DELETE CASCADE,
+            FOREIGN KEY (promo_id) REFERENCES PromoOffer(promo_id) ON DELETE CASCADE
+        )
+        """,
+    )),
+    ("0007_payment_reconciliation", (
+        # Covers the reconciliation's per-rental payment reads
+        create_index("Payment", "idx_payment_rental_status", "rental_id, is_successful, amount, payment_date"),
+        # Rentals whose successful payments do not match what they should have
+        # collected, replaced or cleared by each reconciliation run
+        """
+        CREATE TABLE IF NOT EXISTS PaymentException (
+            rental_id INT PRIMARY KEY,
+            kind VARCHAR(20) NOT NULL,
+            rental_status VARCHAR(20) NOT NULL,
+            pickup_date DATE NOT NULL,
+            expected DECIMAL(12,2) NOT NULL,
+            paid DECIMAL(12,2) NOT NULL,
+            difference DECIMAL(12,2) NOT NULL,
+            failed_payments INT NOT NULL DEFAULT 0,
+            last_payment_date DATE NULL,
+            detected_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            KEY idx_payment_exception_kind (kind, rental_id),
+            FOREIGN KEY (rental_id) REFERENCES Rental(rental_id) ON DELETE CASCADE
+        )
+        """,
+    )),
+    ("0008_rental_promo_percent", (
+        # The discount as booked, so the price on return does not change when
+        # the promo is edited afterwards
+        add_column("RentalPromo", "discount_percent", "INT NOT NULL DEFAULT 0"),
+        """
+        UPDATE RentalPromo rp
+        JOIN PromoOffer p ON p.promo_id = rp.promo_id
+        SET rp.discount_percent = p.discount_percent
+        WHERE rp.discount_percent = 0
+        """,
+    )),
+]
+
+
+def apply_migrations(connection) -> List[str]:
+    """Apply pending migrations in order; returns the names applied."""
+    cursor = connection.cursor()
+    applied = []
+    try:
+        # Several processes may start at once; one applies, the others wait
+        cursor.execute("SELECT GET_LOCK('car_rental_migrations', 30)")
+        cursor.fetchone()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS SchemaMigration (
+                name VARCHAR(100) PRIMARY KEY,
+                applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("SELECT name FROM SchemaMigration")
+        done = {row[0] for row in cursor.fetchall()}
+        for name, steps in MIGRATIONS:
+            if name in done:
+                continue
+            logger.info("Applying migration %s", name)
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            cursor.execute("INSERT INTO SchemaMigration (name) VALUES (%s)", (name,))
+            connection.commit()
+            applied.append(name)
+    finally:
+        try:
+            cursor.execute("SELECT RELEASE_LOCK('car_rental_migrations')")
+            cursor.fetchone()
+        finally:
+            cursor.close()
+    return applied
@@ -0,0 +1,223 @@
+'''
+Optional read replica for heavy, read-only queries.
+
+Nothing changes until configure() is given a replica server. After that,
+connect_db() hands out replica connections inside use_replica() blocks and
+routes decorated with reads_from_replica(); everything else, including all
+writes, keeps using the primary.
+
+A replica read falls back to the primary when:
+  * the replica cannot be reached, or its replication is stopped or more than
+    `max_lag` seconds behind (checked at most every `check_interval` seconds
+    with SHOW REPLICA STATUS), or
+  * one of the tables the read declares was written within the last `max_lag`
+    seconds (read-after-write), per the clock set with set_write_clock().
+
+A server that reports no replication status at all (e.g. a plain second
+instance standing in for a replica in development) is treated as current.
+'''
+
+import functools
+import inspect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import mysql.connector
+from mysql.connector import pooling
+
+logger = logging.getLogger(__name__)
+
+# Tables the current read declared, or None when it should use the primary
+_replica_tables: ContextVar[Optional[Tuple[str, ...]]] = ContextVar("db_replica_tables", default=None)
+
+
+class ReplicaRouter:
+    """Replica pool plus the health state used to decide whether to use it."""
+
+    def __init__(self):
+        self.config: Optional[Dict] = None
+        self.pool_size = 10
+        self.max_lag = 5.0
+        self.check_interval = 5.0
+        self.pool = None
+        self.lag: Optional[float] = None
+        self.healthy = False
+        self.checked_at = 0.0
+        self.last_error: Optional[str] = None
+        self.counts = {"replica": 0, "primary_stale": 0, "primary_recent_write": 0, "primary_error": 0}
+        self._write_clock: Optional[Callable[[Iterable[str]], float]] = None
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.config is not None
+
+    def configure(
+        self,
+        config: Optional[Dict],
+        pool_size: int = 10,
+        max_lag: float = 5.0,
+        check_interval: float = 5.0,
+    ) -> None:
+        """Set (or with None, remove) the replica's connection settings."""
+        self.dispose()
+        self.config = dict(config) if config else None
+        self.pool_size = pool_size
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.checked_at = 0.0
+
+    def set_write_clock(self, clock: Optional[Callable[[Iterable[str]], float]]) -> None:
+        """`clock(tables)` returns the epoch time of the latest committed write to any of them."""
+        self._write_clock = clock
+
+    def dispose(self) -> None:
+        """Drop the pool (e.g. before forking); it is rebuilt on next use."""
+        with self._lock:
+            if self.pool is not None:
+                try:
+                    self.pool._remove_connections()
+                except Exception:
+                    pass
+            self.pool = None
+
+    # ── health ────────────────────────────────────────────────────────────────
+
+    def _connect(self):
+        with self._lock:
+            if self.pool is None:
+                try:
+                    self.pool = pooling.MySQLConnectionPool(
+                        pool_name="car_rental_replica_pool",
+                        pool_size=self.pool_size,
+                        **self.config,
+                    )
+                except mysql.connector.Error:
+                    return mysql.connector.connect(**self.config)
+            pool = self.pool
+        try:
+            return pool.get_connection()
+        except pooling.PoolError:
+            # Pool exhausted: a direct connection beats falling back to the primary
+            return mysql.connector.connect(**self.config)
+
+    def _measure_lag(self) -> Optional[float]:
+        conn = self._connect()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except mysql.connector.Error:
+                cursor.execute("SHOW SLAVE STATUS")  # MySQL < 8.0.22
+            row = cursor.fetchone()
+            cursor.close()
+        finally:
+            conn.close()
+        if row is None:
+            return 0.0  # not replicating from anything
+        lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+        return None if lag is None else float(lag)  # NULL: replication stopped
+
+    def check(self, force: bool = False) -> None:
+        """Refresh lag/health if the last check is older than check_interval."""
+        if not force and time.monotonic() - self.checked_at < self.check_interval:
+            return
+        # One thread measures; the others keep using the previous verdict
+        if not self._check_lock.acquire(blocking=force):
+            return
+        try:
+            try:
+                self.lag = self._measure_lag()
+                self.last_error = None if self.lag is not None else "replication is not running"
+            except mysql.connector.Error as e:
+                self.lag = None
+                self.last_error = str(e)
+            self.healthy = self.lag is not None and self.lag <= self.max_lag
+            if not self.healthy:
+                logger.warning("Replica unavailable (lag=%s, %s); reading from primary", self.lag, self.last_error)
+            self.checked_at = time.monotonic()
+        finally:
+            self._check_lock.release()
+
+    # ── routing ───────────────────────────────────────────────────────────────
+
+    def connection_for(self, tables: Tuple[str, ...]):
+        """A replica connection for a read of `tables`, or None to use the primary."""
+        if not self.enabled:
+            return None
+        self.check()
+        if not self.healthy:
+            self.counts["primary_stale"] += 1
+            return None
+        # Tables not written since boot report the boot time, so reads stay on
+        # the primary for the first max_lag seconds after a restart
+        if tables and self._write_clock is not None:
+            if time.time() - self._write_clock(tables) < self.max_lag:
+                self.counts["primary_recent_write"] += 1
+                return None
+        try:
+            conn = self._connect()
+        except mysql.connector.Error as e:
+            self.healthy = False
+            self.last_error = str(e)
+            self.counts["primary_error"] += 1
+            return None
+        self.counts["replica"] += 1
+        return conn
+
+    def status(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "host": self.config.get("host") if self.config else None,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "max_lag_seconds": self.max_lag,
+            "checked_seconds_ago": round(time.monotonic() - self.checked_at, 1) if self.checked_at else None,
+            "last_error": self.last_error,
+            "reads": dict(self.counts),
+        }
+
+
+replica = ReplicaRouter()
+
+
+def replica_tables() -> Optional[Tuple[str, ...]]:
+    """Tables declared by the enclosing use_replica() block, or None outside one."""
+    return _replica_tables.get()
+
+
+@contextmanager
+def use_replica(*tables: str):
+    """
+    Send reads made by connect_db() in this block to the replica.
+
+    `tables` are the tables the reads depend on; a recent write to any of them
+    keeps the reads on the primary. Only wrap code that does not write.
+    """
+    token = _replica_tables.set(tuple(tables))
+    try:
+        yield
+    finally:
+        _replica_tables.reset(token)
+
+
+def reads_from_replica(*tables: str):
+    """Decorator form of use_replica() for read-only route handlers (sync or async)."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with use_replica(*tables):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with use_replica(*tables):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorator
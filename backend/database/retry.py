@@ -0,0 +1,156 @@
+'''
+Retry of transient MySQL errors with jittered exponential backoff.
+
+run_transaction() runs a unit of work in an explicit transaction on a fresh
+connection and re-runs it when it fails with an error that left nothing
+committed:
+
+  * deadlock (1213): InnoDB rolled the transaction back; retried a few times
+    with short delays, since the competing transaction usually finishes fast.
+  * lock wait timeout (1205): only the statement was rolled back, so the whole
+    transaction is rolled back and retried; few attempts, the wait itself was
+    already innodb_lock_wait_timeout long.
+  * lost connection (2013, 2006): the server drops an open transaction with
+    the session, so a failure before COMMIT is retried on a new connection.
+    If the connection is lost *during* COMMIT the outcome is unknown, and the
+    work is only re-run when the caller declared it idempotent.
+
+Anything else (including HTTPException raised by the work) rolls back and
+propagates on the first attempt. Retries are counted per operation and error
+class for /metrics.
+'''
+
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+import mysql.connector
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+ER_LOCK_WAIT_TIMEOUT = 1205
+ER_LOCK_DEADLOCK = 1213
+CR_SERVER_GONE_ERROR = 2006
+CR_SERVER_LOST = 2013
+
+
+class RetryPolicy:
+    """How often and how long to back off for one class of error."""
+
+    def __init__(self, attempts: int, base_delay: float, max_delay: float):
+        self.attempts = attempts        # total tries, including the first
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, retry: int) -> float:
+        """Full-jitter backoff before retry number `retry` (1-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+
+# errno -> (error class, policy)
+POLICIES: Dict[int, Tuple[str, RetryPolicy]] = {
+    ER_LOCK_DEADLOCK: ("deadlock", RetryPolicy(attempts=4, base_delay=0.02, max_delay=0.5)),
+    ER_LOCK_WAIT_TIMEOUT: ("lock_wait_timeout", RetryPolicy(attempts=2, base_delay=0.1, max_delay=1.0)),
+    CR_SERVER_LOST: ("lost_connection", RetryPolicy(attempts=3, base_delay=0.05, max_delay=1.0)),
+    CR_SERVER_GONE_ERROR: ("lost_connection", RetryPolicy(attempts=3, base_delay=0.05, max_delay=1.0)),
+}
+
+_LOST_CONNECTION = (CR_SERVER_LOST, CR_SERVER_GONE_ERROR)
+
+# (operation, error class, outcome) -> count; outcome is retried/exhausted/unsafe
+_stats: Dict[Tuple[str, str, str], int] = {}
+_stats_lock = threading.Lock()
+
+
+def _count(operation: str, error_class: str, outcome: str) -> None:
+    with _stats_lock:
+        key = (operation, error_class, outcome)
+        _stats[key] = _stats.get(key, 0) + 1
+
+
+def retry_stats() -> Dict[Tuple[str, str, str], int]:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
+
+
+def classify(error: BaseException) -> Optional[Tuple[str, RetryPolicy]]:
+    """(error class, policy) for a retryable MySQL error, else None."""
+    if not isinstance(error, mysql.connector.Error):
+        return None
+    return POLICIES.get(error.errno)
+
+
+def _rollback(db) -> None:
+    try:
+        db.rollback()
+    except mysql.connector.Error:
+        pass  # the connection is gone; the server already discarded the transaction
+
+
+def _close(db) -> None:
+    try:
+        db.close()
+    except mysql.connector.Error:
+        pass
+
+
+def run_transaction(
+    work: Callable[..., T],
+    operation: str,
+    idempotent: bool = False,
+    connect: Optional[Callable] = None,
+) -> T:
+    """
+    Run `work(cursor)` in a transaction, committing its result and retrying
+    transient failures. `work` must only touch the database through the
+    cursor it is given (it may run more than once) and should raise to abort.
+    """
+    if connect is None:
+        from .connection import connect_db as connect
+    tries: Dict[str, int] = {}
+    while True:
+        db = connect()
+        cursor = None
+        committing = False
+        try:
+            db.start_transaction()
+            cursor = db.cursor()
+            result = work(cursor)
+            committing = True
+            db.commit()
+            return result
+        except Exception as e:
+            _rollback(db)
+            verdict = classify(e)
+            if verdict is None:
+                raise
+            error_class, policy = verdict
+            if committing and e.errno in _LOST_CONNECTION and not idempotent:
+                # COMMIT may have reached the server; re-running could apply it twice
+                _count(operation, error_class, "unsafe")
+                raise
+            tries[error_class] = tries.get(error_class, 1) + 1
+            if tries[error_class] > policy.attempts:
+                _count(operation, error_class, "exhausted")
+                logger.warning("%s: giving up after %d attempts (%s)", operation, policy.attempts, e)
+                raise
+            _count(operation, error_class, "retried")
+            delay = policy.delay(tries[error_class] - 1)
+            logger.info("%s: %s, retrying in %.0f ms", operation, error_class, delay * 1000)
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except mysql.connector.Error:
+                    pass
+            _close(db)
+        time.sleep(delay)
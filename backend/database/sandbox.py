@@ -0,0 +1,208 @@
+'''
+Throwaway local MySQL server for plan checks and benchmarks.
+
+LocalMySQL initializes a fresh data directory under a temp dir, starts
+`mysqld` on a free loopback port (no container needed, only the server
+binary on PATH or given explicitly) and removes everything on stop().
+It can also be pointed at an existing server through `external` connection
+settings, in which case start()/stop() only create and drop the database.
+'''
+
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import mysql.connector
+
+
+class SandboxError(Exception):
+    """Raised when the sandbox server cannot be started or prepared."""
+    pass
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalMySQL:
+    """
+    Start a disposable mysqld, or borrow an external server.
+
+    Args:
+        mysqld: Server binary (defaults to $MYSQLD or `mysqld` on PATH).
+        database: Schema to create for the run.
+        external: Connection settings (host/port/user/password) of an already
+            running server; when given no mysqld process is started.
+        keep: Leave the data directory in place after stop() for inspection.
+    """
+
+    def __init__(
+        self,
+        mysqld: Optional[str] = None,
+        database: str = "car_rental_sandbox",
+        external: Optional[Dict] = None,
+        keep: bool = False,
+    ):
+        self.mysqld = mysqld or os.getenv("MYSQLD") or shutil.which("mysqld")
+        self.database = database
+        self.external = external
+        self.keep = keep
+        self.base_dir: Optional[Path] = None
+        self.port: Optional[int] = None
+        self.process: Optional[subprocess.Popen] = None
+
+    # ── lifecycle ─────────────────────────────────────────────────────────────
+
+    def start(self, timeout: float = 60.0) -> "LocalMySQL":
+        if self.external is None:
+            self._start_server(timeout)
+        self._wait_ready(timeout)
+        conn = mysql.connector.connect(**self.server_config())
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"DROP DATABASE IF EXISTS `{self.database}`")
+            cursor.execute(f"CREATE DATABASE `{self.database}`")
+            cursor.close()
+        finally:
+            conn.close()
+        return self
+
+    def stop(self) -> None:
+        if self.external is not None:
+            try:
+                conn = mysql.connector.connect(**self.server_config())
+                conn.cursor().execute(f"DROP DATABASE IF EXISTS `{self.database}`")
+                conn.close()
+            except mysql.connector.Error:
+                pass
+            return
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+        if self.base_dir is not None and not self.keep:
+            shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ── connection settings ───────────────────────────────────────────────────
+
+    def server_config(self) -> Dict:
+        """Settings for connecting to the server without selecting a schema."""
+        if self.external is not None:
+            config = dict(self.external)
+            config.pop("database", None)
+            return config
+        return {"host": "127.0.0.1", "port": self.port, "user": "root", "password": ""}
+
+    def config(self) -> Dict:
+        """Settings for database.connection.configure() / mysql.connector."""
+        return {**self.server_config(), "database": self.database}
+
+    def environ(self) -> Dict[str, str]:
+        """DB_* environment variables for child processes (e.g. uvicorn)."""
+        config = self.config()
+        return {
+            "DB_HOST": str(config.get("host", "127.0.0.1")),
+            "DB_PORT": str(config.get("port", 3306)),
+            "DB_USER": str(config.get("user", "root")),
+            "DB_PASSWORD": str(config.get("password", "")),
+            "DB_NAME": self.database,
+        }
+
+    def connect(self):
+        return mysql.connector.connect(**self.config())
+
+    # ── schema and data ───────────────────────────────────────────────────────
+
+    def load_schema(self, scripts=("schema.sql", "auth.sql", "views.sql")) -> None:
+        """Run the repo's SQL scripts, then the migrations, against the sandbox database."""
+        from .migrations import apply_migrations
+        from .setup import execute_sql_script, read_sql_file
+
+        sql_dir = Path(__file__).parent.parent / "sql"
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            for name in scripts:
+                execute_sql_script(cursor, read_sql_file(sql_dir / name), name)
+                conn.commit()
+            cursor.close()
+            apply_migrations(conn)
+        finally:
+            conn.close()
+
+    def analyze(self) -> None:
+        """Refresh index statistics so EXPLAIN reflects the loaded data."""
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT table_name FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_type = 'BASE TABLE'"
+            )
+            tables = [row[0] for row in cursor.fetchall()]
+            for table in tables:
+                cursor.execute(f"ANALYZE TABLE `{table}`")
+                cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+
+    # ── internals ─────────────────────────────────────────────────────────────
+
+    def _start_server(self, timeout: float) -> None:
+        if not self.mysqld:
+            raise SandboxError("mysqld not found; install MySQL server or set MYSQLD")
+        self.base_dir = Path(tempfile.mkdtemp(prefix="car-rental-mysql-"))
+        datadir = self.base_dir / "data"
+        self.port = _free_port()
+        common = [f"--datadir={datadir}", "--user=" + (os.getenv("USER") or "root")]
+
+        init = subprocess.run(
+            [self.mysqld, "--no-defaults", *common, "--initialize-insecure"],
+            capture_output=True, text=True, timeout=timeout,
+        )
+        if init.returncode != 0:
+            raise SandboxError(f"mysqld --initialize-insecure failed:\n{init.stderr}")
+
+        log = open(self.base_dir / "mysqld.log", "w")
+        self.process = subprocess.Popen(
+            [
+                self.mysqld, "--no-defaults", *common,
+                f"--port={self.port}", "--bind-address=127.0.0.1",
+                f"--socket={self.base_dir / 'mysqld.sock'}",
+                f"--pid-file={self.base_dir / 'mysqld.pid'}",
+                "--mysqlx=OFF", "--skip-log-bin",
+                "--innodb-buffer-pool-size=256M", "--innodb-flush-log-at-trx-commit=2",
+            ],
+            stdout=log, stderr=subprocess.STDOUT,
+        )
+
+    def _wait_ready(self, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        last_error = None
+        while time.monotonic() < deadline:
+            if self.process is not None and self.process.poll() is not None:
+                raise SandboxError(f"mysqld exited early; see {self.base_dir / 'mysqld.log'}")
+            try:
+                mysql.connector.connect(connect_timeout=2, **self.server_config()).close()
+                return
+            except mysql.connector.Error as e:
+                last_error = e
+                time.sleep(0.5)
+        raise SandboxError(f"MySQL not reachable after {timeout:.0f}s: {last_error}")
@@ -0,0 +1,160 @@
+'''
+Server-side prepared statements, cached per pooled connection.
+
+The routes send the same few SQL strings on every request. Executing them
+through prepared cursors saves the server's parse/plan work and sends only
+the parameters over the wire. Each physical pooled connection keeps an LRU
+of prepared cursors keyed by SQL text (and row format); InstrumentedCursor
+routes eligible statements through it transparently.
+
+The cache is off by default (DB_STATEMENT_CACHE_SIZE=0) until it has been
+measured against a real server; enable it to experiment.
+
+Notes:
+  * The pools keep resetting the session when a connection goes back, so
+    transaction and session state never reach the next borrower. A reset
+    deallocates every prepared statement, so a cache only lives for one
+    checkout: InstrumentedConnection.close() drops it, and the savings come
+    from statements repeated within a request or job.
+  * A cached cursor is leased to the InstrumentedCursor that executed it
+    until that cursor runs another statement or closes. Another cursor
+    asking for the same SQL meanwhile runs it as plain text instead of
+    overwriting the first cursor's result.
+  * Statements the server refuses to prepare (ER_UNSUPPORTED_PS), or that use
+    `%%` escapes or `?` literals, run as plain text as before.
+
+DB_STATEMENT_CACHE_SIZE sets the per-checkout bound; 0 disables the cache.
+'''
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import mysql.connector
+
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "0"))
+
+# Server says the statement cannot be prepared
+ER_UNSUPPORTED_PS = 1295
+
+_PREPARABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+
+# SQL texts that failed to prepare; bounded so ad-hoc SQL cannot grow it forever
+_unpreparable: "OrderedDict[str, None]" = OrderedDict()
+_UNPREPARABLE_LIMIT = 1024
+_unpreparable_lock = threading.Lock()
+
+stats = {"hits": 0, "misses": 0, "evictions": 0, "contended": 0, "fallbacks": 0}
+
+
+def enabled() -> bool:
+    return STATEMENT_CACHE_SIZE > 0
+
+
+def is_preparable(sql, params) -> bool:
+    if not isinstance(sql, str) or not isinstance(params, (tuple, list, type(None))):
+        return False
+    if "%%" in sql or "?" in sql:
+        return False
+    words = sql.lstrip().split(None, 1)
+    if not words or words[0].upper() not in _PREPARABLE:
+        return False
+    return sql not in _unpreparable
+
+
+def mark_unpreparable(sql: str) -> None:
+    with _unpreparable_lock:
+        _unpreparable[sql] = None
+        if len(_unpreparable) > _UNPREPARABLE_LIMIT:
+            _unpreparable.popitem(last=False)
+    stats["fallbacks"] += 1
+
+
+class StatementCache:
+    """LRU of prepared cursors for one checkout of a pooled connection."""
+
+    def __init__(self, connection, size: int):
+        self.connection = connection
+        self.size = size
+        self._cursors: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._leases: Dict[tuple, object] = {}
+
+    def acquire(self, sql: str, dictionary: bool, owner) -> Optional[tuple]:
+        """
+        (sql, cursor) for `sql`, leased to `owner`; None while another cursor
+        still holds that statement's result.
+        """
+        key = (sql, dictionary)
+        holder = self._leases.get(key)
+        if holder is not None and holder is not owner:
+            stats["contended"] += 1
+            return None
+        entry = self.cursor_for(sql, dictionary)
+        self._leases[key] = owner
+        return entry
+
+    def release(self, sql: str, dictionary: bool, owner) -> None:
+        key = (sql, dictionary)
+        if self._leases.get(key) is owner:
+            del self._leases[key]
+
+    def cursor_for(self, sql: str, dictionary: bool):
+        """
+        Return (sql, cursor) for `sql`. The returned `sql` is the exact object
+        the statement was prepared with: the connector only reuses a prepared
+        statement when it is passed the identical string again.
+        """
+        key = (sql, dictionary)
+        entry = self._cursors.get(key)
+        if entry is not None:
+            self._cursors.move_to_end(key)
+            stats["hits"] += 1
+            return entry
+        stats["misses"] += 1
+        # Evict the least recently used statements no cursor is reading from;
+        # if every one is leased the cache runs over its bound until released
+        for old_key in list(self._cursors):
+            if len(self._cursors) < self.size:
+                break
+            if old_key in self._leases:
+                continue
+            _, old = self._cursors.pop(old_key)
+            stats["evictions"] += 1
+            try:
+                old.close()  # deallocates the statement on the server
+            except mysql.connector.Error:
+                pass
+        entry = (sql, self.connection.cursor(prepared=True, dictionary=dictionary or None))
+        self._cursors[key] = entry
+        return entry
+
+    def discard(self, sql: str, dictionary: bool) -> None:
+        self._leases.pop((sql, dictionary), None)
+        entry = self._cursors.pop((sql, dictionary), None)
+        if entry is not None:
+            try:
+                entry[1].close()
+            except mysql.connector.Error:
+                pass
+
+    def __len__(self):
+        return len(self._cursors)
+
+
+def statement_cache(connection) -> Optional[StatementCache]:
+    """
+    A statement cache for this checkout of a pooled connection, or None when
+    caching does not apply (disabled, or a one-off connection that is closed
+    after use).
+    """
+    if not enabled():
+        return None
+    cnx = getattr(connection, "_cnx", None)  # PooledMySQLConnection -> physical connection
+    if cnx is None:
+        return None
+    return StatementCache(cnx, STATEMENT_CACHE_SIZE)
+
+
+def cache_stats() -> Dict[str, int]:
+    return dict(stats, size=STATEMENT_CACHE_SIZE)
@@ -4,7 +4,7 @@
 SET FOREIGN_KEY_CHECKS = 0;
 DROP TRIGGER IF EXISTS trg_calc_late_duration_insert;
 DROP TRIGGER IF EXISTS trg_calc_late_duration_update;
-DROP TABLE IF EXISTS ReviewRatings, RentalPromo, PromoOffer, LoyaltyProgram, VehicleMaintenance, Payment, Rental, Staff, Customer, Vehicle, Branch;
+DROP TABLE IF EXISTS SchemaMigration, PaymentException, MaintenanceCostMonthly, VehicleRatingSummary, JobWatermark, LoyaltyTierCount, LoyaltyLedger, ReviewRatings, RentalPromo, PromoOffer, LoyaltyProgram, VehicleMaintenance, Payment, Rental, Staff, Customer, Vehicle, Branch;
 SET FOREIGN_KEY_CHECKS = 1;
 
 -- =====================================
@@ -0,0 +1,103 @@
+"""
+PUT /api/loyalty/{customer_id}/points over a fake connection: the handler
+runs through run_transaction, passes its 404 through and retries a deadlock.
+
+Run from the backend directory:
+    python -m unittest discover -s tests -t .
+"""
+
+import inspect
+import os
+import unittest
+from datetime import date
+from unittest import mock
+
+# Importing the routes pulls in settings, which refuses to load without a key
+os.environ.setdefault("SECRET_KEY", "unit-test-only-secret-key-0000000000000000")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.routes import loyalty
+from api.routes.auth import get_current_active_user
+from database import retry
+from tests.test_retry import FakeConnection, mysql_error
+
+
+class ScriptedConnection(FakeConnection):
+    """FakeConnection whose cursor returns `row` for the program lookup."""
+
+    def __init__(self, row, fail_on=None):
+        super().__init__()
+        self.row = row
+        self.fail_on = fail_on
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            lastrowid = None
+
+            def execute(self, sql, params=None):
+                connection.statements.append(" ".join(sql.split()))
+                if connection.fail_on and connection.fail_on in sql:
+                    raise connection.fail_on_error
+
+            def fetchone(self):
+                return connection.row
+
+            def close(self):
+                pass
+
+        return Cursor()
+
+
+class UpdatePointsTest(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI()
+        app.include_router(loyalty.router, prefix="/api/loyalty")
+        app.dependency_overrides[get_current_active_user] = lambda: {"username": "test"}
+        self.client = TestClient(app)
+        self.connections = []
+        patches = [
+            mock.patch("database.connection.connect_db", side_effect=self.connect),
+            mock.patch.object(retry.time, "sleep"),
+            mock.patch.object(loyalty, "bump_version"),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.script = []
+
+    def connect(self):
+        connection = self.script.pop(0)
+        self.connections.append(connection)
+        return connection
+
+    def test_handler_is_sync_so_retries_do_not_block_the_event_loop(self):
+        self.assertFalse(inspect.iscoroutinefunction(loyalty.update_points_balance))
+
+    def test_missing_program_is_404(self):
+        self.script = [ScriptedConnection(row=None)]
+        response = self.client.put("/api/loyalty/42/points?points_change=10")
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(self.connections[0].rolled_back)
+        self.assertFalse(self.connections[0].committed)
+
+    def test_deadlock_is_retried_and_applied_once(self):
+        row = (7, 900, "Bronze", date(2026, 1, 1))
+        first = ScriptedConnection(row=row, fail_on="UPDATE LoyaltyProgram")
+        first.fail_on_error = mysql_error(retry.ER_LOCK_DEADLOCK)
+        self.script = [first, ScriptedConnection(row=row)]
+
+        response = self.client.put("/api/loyalty/42/points?points_change=150")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["points_balance"], 1050)
+        self.assertEqual(response.json()["membership_tier"], "Silver")
+        self.assertTrue(first.rolled_back and not first.committed)
+        self.assertTrue(self.connections[1].committed)
+        self.assertEqual(len(self.connections), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
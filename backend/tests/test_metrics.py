@@ -0,0 +1,71 @@
+"""
+Prefork metrics aggregation: /metrics merges every worker's snapshot, and a
+retired worker's counts are folded into retired.json without going backwards.
+
+Run from the backend directory:
+    python -m unittest discover -s tests -t .
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from api.core import metrics
+from database.instrumentation import RequestStats
+
+
+def request_count(text: str) -> int:
+    found = re.findall(r'http_request_duration_seconds_count\{method="GET",route="/x",status="200"\} (\d+)', text)
+    return sum(int(value) for value in found)
+
+
+class PreforkMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.addCleanup(metrics.registry.reset)
+        patcher = mock.patch.object(metrics, "_export_dir", self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def worker_file(self, pid: int, requests: int) -> None:
+        """Snapshot of another worker that served `requests` GET /x."""
+        metrics.registry.reset()
+        for _ in range(requests):
+            metrics.registry.observe("GET", "/x", 200, 0.01, RequestStats())
+        with open(os.path.join(self.directory, f"{pid}-1.json"), "w") as f:
+            json.dump(metrics.snapshot(), f)
+        metrics.registry.reset()
+
+    def test_scrape_sums_every_worker(self):
+        self.worker_file(101, 3)
+        self.worker_file(102, 4)
+        metrics.registry.observe("GET", "/x", 200, 0.01, RequestStats())
+        self.assertEqual(request_count(metrics.render_metrics()), 8)
+
+    def test_retired_worker_still_counts(self):
+        self.worker_file(101, 3)
+        self.worker_file(102, 4)
+        before = request_count(metrics.render_metrics())
+        metrics.retire_worker(self.directory, 101)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "101-1.json")))
+        self.assertEqual(request_count(metrics.render_metrics()), before)
+
+        # Merged again later, next to a retired.json that already lists it
+        self.worker_file(103, 2)
+        metrics.retire_worker(self.directory, 103)
+        self.assertEqual(request_count(metrics.render_metrics()), before + 2)
+
+    def test_file_left_behind_after_merge_is_not_counted_twice(self):
+        self.worker_file(101, 3)
+        metrics.retire_worker(self.directory, 101)
+        self.worker_file(101, 3)  # e.g. listed before the parent removed it
+        self.assertEqual(request_count(metrics.render_metrics()), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
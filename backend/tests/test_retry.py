@@ -0,0 +1,176 @@
+"""
+Failure injection for database.retry.run_transaction.
+
+A fake connection raises MySQL errors at chosen points (in the work, or at
+COMMIT) so each retry policy and the idempotency rule can be checked without
+a server.
+
+Run from the backend directory:
+    python -m unittest discover -s tests -t .
+"""
+
+import unittest
+from unittest import mock
+
+import mysql.connector
+from fastapi import HTTPException
+
+from database import retry
+from database.retry import (
+    CR_SERVER_GONE_ERROR, CR_SERVER_LOST, ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT, run_transaction,
+)
+
+
+def mysql_error(errno: int) -> mysql.connector.Error:
+    return mysql.connector.errors.DatabaseError(msg=f"injected {errno}", errno=errno)
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.closed = False
+
+    def execute(self, sql, params=None):
+        self.connection.statements.append(sql)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    """Records the transaction calls; `fail_commit` is raised from commit()."""
+
+    def __init__(self, fail_commit=None):
+        self.fail_commit = fail_commit
+        self.statements = []
+        self.started = self.committed = self.rolled_back = self.closed = False
+
+    def start_transaction(self):
+        self.started = True
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        if self.fail_commit is not None:
+            raise self.fail_commit
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def close(self):
+        self.closed = True
+
+
+class Harness:
+    """Hands out a fresh FakeConnection per attempt and scripts the failures."""
+
+    def __init__(self, work_errors=(), commit_errors=()):
+        self.work_errors = list(work_errors)
+        self.commit_errors = list(commit_errors)
+        self.connections = []
+
+    def connect(self):
+        attempt = len(self.connections)
+        fail_commit = self.commit_errors[attempt] if attempt < len(self.commit_errors) else None
+        connection = FakeConnection(fail_commit)
+        self.connections.append(connection)
+        return connection
+
+    def work(self, cursor):
+        cursor.execute("UPDATE Vehicle SET status = 'Rented' WHERE vehicle_id = %s")
+        attempt = len(self.connections) - 1
+        if attempt < len(self.work_errors) and self.work_errors[attempt] is not None:
+            raise self.work_errors[attempt]
+        return "done"
+
+
+class RunTransactionTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(retry.time, "sleep")
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+        self._stats = mock.patch.dict(retry._stats, clear=True)
+        self._stats.start()
+        self.addCleanup(self._stats.stop)
+
+    def run_work(self, harness, idempotent=False):
+        return run_transaction(harness.work, "test_op", idempotent=idempotent, connect=harness.connect)
+
+    def test_success_commits_once(self):
+        harness = Harness()
+        self.assertEqual(self.run_work(harness), "done")
+        self.assertEqual(len(harness.connections), 1)
+        connection = harness.connections[0]
+        self.assertTrue(connection.started and connection.committed and connection.closed)
+        self.assertFalse(connection.rolled_back)
+        self.sleep.assert_not_called()
+
+    def test_deadlock_is_retried_on_a_new_connection(self):
+        harness = Harness(work_errors=[mysql_error(ER_LOCK_DEADLOCK), mysql_error(ER_LOCK_DEADLOCK)])
+        self.assertEqual(self.run_work(harness), "done")
+        self.assertEqual(len(harness.connections), 3)
+        self.assertTrue(all(c.rolled_back and c.closed for c in harness.connections[:2]))
+        self.assertTrue(harness.connections[2].committed)
+        self.assertEqual(self.sleep.call_count, 2)
+        self.assertEqual(retry.retry_stats(), {("test_op", "deadlock", "retried"): 2})
+
+    def test_deadlock_gives_up_after_policy_attempts(self):
+        attempts = retry.POLICIES[ER_LOCK_DEADLOCK][1].attempts
+        harness = Harness(work_errors=[mysql_error(ER_LOCK_DEADLOCK)] * (attempts + 1))
+        with self.assertRaises(mysql.connector.Error) as raised:
+            self.run_work(harness)
+        self.assertEqual(raised.exception.errno, ER_LOCK_DEADLOCK)
+        self.assertEqual(len(harness.connections), attempts)
+        self.assertEqual(retry.retry_stats()[("test_op", "deadlock", "exhausted")], 1)
+
+    def test_lock_wait_timeout_has_its_own_budget(self):
+        attempts = retry.POLICIES[ER_LOCK_WAIT_TIMEOUT][1].attempts
+        harness = Harness(work_errors=[mysql_error(ER_LOCK_WAIT_TIMEOUT)] * attempts)
+        with self.assertRaises(mysql.connector.Error):
+            self.run_work(harness)
+        self.assertEqual(len(harness.connections), attempts)
+
+        # A deadlock in between does not use up the lock-wait budget
+        harness = Harness(work_errors=[mysql_error(ER_LOCK_WAIT_TIMEOUT), mysql_error(ER_LOCK_DEADLOCK)])
+        self.assertEqual(self.run_work(harness), "done")
+
+    def test_lost_connection_before_commit_is_retried(self):
+        for errno in (CR_SERVER_LOST, CR_SERVER_GONE_ERROR):
+            harness = Harness(work_errors=[mysql_error(errno)])
+            self.assertEqual(self.run_work(harness, idempotent=False), "done")
+            self.assertEqual(len(harness.connections), 2)
+
+    def test_lost_connection_during_commit_is_not_retried_unless_idempotent(self):
+        harness = Harness(commit_errors=[mysql_error(CR_SERVER_LOST)])
+        with self.assertRaises(mysql.connector.Error):
+            self.run_work(harness, idempotent=False)
+        self.assertEqual(len(harness.connections), 1)
+        self.assertEqual(retry.retry_stats(), {("test_op", "lost_connection", "unsafe"): 1})
+
+        harness = Harness(commit_errors=[mysql_error(CR_SERVER_LOST)])
+        self.assertEqual(self.run_work(harness, idempotent=True), "done")
+        self.assertEqual(len(harness.connections), 2)
+        self.assertTrue(harness.connections[1].committed)
+
+    def test_other_errors_roll_back_and_propagate_immediately(self):
+        for error in (mysql_error(1062), HTTPException(status_code=404, detail="Rental not found")):
+            harness = Harness(work_errors=[error])
+            with self.assertRaises(type(error)) as raised:
+                self.run_work(harness)
+            self.assertIs(raised.exception, error)
+            self.assertEqual(len(harness.connections), 1)
+            self.assertTrue(harness.connections[0].rolled_back)
+            self.assertFalse(harness.connections[0].committed)
+        self.sleep.assert_not_called()
+
+    def test_backoff_is_jittered_and_capped(self):
+        policy = retry.RetryPolicy(attempts=10, base_delay=0.1, max_delay=0.5)
+        for attempt in range(1, 10):
+            for _ in range(20):
+                self.assertTrue(0 <= policy.delay(attempt) <= min(0.5, 0.1 * 2 ** (attempt - 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
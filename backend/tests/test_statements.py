@@ -0,0 +1,128 @@
+"""
+The prepared-statement cache over a fake pooled connection: cursors that run
+the same SQL keep their own results, leased statements are not evicted, and
+the cache does not outlive the checkout.
+
+Run from the backend directory:
+    python -m unittest discover -s tests -t .
+"""
+
+import unittest
+from unittest import mock
+
+from database import statements
+from database.instrumentation import InstrumentedConnection
+
+SQL = "SELECT name FROM Customer WHERE customer_id = %s"
+
+
+class FakeCursor:
+    """Unbuffered-style cursor: execute() replaces the pending result."""
+
+    def __init__(self, physical, prepared):
+        self.physical = physical
+        self.prepared = prepared
+        self.rows = []
+        self.with_rows = False
+        self.rowcount = -1
+        self.closed = False
+
+    def execute(self, sql, params=None):
+        self.physical.executed.append((sql, self.prepared))
+        self.rows = [(f"{sql.split()[1]}:{params[0]}",)] if params else []
+        self.with_rows = True
+        self.rowcount = len(self.rows)
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def close(self):
+        self.closed = True
+
+
+class FakePhysicalConnection:
+    def __init__(self):
+        self.executed = []
+        self.prepared_cursors = []
+
+    def cursor(self, prepared=False, dictionary=None):
+        cursor = FakeCursor(self, prepared)
+        if prepared:
+            self.prepared_cursors.append(cursor)
+        return cursor
+
+
+class FakePooledConnection:
+    """Stands in for PooledMySQLConnection: `_cnx` is the physical connection."""
+
+    def __init__(self):
+        self._cnx = FakePhysicalConnection()
+        self.returned = False
+
+    def cursor(self, *args, **kwargs):
+        return self._cnx.cursor()
+
+    def close(self):
+        self.returned = True
+
+
+class StatementCacheTest(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(statements, "STATEMENT_CACHE_SIZE", 2),
+            mock.patch.dict(statements.stats, {key: 0 for key in statements.stats}),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.pooled = FakePooledConnection()
+        self.connection = InstrumentedConnection(self.pooled, statements.statement_cache(self.pooled))
+
+    def test_cache_is_off_unless_configured(self):
+        with mock.patch.object(statements, "STATEMENT_CACHE_SIZE", 0):
+            self.assertIsNone(statements.statement_cache(FakePooledConnection()))
+
+    def test_two_cursors_on_the_same_sql_keep_their_own_results(self):
+        first, second = self.connection.cursor(), self.connection.cursor()
+        first.execute(SQL, (1,))
+        second.execute(SQL, (2,))
+        self.assertEqual(second.fetchall(), [("name:2",)])
+        self.assertEqual(first.fetchall(), [("name:1",)])
+        self.assertEqual(statements.stats["contended"], 1)
+        # The second cursor ran the statement as text on its own cursor
+        self.assertEqual([prepared for _, prepared in self.pooled._cnx.executed], [True, False])
+
+    def test_released_statement_is_reused_by_the_next_cursor(self):
+        first = self.connection.cursor()
+        first.execute(SQL, (1,))
+        first.close()
+        second = self.connection.cursor()
+        second.execute(SQL, (2,))
+        self.assertEqual(second.fetchall(), [("name:2",)])
+        self.assertEqual(len(self.pooled._cnx.prepared_cursors), 1)
+        self.assertEqual(statements.stats["hits"], 1)
+
+    def test_leased_statements_are_not_evicted(self):
+        reading = self.connection.cursor()
+        reading.execute(SQL, (1,))
+        other = self.connection.cursor()
+        for i in range(3):
+            other.execute(f"SELECT col{i} FROM Vehicle WHERE vehicle_id = %s", (i,))
+        self.assertFalse(self.pooled._cnx.prepared_cursors[0].closed)
+        self.assertEqual(reading.fetchall(), [("name:1",)])
+
+    def test_cache_ends_with_the_checkout(self):
+        cursor = self.connection.cursor()
+        cursor.execute(SQL, (1,))
+        cursor.close()
+        self.connection.close()
+        self.assertTrue(self.pooled.returned)
+        self.assertIsNone(self.connection._statements)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -50,30 +50,25 @@ export default function Dashboard() {
   useEffect(() => {
     const load = async () => {
       try {
-        const [vr, rr, cr, rev] = await Promise.all([
-          apiService.getVehicles(),
-          apiService.getRentals(),
-          apiService.getCustomers(),
+        const [sr, rev] = await Promise.all([
+          apiService.getDashboardSummary(),
           apiService.getRevenueAnalytics('month').catch(() => ({ data: { data: [] } })),
         ])
-        const vehicles = vr.data
-        const rentals = rr.data
-        const customers = cr.data
+        const summary = sr.data
         const revenueData = rev.data?.data || []
-
-        const available = vehicles.filter(v => v.status?.toLowerCase() === 'available').length
-        const rented = vehicles.filter(v => v.status?.toLowerCase() === 'rented').length
-        const active = rentals.filter(r => r.status?.toLowerCase() === 'active').length
         const revenue = revenueData.reduce((s, i) => s + (parseFloat(i.revenue) || 0), 0)
-        const today = new Date(); today.setHours(0, 0, 0, 0)
-        const overdue = rentals.filter(r => r.status?.toLowerCase() === 'active' && r.expected_return_date && new Date(r.expected_return_date) < today).length
-        const completed = rentals.filter(r => r.status?.toLowerCase() === 'completed' && r.pickup_date && r.expected_return_date)
-        const avgDuration = completed.length > 0
-          ? Math.round(completed.reduce((s, r) => s + (new Date(r.expected_return_date) - new Date(r.pickup_date)) / 86400000, 0) / completed.length)
-          : 0
 
-        setStats({ totalVehicles: vehicles.length, availableVehicles: available, activeRentals: active, rentedVehicles: rented, totalCustomers: customers.length, revenueThisMonth: revenue, overdueReturns: overdue, avgDuration })
-        setRecentRentals(rentals.sort((a, b) => new Date(b.pickup_date) - new Date(a.pickup_date)).slice(0, 6))
+        setStats({
+          totalVehicles: summary.total_vehicles,
+          availableVehicles: summary.available_vehicles,
+          activeRentals: summary.active_rentals,
+          rentedVehicles: summary.rented_vehicles,
+          totalCustomers: summary.total_customers,
+          revenueThisMonth: revenue,
+          overdueReturns: summary.overdue_returns,
+          avgDuration: summary.avg_duration_days,
+        })
+        setRecentRentals(summary.recent_rentals || [])
         const fmtPeriod = (p = '') => {
           if (!p) return ''
           const parts = p.split(' ')
@@ -77,25 +77,26 @@ function _bust(...keys) {
 export const apiService = {
   // Vehicles — cached reads, bust on write
   getVehicles: () => _cachedGet('/vehicles/'),
-  addVehicle: (data) => api.post('/vehicles/', data).then(r => { _bust('vehicles') ; return r }),
-  updateVehicle: (id, data) => api.put(`/vehicles/${id}`, data).then(r => { _bust('vehicles') ; return r }),
-  deleteVehicle: (id) => api.delete(`/vehicles/${id}`).then(r => { _bust('vehicles') ; return r }),
+  addVehicle: (data) => api.post('/vehicles/', data).then(r => { _bust('vehicles', 'analytics/summary') ; return r }),
+  updateVehicle: (id, data) => api.put(`/vehicles/${id}`, data).then(r => { _bust('vehicles', 'analytics/summary') ; return r }),
+  deleteVehicle: (id) => api.delete(`/vehicles/${id}`).then(r => { _bust('vehicles', 'analytics/summary') ; return r }),
 
   // Customers — cached reads, bust on write
   getCustomers: () => _cachedGet('/customers/'),
-  addCustomer: (data) => api.post('/customers/', data).then(r => { _bust('customers') ; return r }),
-  updateCustomer: (id, data) => api.put(`/customers/${id}`, data).then(r => { _bust('customers') ; return r }),
-  deleteCustomer: (id) => api.delete(`/customers/${id}`).then(r => { _bust('customers') ; return r }),
+  addCustomer: (data) => api.post('/customers/', data).then(r => { _bust('customers', 'analytics/summary') ; return r }),
+  updateCustomer: (id, data) => api.put(`/customers/${id}`, data).then(r => { _bust('customers', 'analytics/summary') ; return r }),
+  deleteCustomer: (id) => api.delete(`/customers/${id}`).then(r => { _bust('customers', 'analytics/summary') ; return r }),
 
   // Rentals — cached reads, bust on write
   getRentals: () => _cachedGet('/rentals/'),
-  addRental: (data) => api.post('/rentals/', data).then(r => { _bust('rentals', 'vehicles') ; return r }),
-  updateRental: (id, data) => api.put(`/rentals/${id}`, data).then(r => { _bust('rentals') ; return r }),
-  returnVehicle: (id, data) => api.post(`/rentals/${id}/return`, data).then(r => { _bust('rentals', 'vehicles') ; return r }),
-  deleteRental: (id) => api.delete(`/rentals/${id}`).then(r => { _bust('rentals') ; return r }),
+  addRental: (data) => api.post('/rentals/', data).then(r => { _bust('rentals', 'vehicles', 'analytics/summary') ; return r }),
+  updateRental: (id, data) => api.put(`/rentals/${id}`, data).then(r => { _bust('rentals', 'analytics/summary') ; return r }),
+  returnVehicle: (id, data) => api.post(`/rentals/${id}/return`, data).then(r => { _bust('rentals', 'vehicles', 'analytics/summary') ; return r }),
+  deleteRental: (id) => api.delete(`/rentals/${id}`).then(r => { _bust('rentals', 'analytics/summary') ; return r }),
 
   // Analytics — cached
   getDashboardAnalytics: () => _cachedGet('/analytics/dashboard'),
+  getDashboardSummary: () => _cachedGet('/analytics/summary'),
   getRevenueAnalytics: (period = 'month') => _cachedGet(`/analytics/revenue?period=${period}`),
   getFleetStatus: () => _cachedGet('/analytics/fleet-status'),
 